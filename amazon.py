@@ -1,20 +1,22 @@
 from collections import defaultdict
-from copy import deepcopy
+from copy import copy
 import csv
-from datetime import datetime
+from functools import lru_cache
+import itertools
 from pprint import pformat
 import re
 import string
 
-from interruptingcow import timeout
-
-from algorithm_u import algorithm_u
+from budget import Budget, BudgetExhausted
 import category
 from currency import micro_usd_nearly_equal
 from currency import micro_usd_to_usd_string
-from currency import parse_usd_as_micro_usd
+from currency import parse_usd_as_micro_usd_cached
 from currency import CENT_MICRO_USD, MICRO_USD_EPS
+from dates import parse_amazon_date
 from mint import truncate_title
+from record import Record, RecordView
+from subset_sum import partition_counts_into_targets
 
 PRINTABLE = set(string.printable)
 
@@ -62,59 +64,89 @@ RENAME_FIELD_NAMES = {
 }
 
 
-def is_empty_csv(csv_file_obj, key='Quantity'):
+def is_empty_csv_row(row, fieldnames):
+    """Returns True if row is Amazon's "No data found" placeholder row."""
     # Amazon likes to put "No data found for this time period" in the first
-    # row.
-    filename = csv_file_obj.name
-    return (sum([1 for r in csv.DictReader(open(filename))]) <= 1 and
-            next(csv.DictReader(open(filename)))[key] is None)
+    # row. That row only has a single column, so every other field is missing.
+    return len(fieldnames) > 1 and len(row) == 1
+
+
+def iter_from_csv_common(cls, csv_file, progress=None, keep_row=None):
+    """Lazily yields a cls for every row of an Amazon report.
+
+    The report is only read once, front to back, so csv_file can be any
+    iterable of lines (including stdin or a pipe). If given, rows for which
+    keep_row(fieldnames, row) is false are skipped before being decoded.
+    """
+    # Like csv.DictReader, skip over blank lines.
+    rows = (row for row in csv.reader(csv_file) if row)
+    fieldnames = next(rows, None)
+    first_row = next(rows, None)
+    if first_row is None or is_empty_csv_row(first_row, fieldnames):
+        return
+
+    decode = compile_amazon_row_decoder(tuple(fieldnames))
+    for row in itertools.chain([first_row], rows):
+        if keep_row and not keep_row(fieldnames, row):
+            continue
+        yield cls.from_fields(decode(row))
+        if progress:
+            progress.next()
+    if progress:
+        progress.finish()
+        print()
 
 
-def parse_from_csv_common(cls, csv_file, progress):
-    if is_empty_csv(csv_file):
-        return []
+def parse_from_csv_common(cls, csv_file, progress=None, keep_row=None):
+    return list(iter_from_csv_common(cls, csv_file, progress, keep_row))
 
-    reader = csv.DictReader(csv_file)
-    iter = progress.iter(reader) if progress else reader
-    result = [cls(raw_dict) for raw_dict in iter]
-    if progress:
-        print()
-    return result
 
+def pythonify_amazon_field_name(name):
+    name = RENAME_FIELD_NAMES.get(name, name)
+    return name.lower().replace(' ', '_').replace('/', '_')
 
-def pythonify_amazon_dict(raw_dict):
-    keys = set(raw_dict.keys())
 
-    # Convert to microdollar ints
-    for ck in keys & CURRENCY_FIELD_NAMES:
-        raw_dict[ck] = parse_usd_as_micro_usd(raw_dict[ck])
+def get_amazon_field_converter(name):
+    if name in CURRENCY_FIELD_NAMES:
+        # Convert to microdollar ints
+        return parse_usd_as_micro_usd_cached
+    if name in DATE_FIELD_NAMES:
+        # Convert to datetime.date
+        return parse_amazon_date
+    if name == 'Quantity':
+        return int
+    return None
 
-    # Convert to datetime.date
-    for dk in keys & DATE_FIELD_NAMES:
-        raw_dict[dk] = parse_amazon_date(raw_dict[dk])
 
-    # Rename long or unpythonic names:
-    for old_key in keys & RENAME_FIELD_NAMES.keys():
-        new_key = RENAME_FIELD_NAMES[old_key]
-        raw_dict[new_key] = raw_dict[old_key]
-        del raw_dict[old_key]
+@lru_cache(maxsize=16)
+def compile_amazon_row_decoder(fieldnames):
+    """Returns a function that turns a row of values into a pythonified dict.
 
-    if 'Quantity' in keys:
-        raw_dict['Quantity'] = int(raw_dict['Quantity'])
+    The columns of a report are fixed, so the renames and value converters
+    are resolved once per header instead of once per row.
+    """
+    names = tuple(pythonify_amazon_field_name(f) for f in fieldnames)
+    converters = tuple(
+        (idx, names[idx], get_amazon_field_converter(f))
+        for idx, f in enumerate(fieldnames)
+        if get_amazon_field_converter(f))
+    num_fields = len(names)
 
-    return dict([
-        (k.lower().replace(' ', '_').replace('/', '_'), v)
-        for k, v in raw_dict.items()
-    ])
+    def decode(row):
+        if len(row) < num_fields:
+            # Short rows are missing their trailing values (like DictReader).
+            row = list(row) + [None] * (num_fields - len(row))
+        fields = dict(zip(names, row))
+        for idx, name, convert in converters:
+            fields[name] = convert(row[idx])
+        return fields
 
+    return decode
 
-def parse_amazon_date(date_str):
-    if not date_str:
-        return None
-    try:
-        return datetime.strptime(date_str, '%m/%d/%Y').date()
-    except ValueError:
-        return datetime.strptime(date_str, '%m/%d/%y').date()
+
+def pythonify_amazon_dict(raw_dict):
+    decode = compile_amazon_row_decoder(tuple(raw_dict.keys()))
+    return decode(list(raw_dict.values()))
 
 
 def get_invoice_url(order_id):
@@ -123,7 +155,26 @@ def get_invoice_url(order_id):
         'orderID={oid}'.format(oid=order_id))
 
 
-def associate_items_with_orders(all_orders, all_items, itemProgress=None):
+# The default limits for searching how to divy up an order's items between
+# its shipments.
+DEFAULT_ITEM_SEARCH_STEPS = 1000000
+DEFAULT_ITEM_SEARCH_SECONDS = 1.0
+
+
+def new_item_search_budget():
+    return Budget(DEFAULT_ITEM_SEARCH_STEPS, DEFAULT_ITEM_SEARCH_SECONDS)
+
+
+def associate_items_with_orders(
+        all_orders, all_items, itemProgress=None,
+        make_budget=new_item_search_budget, stats=None):
+    """Sets the items of every order (shipment) with a fitting subtotal.
+
+    make_budget is called for a fresh budget.Budget for each order id whose
+    items have to be searched for. If stats (a Counter) is given, the order
+    ids where that search gave up (item_search_exhausted) or found no
+    fitting combination (item_search_no_match) are counted.
+    """
     items_by_oid = defaultdict(list)
     for i in all_items:
         items_by_oid[i.order_id].append(i)
@@ -166,38 +217,44 @@ def associate_items_with_orders(all_orders, all_items, itemProgress=None):
                     itemProgress.next(len(items))
                 # Remove the selected items.
                 oid_items = [i for i in oid_items if i not in items]
-        # Remove orders that have items.
-        orders = [o for o in orders if not o.items]
+        # Remove orders that have items (even if none, e.g. a $0 shipment).
+        orders = [o for o in orders if not o.items_matched]
         if not orders and not oid_items:
             continue
 
-        orders = sorted(orders, key=lambda o: o.subtotal)
-
-        # Partition the remaining items into every possible arrangement and
-        # validate against the remaining orders.
-        # TODO: Make a custom algorithm with backtracking.
-
-        # The number of combinations are factorial, so limit the number of
-        # attempts (by a 1 sec timeout) before giving up.
+        # Search for an assignment of the remaining items to the remaining
+        # orders such that each order's subtotal adds up. Units of the same
+        # item at the same price are interchangeable, so only count how many
+        # of each go to every order.
+        units_by_kind = defaultdict(list)
+        for i in oid_items:
+            units_by_kind[(i.asin_isbn, i.item_subtotal)].append(i)
+        kinds = list(units_by_kind.values())
+        # The search can be exponential in the worst case, so limit it (by
+        # its budget) before giving up.
         try:
-            with timeout(1, exception=RuntimeError):
-                for item_groupings in algorithm_u(oid_items, len(orders)):
-                    subtotals_with_groupings = sorted(
-                        [(Item.sum_subtotals(itms), itms)
-                         for itms in item_groupings],
-                        key=lambda g: g[0])
-                    if all([micro_usd_nearly_equal(
-                            subtotals_with_groupings[i][0],
-                            orders[i].subtotal) for i in range(len(orders))]):
-                        for idx, order in enumerate(orders):
-                            items = subtotals_with_groupings[idx][1]
-                            order.set_items(items,
-                                            assert_unmatched=True)
-                            if itemProgress:
-                                itemProgress.next(len(items))
-                        break
-        except RuntimeError:
-            pass
+            assignment = partition_counts_into_targets(
+                [units[0].item_subtotal for units in kinds],
+                [len(units) for units in kinds],
+                [o.subtotal for o in orders],
+                budget=make_budget())
+        except BudgetExhausted:
+            if stats is not None:
+                stats['item_search_exhausted'] += 1
+            continue
+        if not assignment:
+            # No combination of the items adds up to the orders.
+            if stats is not None:
+                stats['item_search_no_match'] += 1
+            continue
+        for order, counts in zip(orders, assignment):
+            items = []
+            for units, num in zip(kinds, counts):
+                items.extend(units[:num])
+                del units[:num]
+            order.set_items(items, assert_unmatched=True)
+            if itemProgress:
+                itemProgress.next(len(items))
 
 
 ORDER_MERGE_FIELDS = {
@@ -210,19 +267,51 @@ ORDER_MERGE_FIELDS = {
 }
 
 
-class Order:
-    matched = False
-    items_matched = False
-    trans_id = None
-    items = []
-    is_debit = True
+class Order(Record):
+    __slots__ = (
+        'buyer_name',
+        'is_debit',
+        'items',
+        'items_matched',
+        'matched',
+        # The shipments a merged Order (see merge) was made of.
+        'merged_orders',
+        'order_date',
+        'order_id',
+        'order_status',
+        'ordering_customer_email',
+        'payment_instrument_type',
+        'shipment_date',
+        'shipping_charge',
+        'subtotal',
+        'tax_before_promotions',
+        'tax_charged',
+        'total_charged',
+        'total_promotions',
+        'tracking',
+        'trans_id',
+        'website',
+    )
+
+    DEFAULTS = {
+        'matched': False,
+        'items_matched': False,
+        'merged_orders': None,
+        'trans_id': None,
+        'items': [],
+        'is_debit': True,
+    }
 
     def __init__(self, raw_dict):
-        self.__dict__.update(pythonify_amazon_dict(raw_dict))
+        self.set_fields(pythonify_amazon_dict(raw_dict))
 
     @classmethod
-    def parse_from_csv(cls, csv_file, progress=None):
-        return parse_from_csv_common(cls, csv_file, progress)
+    def parse_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return parse_from_csv_common(cls, csv_file, progress, keep_row)
+
+    @classmethod
+    def iter_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return iter_from_csv_common(cls, csv_file, progress, keep_row)
 
     @staticmethod
     def sum_subtotals(orders):
@@ -258,6 +347,11 @@ class Order:
             i.order = self
 
     def get_note(self):
+        order_ids = self.get_merged_order_ids()
+        if len(order_ids) > 1:
+            # Charged together with shipments of other orders.
+            return '\n\n'.join(
+                self.get_order_note(oid) for oid in order_ids)
         return (
             'Amazon order id: {}\n'
             'Buyer: {} ({})\n'
@@ -273,6 +367,34 @@ class Order:
                 self.tracking,
                 get_invoice_url(self.order_id))
 
+    def get_merged_order_ids(self):
+        if not self.merged_orders:
+            return [self.order_id]
+        return list(dict.fromkeys(o.order_id for o in self.merged_orders))
+
+    def get_order_note(self, order_id):
+        """Returns the note of the (first merged) shipment of order_id."""
+        for o in self.merged_orders or ():
+            if o.order_id == order_id:
+                return o.get_note()
+        return self.get_note()
+
+    def attribute_charge_diff_to_tax(self, charged_amount):
+        """Attributes a (within tolerance) difference between what was
+        actually charged and total_charged to the tax of the priciest item."""
+        diff = charged_amount - self.total_charged
+        if abs(diff) < MICRO_USD_EPS:
+            return False
+
+        self.total_charged += diff
+        self.tax_charged += diff
+        self.tax_before_promotions += diff
+
+        item = max(self.items, key=lambda i: i.item_total)
+        item.item_subtotal_tax += diff
+        item.item_total += diff
+        return True
+
     def attribute_subtotal_diff_to_misc_charge(self):
         diff = self.total_charged - self.total_by_subtotals()
         if diff < MICRO_USD_EPS:
@@ -280,7 +402,7 @@ class Order:
 
         self.subtotal += diff
 
-        adjustment = deepcopy(self.items[0])
+        adjustment = ItemView(self.items[0], 1)
         adjustment.title = 'Misc Charge (Gift wrap, etc)'
         adjustment.category = 'Shopping'
         adjustment.quantity = 1
@@ -373,7 +495,7 @@ class Order:
                 amount=i.item_total,
                 category=new_cat,
                 desc=i.get_title(88),
-                note=self.get_note())
+                note=self.get_order_note(i.order_id))
             new_transactions.append(item)
 
         # Itemize the shipping cost, if any.
@@ -419,10 +541,11 @@ class Order:
             result.set_items(Item.merge(result.items))
             return result
 
-        result = deepcopy(orders[0])
+        result = copy(orders[0])
+        result.merged_orders = list(orders)
         result.set_items(Item.merge([i for o in orders for i in o.items]))
         for key in ORDER_MERGE_FIELDS:
-            result.__dict__[key] = sum([o.__dict__[key] for o in orders])
+            setattr(result, key, sum([getattr(o, key) for o in orders]))
         return result
 
     def __repr__(self):
@@ -440,17 +563,47 @@ class Order:
                 items=pformat(self.items)))
 
 
-class Item:
-    matched = False
-    order = None
+class Item(Record):
+    __slots__ = (
+        'asin_isbn',
+        'buyer_name',
+        'category',
+        'item_subtotal',
+        'item_subtotal_tax',
+        'item_total',
+        'matched',
+        'order',
+        'order_date',
+        'order_id',
+        'order_status',
+        'original_item_subtotal_tax',
+        'purchase_price_per_unit',
+        'quantity',
+        'shipment_date',
+        'title',
+        'tracking',
+        'website',
+    )
+
+    DEFAULTS = {
+        'matched': False,
+        'order': None,
+    }
 
     def __init__(self, raw_dict):
-        self.__dict__.update(pythonify_amazon_dict(raw_dict))
-        self.__dict__['original_item_subtotal_tax'] = self.item_subtotal_tax
+        self.set_fields(pythonify_amazon_dict(raw_dict))
+
+    def set_fields(self, fields):
+        super().set_fields(fields)
+        self.original_item_subtotal_tax = self.item_subtotal_tax
+
+    @classmethod
+    def parse_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return parse_from_csv_common(cls, csv_file, progress, keep_row)
 
     @classmethod
-    def parse_from_csv(cls, csv_file, progress=None):
-        return parse_from_csv_common(cls, csv_file, progress)
+    def iter_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return iter_from_csv_common(cls, csv_file, progress, keep_row)
 
     @staticmethod
     def sum_subtotals(items):
@@ -487,12 +640,13 @@ class Item:
         self.quantity = new_quantity
 
     def split_by_quantity(self):
-        """Splits this item into 'quantity' items."""
+        """Splits this item into 'quantity' items.
+
+        The units are lightweight views of this item, which is left as is.
+        """
         if self.quantity == 1:
             return [self]
-        orig_qty = self.quantity
-        self.set_quantity(1)
-        return [deepcopy(self) for i in range(orig_qty)]
+        return [ItemView(self, 1) for i in range(self.quantity)]
 
     @classmethod
     def merge(cls, items):
@@ -501,7 +655,9 @@ class Item:
             return items
         unique_items = defaultdict(list)
         for i in items:
-            key = '{}-{}-{}'.format(
+            # Items of different orders (charged together) stay apart.
+            key = '{}-{}-{}-{}'.format(
+                i.order_id,
                 i.title,
                 i.asin_isbn,
                 i.item_subtotal)
@@ -513,9 +669,7 @@ class Item:
                 results.extend(same_items)
                 continue
 
-            item = deepcopy(same_items[0])
-            item.set_quantity(qty)
-            results.append(item)
+            results.append(ItemView(same_items[0], qty))
         return results
 
     def __repr__(self):
@@ -529,25 +683,72 @@ class Item:
                 desc=self.title))
 
 
-class Refund:
-    matched = False
-    trans_id = None
-    is_debit = False
+class ItemView(RecordView, Item):
+    """Some quantity of a parent Item.
+
+    Only the quantity, prices and matching state belong to the view; all
+    other fields are read from the parent.
+    """
+
+    __slots__ = ('parent',)
+
+    def __init__(self, parent, quantity):
+        self.parent = parent
+        self.matched = parent.matched
+        self.order = parent.order
+        self.quantity = parent.quantity
+        self.item_subtotal = parent.item_subtotal
+        self.item_subtotal_tax = parent.item_subtotal_tax
+        self.item_total = parent.item_total
+        if quantity != parent.quantity:
+            self.set_quantity(quantity)
+
+
+class Refund(Record):
+    __slots__ = (
+        'asin_isbn',
+        'buyer_name',
+        'category',
+        'is_debit',
+        'matched',
+        'order_date',
+        'order_id',
+        'quantity',
+        'refund_amount',
+        'refund_date',
+        'refund_reason',
+        'refund_tax_amount',
+        'title',
+        'total_refund_amount',
+        'trans_id',
+        'website',
+    )
+
+    DEFAULTS = {
+        'matched': False,
+        'trans_id': None,
+        'is_debit': False,
+    }
 
     def __init__(self, raw_dict):
+        self.set_fields(pythonify_amazon_dict(raw_dict))
+
+    def set_fields(self, fields):
+        super().set_fields(fields)
         # Refunds are rad: AMZN doesn't total the tax + sub-total for you.
-        fields = pythonify_amazon_dict(raw_dict)
-        fields['total_refund_amount'] = (
-            fields['refund_amount'] + fields['refund_tax_amount'])
-        self.__dict__.update(fields)
+        self.total_refund_amount = self.refund_amount + self.refund_tax_amount
 
     @staticmethod
     def sum_total_refunds(refunds):
         return sum([r.total_refund_amount for r in refunds])
 
     @classmethod
-    def parse_from_csv(cls, csv_file, progress=None):
-        return parse_from_csv_common(cls, csv_file, progress)
+    def parse_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return parse_from_csv_common(cls, csv_file, progress, keep_row)
+
+    @classmethod
+    def iter_from_csv(cls, csv_file, progress=None, keep_row=None):
+        return iter_from_csv_common(cls, csv_file, progress, keep_row)
 
     def match(self, trans):
         self.matched = True
@@ -588,6 +789,20 @@ class Refund:
             is_debit=False)
         return result
 
+    @staticmethod
+    def attribute_charge_diff_to_tax(refunds, charged_amount):
+        """Attributes a (within tolerance) difference between what was
+        actually refunded and the refunds' total to the tax of the largest
+        refund."""
+        diff = -charged_amount - sum(r.total_refund_amount for r in refunds)
+        if abs(diff) < MICRO_USD_EPS:
+            return False
+
+        refund = max(refunds, key=lambda r: r.total_refund_amount)
+        refund.refund_tax_amount += diff
+        refund.total_refund_amount += diff
+        return True
+
     @staticmethod
     def merge(refunds):
         """Collapses identical items by using quantity."""
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for parsing Amazon reports. Run directly:
+#   python3 amazon_bench.py --rows 100000
+
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+import amazon
+import dates
+import mint
+from currency import parse_usd_as_micro_usd
+from mockdata import item_dict, order_dict, transaction_json
+
+
+def legacy_pythonify_amazon_dict(raw_dict):
+    """The per-row dict conversion used before compile_amazon_row_decoder."""
+    keys = set(raw_dict.keys())
+    for ck in keys & amazon.CURRENCY_FIELD_NAMES:
+        raw_dict[ck] = parse_usd_as_micro_usd(raw_dict[ck])
+    for dk in keys & amazon.DATE_FIELD_NAMES:
+        raw_dict[dk] = amazon.parse_amazon_date(raw_dict[dk])
+    for old_key in keys & amazon.RENAME_FIELD_NAMES.keys():
+        new_key = amazon.RENAME_FIELD_NAMES[old_key]
+        raw_dict[new_key] = raw_dict[old_key]
+        del raw_dict[old_key]
+    if 'Quantity' in keys:
+        raw_dict['Quantity'] = int(raw_dict['Quantity'])
+    return dict([
+        (k.lower().replace(' ', '_').replace('/', '_'), v)
+        for k, v in raw_dict.items()
+    ])
+
+
+def items_csv(num_rows):
+    result = io.StringIO()
+    writer = None
+    for i in range(num_rows):
+        row = item_dict(
+            order_id='{:03d}-{:07d}-{:07d}'.format(i % 1000, i, i),
+            item_subtotal='${}.{:02d}'.format(i % 500, i % 100),
+            order_date='{:02d}/{:02d}/{:02d}'.format(
+                i % 12 + 1, i % 28 + 1, i % 10 + 10))
+        if not writer:
+            writer = csv.DictWriter(result, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+    return result.getvalue()
+
+
+def time_it(label, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<40} {:8.3f}s'.format(label, best))
+    return best
+
+
+def bench_parse(num_rows, repeat):
+    data = items_csv(num_rows)
+    print('Parsing an Items report of {} rows (best of {}):'.format(
+        num_rows, repeat))
+
+    def legacy():
+        return [legacy_pythonify_amazon_dict(r)
+                for r in csv.DictReader(io.StringIO(data))]
+
+    def compiled():
+        reader = csv.reader(io.StringIO(data))
+        decode = amazon.compile_amazon_row_decoder(tuple(next(reader)))
+        return [decode(r) for r in reader]
+
+    def full():
+        return amazon.Item.parse_from_csv(io.StringIO(data))
+
+    legacy_s = time_it('DictReader + legacy pythonify', legacy, repeat)
+    compiled_s = time_it('csv.reader + compiled decoder', compiled, repeat)
+    time_it('Item.parse_from_csv', full, repeat)
+    print('Speedup (decode only): {:.2f}x'.format(legacy_s / compiled_s))
+    print('Amazon date cache hit rate: {:.1%}'.format(
+        dates.get_date_cache_stats()['amazon']['hit_rate']))
+
+
+class LegacyRecord:
+    """A record keeping every field in its __dict__ (before Record)."""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+
+def bytes_per_record(make_record, all_fields):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    records = [make_record(fields) for fields in all_fields]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(
+        stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # Don't count the list holding the records.
+    allocated -= records.__sizeof__()
+    return allocated / len(records)
+
+
+def bench_memory(num_records):
+    print('\nMemory per record, excluding field values ({} records):'.format(
+        num_records))
+    samples = [
+        ('Order', amazon.Order.from_fields,
+         lambda: amazon.pythonify_amazon_dict(order_dict())),
+        ('Item', amazon.Item.from_fields,
+         lambda: amazon.pythonify_amazon_dict(item_dict())),
+        ('Transaction', mint.Transaction.from_fields,
+         lambda: mint.pythonify_mint_dict(transaction_json())),
+    ]
+    for name, from_fields, make_fields in samples:
+        all_fields = [make_fields() for _ in range(num_records)]
+        legacy = bytes_per_record(LegacyRecord, all_fields)
+        compact = bytes_per_record(from_fields, all_fields)
+        print('{:<12} __dict__: {:6.0f} B   slots: {:6.0f} B   ({:.0%})'
+              .format(name, legacy, compact, compact / legacy))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Amazon report parsing.')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bench_parse(args.rows, args.repeat)
+    bench_memory(min(args.rows, 20000))
+
+
+if __name__ == '__main__':
+    main()
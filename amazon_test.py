@@ -1,9 +1,13 @@
+from collections import Counter
 from datetime import date
+import io
 import unittest
 
 import amazon
 from amazon import Item, Order, Refund
+from budget import Budget
 from mockdata import item, order, refund, transaction
+from mockdata import item_dict, order_dict, to_csv_file
 
 
 class HelperMethods(unittest.TestCase):
@@ -25,6 +29,88 @@ class HelperMethods(unittest.TestCase):
             amazon.parse_amazon_date('1/23/1989'),
             date(1989, 1, 23))
 
+    def test_parse_from_csv(self):
+        orders = Order.parse_from_csv(to_csv_file([
+            order_dict(order_id='A'),
+            order_dict(order_id='B', total_charged='$3.21'),
+        ]))
+
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(orders[0].order_id, 'A')
+        self.assertEqual(orders[1].order_id, 'B')
+        self.assertEqual(orders[1].total_charged, 3210000)
+
+    def test_parse_from_csv_no_data_found(self):
+        csv_file = io.StringIO(
+            ','.join(item_dict().keys()) + '\n'
+            '"No data found for this time period"\n')
+        self.assertEqual(Item.parse_from_csv(csv_file), [])
+
+        csv_file = io.StringIO(','.join(order_dict().keys()) + '\n')
+        self.assertEqual(Order.parse_from_csv(csv_file), [])
+
+        self.assertEqual(Order.parse_from_csv(io.StringIO('')), [])
+
+    def test_parse_from_csv_skips_blank_lines(self):
+        csv_file = to_csv_file([order_dict(order_id='A')])
+        csv_file = io.StringIO(csv_file.read() + '\n\n')
+        orders = Order.parse_from_csv(csv_file)
+
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0].order_id, 'A')
+
+    def test_parse_from_csv_keep_row(self):
+        seen = []
+
+        def keep_row(fieldnames, row):
+            seen.append(row[fieldnames.index('Order ID')])
+            return row[fieldnames.index('Order ID')] != 'A'
+
+        orders = Order.parse_from_csv(
+            to_csv_file([order_dict(order_id='A'), order_dict(order_id='B')]),
+            keep_row=keep_row)
+
+        self.assertEqual(seen, ['A', 'B'])
+        self.assertEqual([o.order_id for o in orders], ['B'])
+
+    def test_compile_amazon_row_decoder(self):
+        decode = amazon.compile_amazon_row_decoder((
+            'Order ID', 'Shipment Date', 'Carrier Name & Tracking Number',
+            'Item Total', 'Quantity', 'ASIN/ISBN'))
+
+        self.assertEqual(
+            decode(['A', '02/28/14', 'UPS(123)', '$1,001.20', '3', 'B00']),
+            {
+                'order_id': 'A',
+                'shipment_date': date(2014, 2, 28),
+                'tracking': 'UPS(123)',
+                'item_total': 1001200000,
+                'quantity': 3,
+                'asin_isbn': 'B00',
+            })
+        # Missing trailing values are None, like csv.DictReader.
+        self.assertEqual(
+            decode(['B', '', 'UPS(456)', '$2.00', '1']),
+            {
+                'order_id': 'B',
+                'shipment_date': None,
+                'tracking': 'UPS(456)',
+                'item_total': 2000000,
+                'quantity': 1,
+                'asin_isbn': None,
+            })
+
+    def test_iter_from_csv_is_lazy(self):
+        csv_file = to_csv_file([
+            item_dict(title='First'),
+            item_dict(title='Second'),
+        ])
+        items = Item.iter_from_csv(csv_file)
+
+        self.assertEqual(next(items).title, 'First')
+        # Only the rows consumed so far have been read.
+        self.assertIn('Second', csv_file.read())
+
     def test_associate_items_with_orders_none_match(self):
         i1 = item(order_id='1', item_subtotal='$100.00')
         i2 = item(order_id='2')
@@ -104,6 +190,19 @@ class HelperMethods(unittest.TestCase):
         self.assertTrue(o2.items_matched)
         self.assertEqual(o2.items, b_items)
 
+    def test_associate_items_with_orders_zero_shipment_by_track(self):
+        i1 = item(order_id='A', item_subtotal='$10.00', quantity=1,
+                  tracking='X')
+        o1 = order(order_id='A', subtotal='$10.00', tracking='X')
+        o2 = order(order_id='A', subtotal='$0.00', tracking='Y')
+
+        amazon.associate_items_with_orders([o1, o2], [i1])
+
+        self.assertTrue(o1.items_matched)
+        self.assertEqual(o1.items, [i1])
+        self.assertTrue(o2.items_matched)
+        self.assertEqual(o2.items, [])
+
     def test_associate_items_with_orders_multi_orders_and_items_by_combi(self):
         # Sometimes the same item is shipped in different packages, so tracking
         # number doesn't work.
@@ -127,6 +226,76 @@ class HelperMethods(unittest.TestCase):
         self.assertTrue(o3.items_matched)
         self.assertEqual(len(o3.items), 7)
 
+    def test_associate_items_with_orders_many_items_many_shipments(self):
+        # Too many items to enumerate every partition between the shipments.
+        subtotals = [
+            '$19.99', '$25.49', '$3.99', '$12.50', '$8.99', '$49.99', '$7.50',
+            '$21.00', '$18.99', '$6.49', '$33.33', '$12.00', '$5.05', '$29.99',
+        ]
+        items = [
+            item(order_id='A', item_subtotal=s, quantity=1, tracking='?')
+            for s in subtotals
+        ]
+        o1 = order(order_id='A', subtotal='$103.31', tracking='A')
+        o2 = order(order_id='A', subtotal='$54.48', tracking='B')
+        o3 = order(order_id='A', subtotal='$50.47', tracking='C')
+        o4 = order(order_id='A', subtotal='$47.04', tracking='D')
+
+        amazon.associate_items_with_orders([o1, o2, o3, o4], items)
+
+        for o in (o1, o2, o3, o4):
+            self.assertTrue(o.items_matched)
+            self.assertEqual(Item.sum_subtotals(o.items), o.subtotal)
+        self.assertEqual(
+            sum(len(o.items) for o in (o1, o2, o3, o4)), len(items))
+
+    def test_associate_items_with_orders_bulk_quantity(self):
+        bulk = item(order_id='A', item_subtotal='$400.00', quantity=200,
+                    purchase_price_per_unit='$2.00', tracking='?')
+        other = item(order_id='A', item_subtotal='$8.99', quantity=1,
+                     purchase_price_per_unit='$8.99', tracking='?')
+        units = bulk.split_by_quantity() + [other]
+
+        o1 = order(order_id='A', subtotal='$308.99', tracking='A')
+        o2 = order(order_id='A', subtotal='$60.00', tracking='B')
+        o3 = order(order_id='A', subtotal='$40.00', tracking='C')
+
+        amazon.associate_items_with_orders([o1, o2, o3], units)
+
+        self.assertEqual(len(o1.items), 151)
+        self.assertIn(other, o1.items)
+        self.assertEqual(len(o2.items), 30)
+        self.assertEqual(len(o3.items), 20)
+
+    def test_associate_items_with_orders_budget_exhausted(self):
+        items = [
+            item(order_id='A', item_subtotal='$2.00', tracking='?')
+            for i in range(15)
+        ]
+        o1 = order(order_id='A', subtotal='$4.00', tracking='A')
+        o2 = order(order_id='A', subtotal='$26.00', tracking='B')
+        stats = Counter()
+
+        amazon.associate_items_with_orders(
+            [o1, o2], items,
+            make_budget=lambda: Budget(max_steps=1), stats=stats)
+
+        self.assertFalse(o1.items_matched)
+        self.assertFalse(o2.items_matched)
+        self.assertEqual(stats['item_search_exhausted'], 1)
+
+    def test_associate_items_with_orders_no_match_stats(self):
+        items = [item(order_id='A', item_subtotal='$3.00', tracking='?')
+                 for i in range(2)]
+        o1 = order(order_id='A', subtotal='$4.00', tracking='A')
+        o2 = order(order_id='A', subtotal='$2.00', tracking='B')
+        stats = Counter()
+
+        amazon.associate_items_with_orders([o1, o2], items, stats=stats)
+
+        self.assertFalse(o1.items_matched)
+        self.assertEqual(stats['item_search_no_match'], 1)
+
 
 class OrderClass(unittest.TestCase):
     def test_constructor(self):
@@ -256,6 +425,27 @@ class OrderClass(unittest.TestCase):
         self.assertTrue('Ship date: 2014-02-28' in order().get_note())
         self.assertTrue('Tracking: AMZN(ABC123)' in order().get_note())
 
+    def test_attribute_charge_diff_to_tax_no_diff(self):
+        o = order()
+        o.set_items([item()])
+
+        self.assertFalse(o.attribute_charge_diff_to_tax(11950000))
+
+    def test_attribute_charge_diff_to_tax(self):
+        o = order(total_charged='$11.95', tax_charged='$1.05',
+                  tax_before_promotions='$1.05')
+        i1 = item(item_total='$6.00', item_subtotal_tax='$0.50')
+        i2 = item(item_total='$5.95', item_subtotal_tax='$0.55')
+        o.set_items([i1, i2])
+
+        self.assertTrue(o.attribute_charge_diff_to_tax(11940000))
+        self.assertEqual(o.total_charged, 11940000)
+        self.assertEqual(o.tax_charged, 1040000)
+        self.assertEqual(o.tax_before_promotions, 1040000)
+        self.assertEqual(i1.item_subtotal_tax, 490000)
+        self.assertEqual(i1.item_total, 5990000)
+        self.assertEqual(i2.item_total, 5950000)
+
     def test_attribute_subtotal_diff_to_misc_charge_no_diff(self):
         o = order(total_charged='$10.00', subtotal='$10.00')
         i = item(item_total='$10.00')
@@ -549,6 +739,27 @@ class ItemClass(unittest.TestCase):
             self.assertEqual(it.item_subtotal, 5450000)
             self.assertEqual(it.item_subtotal_tax, 525000)
             self.assertEqual(it.item_total, 5975000)
+            # All other fields come from the original item.
+            self.assertIs(it.title, i.title)
+            self.assertEqual(it.order_id, i.order_id)
+            self.assertFalse(it.matched)
+        # The original item is unchanged.
+        self.assertEqual(i.quantity, 2)
+        self.assertEqual(i.item_subtotal, 10900000)
+
+    def test_split_by_quantity_then_merge(self):
+        i = item(quantity=3, item_subtotal='$16.35', item_subtotal_tax='$1.05',
+                 item_total='$17.40')
+        units = i.split_by_quantity()
+        self.assertEqual(len(units), 3)
+
+        merged = Item.merge(units)
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0].quantity, 3)
+        self.assertEqual(merged[0].item_subtotal, 16350000)
+        self.assertEqual(merged[0].item_subtotal_tax, 1050000)
+        self.assertEqual(merged[0].item_total, 17400000)
+        self.assertEqual(merged[0].title, i.title)
 
     def test_merge(self):
         i1 = item()
@@ -604,6 +815,18 @@ class RefundClass(unittest.TestCase):
     def test_transact_amount(self):
         self.assertEqual(refund().transact_amount(), -11950000)
 
+    def test_attribute_charge_diff_to_tax(self):
+        r1 = refund(refund_amount='$1.00', refund_tax_amount='$0.10')
+        r2 = refund(refund_amount='$5.00', refund_tax_amount='$0.50')
+
+        self.assertFalse(
+            Refund.attribute_charge_diff_to_tax([r1, r2], -6600000))
+        self.assertTrue(
+            Refund.attribute_charge_diff_to_tax([r1, r2], -6610000))
+        self.assertEqual(r1.total_refund_amount, 1100000)
+        self.assertEqual(r2.refund_tax_amount, 510000)
+        self.assertEqual(r2.total_refund_amount, 5510000)
+
     def test_match(self):
         r = refund()
 
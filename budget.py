@@ -0,0 +1,45 @@
+import time
+
+
+class BudgetExhausted(Exception):
+    """Raised by Budget.step once a search has used up its budget."""
+
+
+class Budget:
+    """A cooperative step and time budget for combinatorial searches.
+
+    Searches call step() for every unit of work; once more than max_steps
+    have been taken, or max_seconds have passed since the budget was created,
+    step() raises BudgetExhausted. Either limit may be None (unlimited).
+
+    Unlike a SIGALRM based timeout, this works from any thread and a search
+    is only ever stopped in between steps.
+    """
+
+    # Reading the clock is slow compared to a search step, so only look at
+    # it every so many steps.
+    CLOCK_CHECK_STEPS = 128
+
+    def __init__(self, max_steps=None, max_seconds=None, clock=time.monotonic):
+        self.max_steps = max_steps
+        self.clock = clock
+        self.deadline = (
+            clock() + max_seconds if max_seconds is not None else None)
+        self.steps = 0
+        self.next_clock_check = self.CLOCK_CHECK_STEPS
+
+    def step(self, num_steps=1):
+        self.steps += num_steps
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExhausted(
+                'Used more than {} steps'.format(self.max_steps))
+        if self.deadline is not None and self.steps >= self.next_clock_check:
+            self.next_clock_check = self.steps + self.CLOCK_CHECK_STEPS
+            if self.clock() > self.deadline:
+                raise BudgetExhausted(
+                    'Ran out of time after {} steps'.format(self.steps))
+
+    def __repr__(self):
+        return 'Budget({} steps used of {})'.format(
+            self.steps,
+            self.max_steps if self.max_steps is not None else 'unlimited')
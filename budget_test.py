@@ -0,0 +1,50 @@
+import threading
+import unittest
+
+from budget import Budget, BudgetExhausted
+from mockdata import FakeClock
+
+
+class BudgetClass(unittest.TestCase):
+    def test_unlimited(self):
+        b = Budget()
+        for i in range(10000):
+            b.step()
+        self.assertEqual(b.steps, 10000)
+
+    def test_max_steps(self):
+        b = Budget(max_steps=3)
+        b.step()
+        b.step(2)
+        with self.assertRaises(BudgetExhausted):
+            b.step()
+
+    def test_max_seconds(self):
+        clock = FakeClock()
+        b = Budget(max_seconds=2, clock=clock)
+        for i in range(1000):
+            b.step()
+        clock.now += 3
+        with self.assertRaises(BudgetExhausted):
+            for i in range(Budget.CLOCK_CHECK_STEPS):
+                b.step()
+
+    def test_works_off_the_main_thread(self):
+        errors = []
+
+        def search():
+            b = Budget(max_steps=5)
+            try:
+                while True:
+                    b.step()
+            except BudgetExhausted as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=search)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
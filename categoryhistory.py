@@ -0,0 +1,61 @@
+from collections import Counter, defaultdict
+import sqlite3
+
+DEFAULT_CATEGORY_HISTORY_PATH = 'Mint Category History.sqlite'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS item_categories (
+    trans_id INTEGER PRIMARY KEY,
+    odate TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS item_categories_odate
+    ON item_categories (odate);
+'''
+
+
+class CategoryHistory:
+    """The categories of every previously tagged Mint item transaction seen
+    by any run, kept in SQLite.
+
+    This lets personalized categories learn from all past history, while
+    each run only fetches the Mint transactions it needs for matching.
+    """
+
+    def __init__(self, path=DEFAULT_CATEGORY_HISTORY_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def is_empty(self):
+        return not self.conn.execute(
+            'SELECT 1 FROM item_categories LIMIT 1').fetchone()
+
+    def update(self, item_categories, start_date=None):
+        """Stores (trans id, original date, item name, category) tuples.
+
+        If start_date is given, item_categories are all there are since then
+        (by original date): older entries since then that aren't among them
+        (e.g. since retagged) are dropped.
+        """
+        with self.conn:
+            if start_date:
+                self.conn.execute(
+                    'DELETE FROM item_categories WHERE odate >= ?',
+                    (start_date.isoformat(),))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO item_categories VALUES (?, ?, ?, ?)',
+                [(trans_id, odate.isoformat(), item_name, category)
+                 for trans_id, odate, item_name, category in item_categories])
+
+    def get_item_to_categories(self):
+        """Returns a dict of item name to a Counter of its categories."""
+        result = defaultdict(Counter)
+        for item_name, category, count in self.conn.execute(
+                'SELECT item_name, category, COUNT(*) FROM item_categories '
+                'GROUP BY item_name, category'):
+            result[item_name][category] = count
+        return result
@@ -0,0 +1,55 @@
+from collections import Counter
+from datetime import date
+import os
+import tempfile
+import unittest
+
+from categoryhistory import CategoryHistory
+
+
+class CategoryHistoryClass(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'history.sqlite')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_update_and_reopen(self):
+        history = CategoryHistory(self.path)
+        self.assertTrue(history.is_empty())
+        history.update([
+            (1, date(2014, 2, 28), 'duracell aas', 'Electronics'),
+            (2, date(2014, 3, 1), 'duracell aas', 'Electronics'),
+            (3, date(2014, 3, 2), 'duracell aas', 'Home'),
+        ])
+        history.close()
+
+        history = CategoryHistory(self.path)
+        self.assertFalse(history.is_empty())
+        self.assertEqual(
+            history.get_item_to_categories(),
+            {'duracell aas': Counter(Electronics=2, Home=1)})
+        history.close()
+
+    def test_keeps_history_before_the_window(self):
+        history = CategoryHistory(self.path)
+        history.update([
+            (1, date(2012, 1, 1), 'old thing', 'Books'),
+            (2, date(2014, 3, 1), 'retagged', 'Books'),
+        ])
+
+        # Since 2014, trans 2 is no longer a tagged item.
+        history.update(
+            [(3, date(2014, 3, 5), 'new thing', 'Home')],
+            start_date=date(2014, 1, 1))
+
+        self.assertEqual(history.get_item_to_categories(), {
+            'old thing': Counter(Books=1),
+            'new thing': Counter(Home=1),
+        })
+        history.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,19 @@
+from functools import lru_cache
+
 # 50 Micro dollars we'll consider equal (this allows for some
 # division/multiplication rounding wiggle room).
 MICRO_USD_EPS = 50
 CENT_MICRO_USD = 10000
+MICRO_USD_PER_USD = 1000000
 
 DOLLAR_EPS = 0.0001
+# DOLLAR_EPS, in micro dollars, plus half a cent: rounding to the nearest cent
+# in integer math matches round_usd.
+ROUND_TO_CENT_MICRO_USD = 100 + CENT_MICRO_USD // 2
+
+# Report columns repeat the same few values ($0.00, common prices, etc) across
+# hundreds of thousands of cells.
+USD_CACHE_SIZE = 8192
 
 
 def micro_usd_nearly_equal(micro_a, micro_b):
@@ -14,22 +24,80 @@ def round_usd(curr):
     return round(curr + DOLLAR_EPS, 2)
 
 
+def micro_usd_to_cents(micro_usd):
+    """Rounds micro_usd to a whole number of cents, without floats."""
+    return int((micro_usd + ROUND_TO_CENT_MICRO_USD) // CENT_MICRO_USD)
+
+
 def round_micro_usd_to_cent(micro_usd):
-    return int(round_usd(micro_usd_to_usd_float(micro_usd)) * 1000000)
+    return micro_usd_to_cents(micro_usd) * CENT_MICRO_USD
 
 
 def micro_usd_to_usd_float(micro_usd):
-    return round_usd(micro_usd / 1000000.0)
+    return micro_usd_to_cents(micro_usd) / 100
 
 
 def micro_usd_to_usd_string(micro_usd):
-    return '{}${:.2f}'.format(
+    cents = micro_usd_to_cents(abs(micro_usd))
+    return '{}${}.{:02d}'.format(
         '' if micro_usd >= -5000 else '-',
-        micro_usd_to_usd_float(abs(micro_usd)))
+        cents // 100,
+        cents % 100)
 
 
 def parse_usd_as_micro_usd(amount):
-    return int(round_usd(parse_usd_as_float(amount)) * 1000000)
+    """Parses '$1,234.56' or '-$0.07' into micro USD, rounded to the cent."""
+    if not amount:
+        return 0
+    # The common case: '$1,234.56' or '-$0.07', in whole cents, so there is
+    # nothing to round. Any other '.' leaves digits that aren't all decimal.
+    if amount[:1] == '$' and amount[-3:-2] == '.':
+        digits = amount[1:-3].replace(',', '') + amount[-2:]
+        if digits.isdecimal():
+            return int(digits) * CENT_MICRO_USD
+    elif amount[:2] == '-$' and amount[-3:-2] == '.':
+        digits = amount[2:-3].replace(',', '') + amount[-2:]
+        if digits.isdecimal():
+            return -int(digits) * CENT_MICRO_USD
+    # Remove any formatting/grouping commas.
+    digits = amount.replace(',', '')
+    negate = '-' == digits[0]
+    if negate:
+        digits = digits[1:]
+    if '$' == digits[:1]:
+        digits = digits[1:]
+    dollars, _, fraction = digits.partition('.')
+    if (not (dollars or fraction) or
+            (dollars and not dollars.isdecimal()) or
+            (fraction and not fraction.isdecimal())):
+        # Something unusual (exponents, whitespace, etc): let float() decide.
+        return int(round_usd(parse_usd_as_float(amount)) * MICRO_USD_PER_USD)
+    micro_usd = (
+        int(dollars or 0) * MICRO_USD_PER_USD +
+        int((fraction + '000000')[:6]))
+    return round_micro_usd_to_cent(-micro_usd if negate else micro_usd)
+
+
+@lru_cache(maxsize=USD_CACHE_SIZE)
+def parse_usd_as_micro_usd_cached(amount):
+    """parse_usd_as_micro_usd, for reports repeating the same few values."""
+    return parse_usd_as_micro_usd(amount)
+
+
+def parse_usd_column_as_micro_usd(amounts):
+    """Parses a whole column of amounts at once.
+
+    Report columns repeat the same few values ($0.00, common prices, etc), so
+    each distinct value is only parsed once.
+    """
+    parsed = {}
+    result = []
+    for amount in amounts:
+        micro_usd = parsed.get(amount)
+        if micro_usd is None:
+            micro_usd = parsed[amount] = parse_usd_as_micro_usd(amount)
+        result.append(micro_usd)
+    return result
 
 
 def parse_usd_as_float(amount):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for currency parsing and formatting. Run directly:
+#   python3 currency_bench.py --values 200000
+
+import argparse
+import random
+import timeit
+
+import currency
+
+
+def legacy_parse_usd_as_micro_usd(amount):
+    """The float based parsing used before the integer-only path."""
+    return int(currency.round_usd(currency.parse_usd_as_float(amount)) *
+               1000000)
+
+
+def legacy_micro_usd_to_usd_string(micro_usd):
+    """The float based formatting used before the integer-only path."""
+    return '{}${:.2f}'.format(
+        '' if micro_usd >= -5000 else '-',
+        currency.round_usd(abs(micro_usd) / 1000000.0))
+
+
+def random_amounts(num_values, num_distinct, seed=42):
+    rand = random.Random(seed)
+    distinct = []
+    for _ in range(num_distinct):
+        cents = rand.randint(-5000, 200000)
+        distinct.append('{}${:,}.{:02d}'.format(
+            '-' if cents < 0 else '', abs(cents) // 100, abs(cents) % 100))
+    return [rand.choice(distinct) for _ in range(num_values)]
+
+
+def report(label, seconds, num_values):
+    print('{:<40} {:8.3f}s {:8.0f} ns/value'.format(
+        label, seconds, seconds / num_values * 1e9))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark currency parsing and formatting.')
+    parser.add_argument('--values', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    amounts = random_amounts(args.values, args.distinct)
+    micro_usds = [currency.parse_usd_as_micro_usd(a) for a in amounts]
+    legacy_mismatches = sum(
+        1 for a, m in zip(amounts, micro_usds)
+        if legacy_parse_usd_as_micro_usd(a) != m)
+
+    def best(fn):
+        return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+    print('{} values ({} distinct), best of {}:'.format(
+        args.values, args.distinct, args.repeat))
+    report('legacy parse (float)',
+           best(lambda: [legacy_parse_usd_as_micro_usd(a) for a in amounts]),
+           args.values)
+    report('parse_usd_as_micro_usd',
+           best(lambda: [currency.parse_usd_as_micro_usd(a)
+                         for a in amounts]),
+           args.values)
+    report('parse_usd_as_micro_usd_cached',
+           best(lambda: (currency.parse_usd_as_micro_usd_cached.cache_clear(),
+                         [currency.parse_usd_as_micro_usd_cached(a)
+                          for a in amounts])),
+           args.values)
+    report('parse_usd_column_as_micro_usd',
+           best(lambda: currency.parse_usd_column_as_micro_usd(amounts)),
+           args.values)
+    report('legacy format (float)',
+           best(lambda: [legacy_micro_usd_to_usd_string(m)
+                         for m in micro_usds]),
+           args.values)
+    report('micro_usd_to_usd_string',
+           best(lambda: [currency.micro_usd_to_usd_string(m)
+                         for m in micro_usds]),
+           args.values)
+    print('Values the legacy float parse got wrong: {}'.format(
+        legacy_mismatches))
+
+
+if __name__ == '__main__':
+    main()
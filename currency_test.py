@@ -24,6 +24,14 @@ class CurrencyMethods(unittest.TestCase):
         self.assertEqual(currency.round_usd(303.01), 303.01)
         self.assertEqual(currency.round_usd(-103.01), -103.01)
 
+    def test_micro_usd_to_cents(self):
+        self.assertEqual(currency.micro_usd_to_cents(50505050), 5051)
+        self.assertEqual(currency.micro_usd_to_cents(50514550), 5051)
+        self.assertEqual(currency.micro_usd_to_cents(-1005000), -100)
+        self.assertEqual(currency.micro_usd_to_cents(-1005200), -101)
+        self.assertEqual(currency.micro_usd_to_cents(550), 0)
+        self.assertEqual(currency.micro_usd_to_cents(1234567.8), 123)
+
     def test_round_micro_usd_to_cent(self):
         self.assertEqual(currency.round_micro_usd_to_cent(50505050), 50510000)
         self.assertEqual(currency.round_micro_usd_to_cent(50514550), 50510000)
@@ -41,6 +49,10 @@ class CurrencyMethods(unittest.TestCase):
         self.assertEqual(currency.micro_usd_to_usd_string(-123000), '-$0.12')
         self.assertEqual(currency.micro_usd_to_usd_string(-1900), '$0.00')
         self.assertEqual(currency.micro_usd_to_usd_string(-10000), '-$0.01')
+        self.assertEqual(
+            currency.micro_usd_to_usd_string(123456780000), '$123456.78')
+        self.assertEqual(
+            currency.micro_usd_to_usd_string(5000000 / 3), '$1.67')
 
     def test_parse_usd_as_micro_usd(self):
         self.assertEqual(currency.parse_usd_as_micro_usd('$1.23'), 1230000)
@@ -49,6 +61,39 @@ class CurrencyMethods(unittest.TestCase):
         self.assertEqual(currency.parse_usd_as_micro_usd('$55'), 55000000)
         self.assertEqual(currency.parse_usd_as_micro_usd('$12.23'), 12230000)
         self.assertEqual(currency.parse_usd_as_micro_usd('-$12.23'), -12230000)
+        self.assertEqual(
+            currency.parse_usd_as_micro_usd('$1,234.56'), 1234560000)
+        self.assertEqual(currency.parse_usd_as_micro_usd('-$0.07'), -70000)
+        self.assertEqual(currency.parse_usd_as_micro_usd('.5'), 500000)
+        self.assertEqual(currency.parse_usd_as_micro_usd('$1.005'), 1010000)
+        self.assertEqual(currency.parse_usd_as_micro_usd('$1.2.34'), 0)
+        self.assertEqual(currency.parse_usd_as_micro_usd('-.$3'), 0)
+        self.assertEqual(currency.parse_usd_as_micro_usd(''), 0)
+        self.assertEqual(currency.parse_usd_as_micro_usd(None), 0)
+        self.assertEqual(currency.parse_usd_as_micro_usd('$'), 0)
+        self.assertEqual(currency.parse_usd_as_micro_usd('$1e2'), 100000000)
+        self.assertEqual(
+            currency.parse_usd_as_micro_usd('$90,071,992,547.41'),
+            90071992547410000)
+        # This loses a micro dollar when going through a float.
+        self.assertEqual(currency.parse_usd_as_micro_usd('$2.01'), 2010000)
+
+    def test_parse_usd_as_micro_usd_cached(self):
+        currency.parse_usd_as_micro_usd_cached.cache_clear()
+        for _ in range(3):
+            self.assertEqual(
+                currency.parse_usd_as_micro_usd_cached('-$1,234.56'),
+                -1234560000)
+        self.assertEqual(
+            currency.parse_usd_as_micro_usd_cached.cache_info().misses, 1)
+        self.assertEqual(currency.parse_usd_as_micro_usd_cached(None), 0)
+
+    def test_parse_usd_column_as_micro_usd(self):
+        self.assertEqual(
+            currency.parse_usd_column_as_micro_usd(
+                ['$1.23', '', '$1.23', '-$0.07']),
+            [1230000, 0, 1230000, -70000])
+        self.assertEqual(currency.parse_usd_column_as_micro_usd([]), [])
 
     def test_parse_usd_as_float(self):
         self.assertEqual(currency.parse_usd_as_float('$1.23'), 1.23)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+# Generates a synthetic, internally consistent set of Amazon order history
+# reports along with the Mint transactions they were charged as, for
+# benchmarks. Run directly:
+#   python3 datagen.py --orders 10000 --out_dir /tmp/amazon-10k
+# The Mint transactions can be served with:
+#   python3 mint_standin.py --transactions_json "/tmp/amazon-10k/Mint
+#   Transactions.json"
+
+import argparse
+import csv
+from datetime import date, timedelta
+import json
+import os
+import random
+
+import category
+from currency import micro_usd_to_usd_string, CENT_MICRO_USD
+from mockdata import item_dict, order_dict, refund_dict, transaction_json
+
+ITEMS_CSV = 'Items.csv'
+ORDERS_CSV = 'Orders.csv'
+REFUNDS_CSV = 'Refunds.csv'
+MINT_TRANSACTIONS_JSON = 'Mint Transactions.json'
+
+# Fixed, so a seed always makes the same dataset.
+DEFAULT_END_DATE = date(2019, 12, 31)
+
+CARD_PAYMENT = 'Visa - 1234'
+GIFT_CARD_PAYMENT = 'Gift Certificate/Card and Visa - 1234'
+
+TAX_RATES = [0, 0.06, 0.0725, 0.1025]
+SHIPPING_CHARGES = [399, 599, 899]
+
+ADJECTIVES = [
+    'Classic', 'Compact', 'Deluxe', 'Durable', 'Eco', 'Ergonomic',
+    'Heavy Duty', 'Mini', 'Portable', 'Premium', 'Smart', 'Wireless']
+NOUNS = [
+    'Batteries', 'Blender', 'Cable', 'Charger', 'Coffee Beans', 'Desk Lamp',
+    'Headphones', 'Jacket', 'Notebook', 'Running Shoes', 'Shampoo',
+    'Socks', 'Tent', 'Toothbrush', 'Water Bottle', 'Wrench']
+NON_AMAZON_MERCHANTS = [
+    ('Whole Foods', 'WHOLEFDS'),
+    ('Shell', 'SHELL OIL'),
+    ('Netflix', 'NETFLIX.COM'),
+    ('Target', 'TARGET T-1234'),
+]
+
+
+def default_num_days(num_orders):
+    """About 30 order ids a day, for at most 10 years."""
+    return min(3650, max(30, num_orders // 30))
+
+
+def to_usd(cents):
+    return micro_usd_to_usd_string(cents * CENT_MICRO_USD)
+
+
+def to_amazon_date(d):
+    return d.strftime('%m/%d/%y')
+
+
+class DatasetGenerator:
+    """Makes up orders, one order id at a time, as the rows Amazon would
+    report for them (orders, items and refunds) and the Mint transactions
+    they were charged (and refunded) as.
+
+    The mix of what orders look like is set by the rates, each the fraction
+    of order ids (or of their shipments, items) something happens to:
+    several shipments, items bought more than one at a time, promotions,
+    free shipping, partly (or fully) paying with a gift card, refunds, and
+    shipments charged together as one transaction. Other (non Amazon) Mint
+    transactions are sprinkled in, other_trans_rate per order id.
+    """
+
+    def __init__(self, seed=0, end_date=DEFAULT_END_DATE, num_days=365,
+                 num_products=5000, multi_shipment_rate=0.15,
+                 multi_quantity_rate=0.2, promotion_rate=0.1,
+                 free_shipping_rate=0.3, gift_card_rate=0.03,
+                 refund_rate=0.05, combined_charge_rate=0.05,
+                 missing_tracking_rate=0.1, other_trans_rate=0.5):
+        self.rand = random.Random(seed)
+        self.start_date = end_date - timedelta(days=num_days)
+        self.num_days = num_days
+        self.multi_shipment_rate = multi_shipment_rate
+        self.multi_quantity_rate = multi_quantity_rate
+        self.promotion_rate = promotion_rate
+        self.free_shipping_rate = free_shipping_rate
+        self.gift_card_rate = gift_card_rate
+        self.refund_rate = refund_rate
+        self.combined_charge_rate = combined_charge_rate
+        self.missing_tracking_rate = missing_tracking_rate
+        self.other_trans_rate = other_trans_rate
+        self.amazon_categories = sorted(category.AMAZON_TO_MINT_CATEGORY)
+        # Products get bought again and again, like in real life (and for
+        # category history to learn from).
+        self.products = [self.make_product(i) for i in range(num_products)]
+        self.products_by_asin = {p['asin']: p for p in self.products}
+        self.num_orders = 0
+        self.num_trans = 0
+        self.num_tracking = 0
+
+    def make_product(self, i):
+        rand = self.rand
+        return {
+            'title': '{} {} {}'.format(
+                rand.choice(ADJECTIVES), rand.choice(NOUNS), i),
+            'asin': 'B{:09d}'.format(i),
+            'category': rand.choice(self.amazon_categories),
+            'price': int(rand.lognormvariate(7, 1)) + 99,
+        }
+
+    def next_trans_id(self):
+        self.num_trans += 1
+        return 1000000000 + self.num_trans
+
+    def next_tracking(self):
+        self.num_tracking += 1
+        return 'AMZN_US(TBA{:012d})'.format(self.num_tracking)
+
+    def make_trans(self, cents, d, is_debit=True, merchant='Amazon',
+                   description='AMAZON MKTPLACE PMTS'):
+        return transaction_json(
+            amount=to_usd(cents),
+            is_debit=is_debit,
+            category='Shopping' if is_debit else 'Returned Purchase',
+            date=to_amazon_date(d),
+            merchant=merchant,
+            original_description=description,
+            id=self.next_trans_id(),
+            note='')
+
+    def other_trans(self):
+        rand = self.rand
+        merchant, description = rand.choice(NON_AMAZON_MERCHANTS)
+        return self.make_trans(
+            rand.randint(100, 20000),
+            self.start_date + timedelta(days=rand.randrange(self.num_days)),
+            merchant=merchant, description=description)
+
+    def order(self):
+        """Returns the (order rows, item rows, refund rows, Mint
+        transactions) of a new order id."""
+        rand = self.rand
+        self.num_orders += 1
+        i = self.num_orders
+        order_id = '{:03d}-{:07d}-{:07d}'.format(
+            100 + i % 900, i // 900, rand.randrange(10000000))
+        order_date = self.start_date + timedelta(
+            days=rand.randrange(self.num_days))
+        tax_rate = rand.choice(TAX_RATES)
+        gift_card = rand.random() < self.gift_card_rate
+        payment_type = GIFT_CARD_PAYMENT if gift_card else CARD_PAYMENT
+        num_shipments = (
+            rand.randint(2, 4) if rand.random() < self.multi_shipment_rate
+            else 1)
+        combined = (num_shipments > 1 and
+                    rand.random() < self.combined_charge_rate)
+        missing_tracking = (num_shipments > 1 and
+                            rand.random() < self.missing_tracking_rate)
+
+        orders, items, refunds, trans = [], [], [], []
+        charges = []
+        ship_date = order_date + timedelta(days=rand.randint(0, 2))
+        for _ in range(num_shipments):
+            ship_date += timedelta(days=rand.randint(0, 1 if combined else 3))
+            tracking = self.next_tracking()
+            shipment_items = []
+            for product in rand.sample(self.products, rand.randint(1, 4)):
+                quantity = (rand.randint(2, 5)
+                            if rand.random() < self.multi_quantity_rate
+                            else 1)
+                subtotal = product['price'] * quantity
+                tax = round(subtotal * tax_rate)
+                shipment_items.append((product, quantity, subtotal, tax))
+                items.append(item_dict(
+                    title=product['title'],
+                    item_subtotal=to_usd(subtotal),
+                    item_subtotal_tax=to_usd(tax),
+                    item_total=to_usd(subtotal + tax),
+                    purchase_price_per_unit=to_usd(product['price']),
+                    tracking='' if missing_tracking else tracking,
+                    quantity=quantity,
+                    order_id=order_id,
+                    order_date=to_amazon_date(order_date),
+                    shipment_date=to_amazon_date(ship_date),
+                    payment_type=payment_type,
+                    category=product['category'],
+                    asin=product['asin']))
+
+            subtotal = sum(s for _, _, s, _ in shipment_items)
+            tax_before_promotions = sum(t for _, _, _, t in shipment_items)
+            shipping = 0
+            promotions = 0
+            tax = tax_before_promotions
+            if rand.random() < 0.3:
+                shipping = rand.choice(SHIPPING_CHARGES)
+                if rand.random() < self.free_shipping_rate:
+                    promotions += shipping
+            if rand.random() < self.promotion_rate:
+                discount = rand.randint(1, max(1, subtotal // 5))
+                promotions += discount
+                # Tax is charged on the discounted price.
+                tax = round((subtotal - discount) * tax_rate)
+            total = subtotal + shipping + tax - promotions
+            orders.append(order_dict(
+                subtotal=to_usd(subtotal),
+                shipping_charge=to_usd(shipping),
+                tax_charged=to_usd(tax),
+                total_charged=to_usd(total),
+                tax_before_promotions=to_usd(tax_before_promotions),
+                total_promotions=to_usd(promotions),
+                tracking=tracking,
+                order_id=order_id,
+                order_date=to_amazon_date(order_date),
+                shipment_date=to_amazon_date(ship_date),
+                payment_type=payment_type))
+
+            charged = total
+            if gift_card:
+                # Some of it (maybe all) was paid with the gift card.
+                charged = (0 if rand.random() < 0.3
+                           else rand.randint(1, max(1, total - 1)))
+            charges.append((charged, ship_date))
+
+        if combined:
+            # Charged once, when all of it shipped.
+            charges = [(sum(c for c, _ in charges), ship_date)]
+        for charged, charge_date in charges:
+            if charged:
+                trans.append(self.make_trans(
+                    charged,
+                    charge_date + timedelta(days=rand.randint(0, 2))))
+
+        for product, quantity, subtotal, tax in self.refundable(
+                items, tax_rate):
+            refund_date = ship_date + timedelta(days=rand.randint(3, 30))
+            refunds.append(refund_dict(
+                title=product['title'],
+                refund_amount=to_usd(subtotal),
+                refund_tax_amount=to_usd(tax),
+                tracking='',
+                quantity=quantity,
+                order_id=order_id,
+                order_date=to_amazon_date(order_date),
+                refund_date=to_amazon_date(refund_date),
+                category=product['category'],
+                asin=product['asin']))
+            trans.append(self.make_trans(
+                subtotal + tax,
+                refund_date + timedelta(days=rand.randint(0, 3)),
+                is_debit=False))
+
+        if rand.random() < self.other_trans_rate:
+            trans.append(self.other_trans())
+        return orders, items, refunds, trans
+
+    def refundable(self, items, tax_rate):
+        """Yields (product, quantity, subtotal, tax) of the items of an
+        order to refund (some units of)."""
+        for item in items:
+            if self.rand.random() >= self.refund_rate:
+                continue
+            product = self.products_by_asin[item['ASIN/ISBN']]
+            quantity = self.rand.randint(1, int(item['Quantity']))
+            subtotal = product['price'] * quantity
+            yield product, quantity, subtotal, round(subtotal * tax_rate)
+
+
+def write_dataset(out_dir, num_orders, generator=None):
+    """Writes num_orders order ids worth of reports and Mint transactions
+    (as JSON) into out_dir, one order id at a time. Returns the number of
+    rows/transactions written per file name."""
+    generator = generator or DatasetGenerator()
+    os.makedirs(out_dir, exist_ok=True)
+    counts = dict.fromkeys(
+        (ORDERS_CSV, ITEMS_CSV, REFUNDS_CSV, MINT_TRANSACTIONS_JSON), 0)
+    files = {name: open(os.path.join(out_dir, name), 'w', newline='')
+             for name in counts}
+    try:
+        writers = {}
+
+        def write_rows(name, rows):
+            if not rows:
+                return
+            if name not in writers:
+                writers[name] = csv.DictWriter(
+                    files[name], fieldnames=list(rows[0].keys()))
+                writers[name].writeheader()
+            writers[name].writerows(rows)
+            counts[name] += len(rows)
+
+        trans_file = files[MINT_TRANSACTIONS_JSON]
+        trans_file.write('[')
+        for _ in range(num_orders):
+            orders, items, refunds, trans = generator.order()
+            write_rows(ORDERS_CSV, orders)
+            write_rows(ITEMS_CSV, items)
+            write_rows(REFUNDS_CSV, refunds)
+            for t in trans:
+                trans_file.write(
+                    ',\n' if counts[MINT_TRANSACTIONS_JSON] else '\n')
+                json.dump(t, trans_file)
+                counts[MINT_TRANSACTIONS_JSON] += 1
+        trans_file.write('\n]\n')
+        if not counts[REFUNDS_CSV]:
+            # Like Amazon, say so rather than leaving the report empty.
+            files[REFUNDS_CSV].write(
+                ','.join(refund_dict().keys()) + '\n'
+                'No data found for this time period\n')
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic Amazon reports and Mint '
+                    'transactions.')
+    parser.add_argument('--orders', type=int, default=10000,
+                        help='How many order ids to make up.')
+    parser.add_argument('--out_dir', default='synthetic-data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--days', type=int, default=None,
+        help='How many days the orders span (by default, about 30 order '
+             'ids a day, for at most 10 years).')
+    parser.add_argument(
+        '--end_date', type=date.fromisoformat, default=DEFAULT_END_DATE,
+        help='The last day orders are placed (YYYY-MM-DD).')
+    args = parser.parse_args()
+
+    generator = DatasetGenerator(
+        seed=args.seed, end_date=args.end_date,
+        num_days=args.days or default_num_days(args.orders))
+    counts = write_dataset(args.out_dir, args.orders, generator)
+    for name, count in counts.items():
+        print('{}: {}'.format(os.path.join(args.out_dir, name), count))
+
+
+if __name__ == '__main__':
+    main()
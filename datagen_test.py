@@ -0,0 +1,109 @@
+from collections import Counter
+import json
+import os
+import tempfile
+import unittest
+
+import amazon
+from datagen import (
+    DatasetGenerator, write_dataset, GIFT_CARD_PAYMENT, ITEMS_CSV,
+    MINT_TRANSACTIONS_JSON, ORDERS_CSV, REFUNDS_CSV)
+import mint
+import tagger
+from tagger_test import get_args
+
+
+class DatagenTest(unittest.TestCase):
+    def write(self, num_orders, **kwargs):
+        out_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(out_dir.cleanup)
+        counts = write_dataset(
+            out_dir.name, num_orders, DatasetGenerator(**kwargs))
+        return out_dir.name, counts
+
+    def read(self, out_dir, name):
+        with open(os.path.join(out_dir, name)) as f:
+            return f.read()
+
+    def parse(self, out_dir):
+        with open(os.path.join(out_dir, ORDERS_CSV)) as f:
+            orders = amazon.Order.parse_from_csv(f)
+        with open(os.path.join(out_dir, ITEMS_CSV)) as f:
+            items = amazon.Item.parse_from_csv(f)
+        with open(os.path.join(out_dir, REFUNDS_CSV)) as f:
+            refunds = amazon.Refund.parse_from_csv(f)
+        with open(os.path.join(out_dir, MINT_TRANSACTIONS_JSON)) as f:
+            trans = mint.Transaction.parse_from_json(json.load(f))
+        return orders, items, refunds, trans
+
+    def test_same_seed_same_data(self):
+        dir1, _ = self.write(50, seed=3)
+        dir2, _ = self.write(50, seed=3)
+        dir3, _ = self.write(50, seed=4)
+        for name in (ORDERS_CSV, ITEMS_CSV, REFUNDS_CSV,
+                     MINT_TRANSACTIONS_JSON):
+            self.assertEqual(self.read(dir1, name), self.read(dir2, name))
+        self.assertNotEqual(self.read(dir1, ITEMS_CSV),
+                            self.read(dir3, ITEMS_CSV))
+
+    def test_covers_the_variety(self):
+        out_dir, counts = self.write(500, seed=1)
+        orders, items, refunds, trans = self.parse(out_dir)
+
+        self.assertEqual(len(orders), counts[ORDERS_CSV])
+        self.assertEqual(len(items), counts[ITEMS_CSV])
+        self.assertEqual(len(refunds), counts[REFUNDS_CSV])
+        self.assertEqual(len(trans), counts[MINT_TRANSACTIONS_JSON])
+        self.assertEqual(len(set(o.order_id for o in orders)), 500)
+        self.assertEqual(len(set(t.id for t in trans)), len(trans))
+
+        shipments = Counter(o.order_id for o in orders)
+        self.assertTrue(any(n > 1 for n in shipments.values()))
+        self.assertTrue(any(i.quantity > 1 for i in items))
+        self.assertTrue(any(not i.tracking for i in items))
+        self.assertTrue(any(o.total_promotions for o in orders))
+        self.assertTrue(any(
+            o.shipping_charge and o.total_promotions >= o.shipping_charge
+            for o in orders))
+        self.assertTrue(any(
+            o.payment_instrument_type == GIFT_CARD_PAYMENT for o in orders))
+        self.assertTrue(refunds)
+        self.assertTrue(any(t.merchant != 'Amazon' for t in trans))
+
+        for o in orders:
+            self.assertEqual(
+                o.total_charged,
+                o.subtotal + o.shipping_charge + o.tax_charged -
+                o.total_promotions)
+
+    def test_items_add_up_to_their_shipments(self):
+        out_dir, _ = self.write(300, seed=2)
+        orders, items, _, _ = self.parse(out_dir)
+
+        amazon.associate_items_with_orders(orders, items)
+
+        for o in orders:
+            self.assertEqual(
+                sum(i.item_subtotal for i in o.items), o.subtotal)
+
+    def test_tagger_matches_the_orders(self):
+        out_dir, _ = self.write(300, seed=5)
+        orders, items, refunds, trans = self.parse(out_dir)
+        stats = Counter()
+
+        updates, unmatched = tagger.get_mint_updates(
+            orders, items, refunds, trans, get_args(), stats)
+
+        # Only (some) gift card orders and shipments charged together go
+        # unmatched.
+        shipments = Counter(o.order_id for o in orders)
+        self.assertTrue(all(
+            o.payment_instrument_type == GIFT_CARD_PAYMENT or
+            shipments[o.order_id] > 1
+            for o in unmatched))
+        self.assertEqual(stats['refund_match'], len(refunds))
+        self.assertGreater(stats['order_match'], 0.9 * len(orders))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+from datetime import date, datetime
+from functools import lru_cache
+
+# Reports span a few thousand distinct days at most, while the same dates are
+# repeated across hundreds of thousands of cells.
+DATE_CACHE_SIZE = 8192
+
+MONTH_ABBREVIATIONS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+
+def parse_slash_date(date_str):
+    """Parses 'MM/DD/YYYY' or 'MM/DD/YY' without going through strptime.
+
+    Returns None if date_str is not in either format.
+    """
+    parts = date_str.split('/')
+    if len(parts) != 3:
+        return None
+    month, day, year = parts
+    if not (month.isdigit() and day.isdigit() and year.isdigit()):
+        return None
+    if len(month) > 2 or len(day) > 2:
+        return None
+    if len(year) == 2:
+        # Same pivot as strptime's %y: 69-99 are 1900s, 00-68 are 2000s.
+        year = int(year)
+        year += 1900 if year >= 69 else 2000
+    elif len(year) == 4:
+        year = int(year)
+    else:
+        return None
+    return date(year, int(month), int(day))
+
+
+def parse_month_day(date_str, year):
+    """Parses 'Mon DD' (e.g. 'Feb 28') into a date in the given year.
+
+    Returns None if date_str is not in this format.
+    """
+    parts = date_str.split(' ')
+    if len(parts) != 2:
+        return None
+    month = MONTH_ABBREVIATIONS.get(parts[0].lower())
+    if not month or not parts[1].isdigit() or len(parts[1]) > 2:
+        return None
+    return date(year, month, int(parts[1]))
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_amazon_date_cached(date_str):
+    result = parse_slash_date(date_str)
+    if result:
+        return result
+    # Fall back to strptime for anything unexpected (and its errors).
+    try:
+        return datetime.strptime(date_str, '%m/%d/%Y').date()
+    except ValueError:
+        return datetime.strptime(date_str, '%m/%d/%y').date()
+
+
+def parse_amazon_date(date_str):
+    if not date_str:
+        return None
+    return parse_amazon_date_cached(date_str)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_mint_date(date_str):
+    # Mint omits the year for transactions in the current year. The current
+    # year is only looked up on a cache miss; a single run does not
+    # realistically span New Year's.
+    current_year = date.today().year
+    result = parse_month_day(date_str, current_year)
+    if not result:
+        result = parse_slash_date(date_str)
+    if result:
+        return result
+    try:
+        new_date = datetime.strptime(date_str + str(current_year), '%b %d%Y')
+    except ValueError:
+        new_date = datetime.strptime(date_str, '%m/%d/%y')
+    return new_date.date()
+
+
+def get_date_cache_stats():
+    """Returns a dict of cache name to its hits, misses and hit rate."""
+    result = {}
+    for name, fn in (('amazon', parse_amazon_date_cached),
+                     ('mint', parse_mint_date)):
+        info = fn.cache_info()
+        lookups = info.hits + info.misses
+        result[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+        }
+    return result
+
+
+def clear_date_caches():
+    parse_amazon_date_cached.cache_clear()
+    parse_mint_date.cache_clear()
@@ -0,0 +1,60 @@
+from datetime import date
+import unittest
+
+import dates
+
+
+class DateMethods(unittest.TestCase):
+    def test_parse_slash_date(self):
+        self.assertEqual(dates.parse_slash_date('10/8/10'), date(2010, 10, 8))
+        self.assertEqual(dates.parse_slash_date('1/23/69'), date(1969, 1, 23))
+        self.assertEqual(dates.parse_slash_date('1/23/68'), date(2068, 1, 23))
+        self.assertEqual(
+            dates.parse_slash_date('07/21/2010'), date(2010, 7, 21))
+
+        self.assertIsNone(dates.parse_slash_date('Feb 28'))
+        self.assertIsNone(dates.parse_slash_date('10/8/010'))
+        self.assertIsNone(dates.parse_slash_date('2010-07-21'))
+        self.assertIsNone(dates.parse_slash_date('1/2/3/4'))
+
+    def test_parse_month_day(self):
+        self.assertEqual(
+            dates.parse_month_day('Feb 28', 2014), date(2014, 2, 28))
+        self.assertEqual(
+            dates.parse_month_day('oct 08', 2014), date(2014, 10, 8))
+
+        self.assertIsNone(dates.parse_month_day('10/8/10', 2014))
+        self.assertIsNone(dates.parse_month_day('Febr 28', 2014))
+
+    def test_parse_amazon_date(self):
+        self.assertIsNone(dates.parse_amazon_date(''))
+        self.assertIsNone(dates.parse_amazon_date(None))
+        self.assertEqual(
+            dates.parse_amazon_date('02/28/14'),
+            date(2014, 2, 28))
+        with self.assertRaises(ValueError):
+            dates.parse_amazon_date('02/30/14')
+        with self.assertRaises(ValueError):
+            dates.parse_amazon_date('not a date')
+
+    def test_parse_mint_date(self):
+        with self.assertRaises(ValueError):
+            dates.parse_mint_date('Smarch 12')
+
+    def test_get_date_cache_stats(self):
+        dates.clear_date_caches()
+        for _ in range(3):
+            dates.parse_amazon_date('01/02/03')
+        dates.parse_mint_date('Jan 10')
+
+        stats = dates.get_date_cache_stats()
+        self.assertEqual(stats['amazon']['hits'], 2)
+        self.assertEqual(stats['amazon']['misses'], 1)
+        self.assertEqual(stats['amazon']['size'], 1)
+        self.assertAlmostEqual(stats['amazon']['hit_rate'], 2 / 3)
+        self.assertEqual(stats['mint']['hits'], 0)
+        self.assertEqual(stats['mint']['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Benchmarks for matching Mint transactions with combinations of shipments
+# charged together. Run directly:
+#   python3 match_bench.py --orders 5 --shipments 20
+
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+import itertools
+import random
+import time
+
+import matcher
+from mockdata import order, transaction
+
+
+def legacy_index_combinations(groups):
+    """The every-combination index used before matcher.index_combinations."""
+    amount_to_orders = defaultdict(list)
+    for group in groups:
+        combos = []
+        for r in range(2, len(group) + 1):
+            combos.extend(itertools.combinations(group, r))
+        for c in combos:
+            orders_total = sum([o.transact_amount() for o in c])
+            amount_to_orders[orders_total].append(c)
+    return amount_to_orders
+
+
+def synthetic_orders(num_orders, num_shipments, seed):
+    """Returns groups of shipments, and one transaction per group charging a
+    few of its shipments together."""
+    rng = random.Random(seed)
+    groups = []
+    trans = []
+    for o in range(num_orders):
+        order_id = '{:03d}-{:07d}-{:07d}'.format(o, o, o)
+        # An order a week.
+        charge_date = date(2014, 1, 1) + timedelta(days=7 * o)
+        group = [
+            order(order_id=order_id,
+                  total_charged='${}.{:02d}'.format(
+                      rng.randint(5, 200), rng.randint(0, 99)),
+                  tracking='T{}'.format(s),
+                  shipment_date=(
+                      charge_date - timedelta(days=rng.randint(0, 2))
+                  ).strftime('%m/%d/%y'))
+            for s in range(num_shipments)
+        ]
+        charged = rng.sample(group, rng.randint(2, min(6, num_shipments)))
+        total = sum(s.transact_amount() for s in charged)
+        trans.append(transaction(
+            amount='${}.{:02d}'.format(
+                total // 1000000, total % 1000000 // 10000),
+            date=charge_date.strftime('%m/%d/%y'),
+            id=o))
+        groups.append(group)
+    return groups, trans
+
+
+def synthetic_same_day_orders(num_orders, orders_per_day, seed):
+    """Returns single shipment orders, a few shipped each day, and one
+    transaction per day charging two or three of them together."""
+    rng = random.Random(seed)
+    orders = []
+    trans = []
+    for o in range(num_orders):
+        ship_date = date(2014, 1, 1) + timedelta(days=o // orders_per_day)
+        orders.append(order(
+            order_id='{:03d}-{:07d}-{:07d}'.format(o % 1000, o, o),
+            total_charged='${}.{:02d}'.format(
+                rng.randint(5, 200), rng.randint(0, 99)),
+            shipment_date=ship_date.strftime('%m/%d/%y')))
+        if o % orders_per_day == orders_per_day - 1:
+            day = orders[-orders_per_day:]
+            charged = rng.sample(day, rng.randint(2, min(3, len(day))))
+            total = sum(s.transact_amount() for s in charged)
+            trans.append(transaction(
+                amount='${}.{:02d}'.format(
+                    total // 1000000, total % 1000000 // 10000),
+                date=ship_date.strftime('%m/%d/%y'),
+                id=o))
+    return orders, trans
+
+
+def time_it(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print('{:<40} {:8.3f}s'.format(label, time.perf_counter() - start))
+    return result
+
+
+def bench_combinations(num_orders, num_shipments, seed, legacy):
+    groups, trans = synthetic_orders(num_orders, num_shipments, seed)
+    print('{} orders of {} shipments, one combined charge each:'.format(
+        num_orders, num_shipments))
+
+    if legacy:
+        amount_to_orders = time_it(
+            'legacy: every combination',
+            lambda: legacy_index_combinations(groups))
+        print('{:<40} {:8d}'.format(
+            '  combinations built',
+            sum(len(c) for c in amount_to_orders.values())))
+
+    index = time_it(
+        'indexed: combinations near charges',
+        lambda: matcher.index_combinations(groups, trans))
+    print('{:<40} {:8d}'.format(
+        '  combinations built', index.num_added))
+
+    matches = matcher.match_nearest(trans, index)
+    print('{:<40} {:8d} of {}'.format(
+        '  transactions matched', len(matches), len(trans)))
+
+
+def bench_same_day(num_orders, orders_per_day, seed):
+    orders, trans = synthetic_same_day_orders(
+        num_orders, orders_per_day, seed)
+    print('{} unmatched orders, {} a day, one combined charge a day:'.format(
+        num_orders, orders_per_day))
+
+    def same_day_pass():
+        date_to_orders = defaultdict(list)
+        for o in orders:
+            date_to_orders[o.transact_date()].append(o)
+        return matcher.index_combinations(date_to_orders.values(), trans)
+
+    index = time_it('indexed: same day combinations', same_day_pass)
+    matches = matcher.match_nearest(trans, index)
+    print('{:<40} {:8d} of {}'.format(
+        '  transactions matched', len(matches), len(trans)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark matching combined charges.')
+    parser.add_argument('--orders', type=int, default=3)
+    parser.add_argument('--shipments', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--same_day_orders', type=int, default=10000)
+    parser.add_argument('--orders_per_day', type=int, default=8)
+    parser.add_argument(
+        '--skip_legacy', action='store_true',
+        help='Skip enumerating every combination (2^shipments per order).')
+    args = parser.parse_args()
+
+    bench_combinations(
+        args.orders, args.shipments, args.seed, not args.skip_legacy)
+    bench_same_day(args.same_day_orders, args.orders_per_day, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from budget import Budget, BudgetExhausted
+from currency import MICRO_USD_EPS
+from subset_sum import subsets_with_sums
+
+# Only consider it a match if the posted date (transaction date) is within
+# 3 days of the ship date of the order.
+MAX_MATCH_DAYS = 3
+
+# Limits on looking for combinations of orders charged together: how many
+# combinations adding up to the same charge to keep, and how many search
+# steps to spend on each group of orders.
+MAX_COMBINATIONS_PER_AMOUNT = 16
+DEFAULT_COMBINATION_SEARCH_STEPS = 2000000
+DEFAULT_COMBINATION_SEARCH_SECONDS = 2.0
+
+
+def new_combination_search_budget():
+    return Budget(
+        DEFAULT_COMBINATION_SEARCH_STEPS, DEFAULT_COMBINATION_SEARCH_SECONDS)
+
+
+def transact_date(orders):
+    """Returns the first transact date of a group of orders/refunds."""
+    return next((o.transact_date() for o in orders if o.transact_date()), None)
+
+
+class AmountDateIndex:
+    """Match candidates (e.g. groups of orders) indexed by amount, with each
+    amount's candidates sorted by date.
+
+    Amounts match within tolerance (in micro dollars; the default only
+    forgives rounding wiggle room). The distinct amounts are kept sorted, so
+    finding every candidate near an amount and a date is a few bisects
+    instead of a scan over all candidates.
+    """
+
+    def __init__(self, tolerance=MICRO_USD_EPS):
+        self.tolerance = tolerance
+        # amount -> list of (date, seq, candidate); seq keeps ties in the
+        # order candidates were added.
+        self.entries = {}
+        self.num_added = 0
+        self.amounts = None
+        self.buckets = None
+
+    def add(self, amount, date, candidate):
+        if not date:
+            return
+        self.entries.setdefault(amount, []).append(
+            (date, self.num_added, candidate))
+        self.num_added += 1
+        self.buckets = None
+
+    def get_buckets(self):
+        if self.buckets is None:
+            self.buckets = {}
+            for amount, entries in self.entries.items():
+                entries.sort(key=lambda e: e[:2])
+                self.buckets[amount] = (
+                    [e[0] for e in entries], entries)
+            self.amounts = sorted(self.buckets)
+        return self.buckets
+
+    def near(self, amount, date, max_days=MAX_MATCH_DAYS):
+        """Yields (amount_diff, num_days, seq, candidate) for every candidate
+        within tolerance of amount and dated within max_days of date."""
+        buckets = self.get_buckets()
+        if not date:
+            return
+        lo = bisect_right(self.amounts, amount - self.tolerance)
+        hi = bisect_left(self.amounts, amount + self.tolerance)
+        for cand_amount in self.amounts[lo:hi]:
+            dates, entries = buckets[cand_amount]
+            date_lo = bisect_left(dates, date - timedelta(days=max_days))
+            date_hi = bisect_right(dates, date + timedelta(days=max_days))
+            for cand_date, seq, candidate in entries[date_lo:date_hi]:
+                yield (abs(amount - cand_amount),
+                       abs((date - cand_date).days),
+                       seq,
+                       candidate)
+
+
+def match_nearest(trans, index, max_days=MAX_MATCH_DAYS):
+    """Matches transactions with groups of orders/refunds from index of the
+    same amount (within the index's tolerance) within max_days.
+
+    Conflicts are settled globally rather than in transaction order: every
+    (transaction, group) pair in range is ranked by how far apart their
+    amounts are, then by how many days apart they are. Pairs are taken
+    nearest first unless the transaction or any order of the group is
+    already matched.
+
+    Returns the list of (transaction, group) matches made.
+    """
+    pairs = []
+    for t_idx, t in enumerate(trans):
+        if t.orders:
+            continue
+        for diff, num_days, seq, group in index.near(
+                t.amount, t.odate, max_days):
+            pairs.append((diff, num_days, t_idx, seq, group))
+    pairs.sort(key=lambda p: p[:4])
+
+    matched_trans = set()
+    matches = []
+    for _, _, t_idx, _, group in pairs:
+        if t_idx in matched_trans or any(o.matched for o in group):
+            continue
+        t = trans[t_idx]
+        for o in group:
+            o.match(t)
+        t.match(group)
+        matched_trans.add(t_idx)
+        matches.append((t, group))
+    return matches
+
+
+def spans_order_ids(group):
+    """Returns whether the orders at indexes (of group) are of more than
+    one order id, as a function of indexes."""
+    order_ids = [o.order_id for o in group]
+
+    def accept(indexes):
+        first = order_ids[indexes[0]]
+        return any(order_ids[i] != first for i in indexes)
+
+    return accept
+
+
+def index_combinations(groups, trans, max_days=MAX_MATCH_DAYS,
+                       tolerance=MICRO_USD_EPS,
+                       make_budget=new_combination_search_budget, stats=None,
+                       multiple_order_ids=False):
+    """Indexes the combinations (of 2 or more) of each group of orders/refunds
+    that could have been charged together as one of trans.
+
+    Rather than building every combination of a group, only those adding up
+    to the amount (within tolerance) of a transaction dated within max_days
+    of one of the group's orders are searched for (see subsets_with_sums).
+    Groups whose search runs over its budget are left out (and counted as
+    combination_search_exhausted in stats, if given). With
+    multiple_order_ids, combinations of a single order id are left out too.
+
+    Returns an AmountDateIndex of the combinations (tuples of orders).
+    """
+    by_date = sorted((t.odate, t.amount) for t in trans if t.odate)
+    dates = [d for d, _ in by_date]
+
+    index = AmountDateIndex(tolerance)
+    for group in groups:
+        if len(group) < 2:
+            continue
+        amounts = set()
+        for d in set(o.transact_date() for o in group):
+            if not d:
+                continue
+            lo = bisect_left(dates, d - timedelta(days=max_days))
+            hi = bisect_right(dates, d + timedelta(days=max_days))
+            amounts.update(amount for _, amount in by_date[lo:hi])
+        if not amounts:
+            continue
+        group_amounts = [o.transact_amount() for o in group]
+        # Left out within the search, so they don't take up the places (per
+        # amount) of combinations that are kept.
+        accept = spans_order_ids(group) if multiple_order_ids else None
+        try:
+            subsets = subsets_with_sums(
+                group_amounts,
+                amounts,
+                eps=tolerance,
+                min_size=2,
+                max_per_target=MAX_COMBINATIONS_PER_AMOUNT,
+                budget=make_budget(),
+                accept=accept)
+        except BudgetExhausted:
+            if stats is not None:
+                stats['combination_search_exhausted'] += 1
+            continue
+        seen = set()
+        for found in subsets.values():
+            for indexes in found:
+                # Close enough to more than one charge.
+                if indexes in seen:
+                    continue
+                seen.add(indexes)
+                combo = tuple(group[i] for i in indexes)
+                index.add(
+                    sum(group_amounts[i] for i in indexes),
+                    transact_date(combo),
+                    combo)
+    return index
@@ -0,0 +1,196 @@
+from datetime import date
+import unittest
+
+from matcher import AmountDateIndex, index_combinations, match_nearest
+from mockdata import order, transaction
+
+
+def index_orders(orders):
+    index = AmountDateIndex()
+    for o in orders:
+        index.add(o.transact_amount(), o.transact_date(), [o])
+    return index
+
+
+class AmountDateIndexClass(unittest.TestCase):
+    def test_near(self):
+        index = AmountDateIndex()
+        index.add(100, date(2014, 3, 1), 'a')
+        index.add(100, date(2014, 3, 9), 'b')
+        index.add(100, date(2014, 2, 27), 'c')
+        index.add(200, date(2014, 3, 1), 'd')
+        index.add(100, None, 'never shipped')
+
+        self.assertEqual(
+            list(index.near(100, date(2014, 2, 28))),
+            [(0, 1, 2, 'c'), (0, 1, 0, 'a')])
+        self.assertEqual(
+            list(index.near(100, date(2014, 3, 12))), [(0, 3, 1, 'b')])
+        self.assertEqual(list(index.near(300, date(2014, 3, 1))), [])
+        self.assertEqual(list(index.near(100, None)), [])
+
+    def test_tolerance(self):
+        index = AmountDateIndex(tolerance=10050)
+        index.add(1000000, date(2014, 3, 1), 'a')
+        index.add(1020000, date(2014, 3, 1), 'b')
+        index.add(1030000, date(2014, 3, 1), 'c')
+
+        self.assertEqual(
+            [(diff, cand) for diff, _, _, cand
+             in index.near(1010000, date(2014, 3, 1))],
+            [(10000, 'a'), (10000, 'b')])
+
+    def test_add_after_lookup(self):
+        index = AmountDateIndex()
+        index.add(100, date(2014, 3, 1), 'a')
+        self.assertEqual(len(list(index.near(100, date(2014, 3, 1)))), 1)
+        index.add(100, date(2014, 3, 2), 'b')
+        self.assertEqual(len(list(index.near(100, date(2014, 3, 1)))), 2)
+
+
+class MatchNearest(unittest.TestCase):
+    def test_simple(self):
+        o1 = order()
+        t1 = transaction()
+
+        matches = match_nearest([t1], index_orders([o1]))
+
+        self.assertEqual(matches, [(t1, [o1])])
+        self.assertTrue(o1.matched)
+        self.assertEqual(t1.orders, [o1])
+
+    def test_outside_window(self):
+        o1 = order(shipment_date='02/24/14')
+        t1 = transaction(date='2/28/14')
+
+        self.assertEqual(match_nearest([t1], index_orders([o1])), [])
+        self.assertFalse(o1.matched)
+
+    def test_nearest_transaction_wins(self):
+        # t1 comes first, but t2 posted the day o1 shipped.
+        o1 = order(shipment_date='03/01/14')
+        t1 = transaction(date='2/28/14', id=1)
+        t2 = transaction(date='3/1/14', id=2)
+
+        match_nearest([t1, t2], index_orders([o1]))
+
+        self.assertEqual(t2.orders, [o1])
+        self.assertFalse(t1.orders)
+        self.assertEqual(o1.trans_id, 2)
+
+    def test_same_date_and_amount(self):
+        o1 = order(order_id='A')
+        o2 = order(order_id='B')
+        t1 = transaction(id=1)
+        t2 = transaction(id=2)
+
+        match_nearest([t1, t2], index_orders([o1, o2]))
+
+        self.assertEqual(t1.orders, [o1])
+        self.assertEqual(t2.orders, [o2])
+
+    def test_nearest_amount_wins(self):
+        o1 = order(total_charged='$11.96', shipment_date='02/28/14')
+        o2 = order(total_charged='$11.95', shipment_date='02/26/14')
+        t1 = transaction(amount='$11.95', date='2/28/14')
+        index = AmountDateIndex(tolerance=10050)
+        index.add(o1.transact_amount(), o1.transact_date(), [o1])
+        index.add(o2.transact_amount(), o2.transact_date(), [o2])
+
+        match_nearest([t1], index)
+
+        self.assertEqual(t1.orders, [o2])
+
+    def test_skips_already_matched(self):
+        o1 = order()
+        o1.matched = True
+        t1 = transaction()
+
+        self.assertEqual(match_nearest([t1], index_orders([o1])), [])
+
+
+class IndexCombinations(unittest.TestCase):
+    def test_only_combinations_charged_nearby(self):
+        o1 = order(total_charged='$1.00', shipment_date='02/28/14')
+        o2 = order(total_charged='$2.00', shipment_date='03/01/14')
+        o3 = order(total_charged='$4.00', shipment_date='03/01/14')
+        t1 = transaction(amount='$5.00', date='3/2/14')
+        t2 = transaction(amount='$7.00', date='4/2/14')
+
+        index = index_combinations([[o1, o2, o3]], [t1, t2])
+
+        self.assertEqual(
+            list(index.near(5000000, date(2014, 3, 2))),
+            [(0, 2, 0, (o1, o3))])
+        self.assertEqual(list(index.near(7000000, date(2014, 3, 2))), [])
+
+    def test_twenty_shipments(self):
+        orders = [
+            order(total_charged='${}.{:02d}'.format(10 + i, i * 3))
+            for i in range(20)
+        ]
+        charged = orders[2], orders[5], orders[11], orders[17]
+        total = sum(o.transact_amount() for o in charged)
+        t1 = transaction(amount='${:.2f}'.format(total / 1000000))
+
+        match_nearest([t1], index_combinations([orders], [t1]))
+
+        self.assertEqual(
+            sum(o.transact_amount() for o in t1.orders), total)
+        self.assertTrue(all(o.matched for o in t1.orders))
+
+    def test_within_tolerance(self):
+        o1 = order(total_charged='$1.00')
+        o2 = order(total_charged='$2.00')
+        t1 = transaction(amount='$3.01')
+
+        self.assertEqual(
+            list(index_combinations([[o1, o2]], [t1]).near(
+                3010000, o1.transact_date())), [])
+        index = index_combinations([[o1, o2]], [t1], tolerance=10050)
+        self.assertEqual(
+            list(index.near(3010000, o1.transact_date())),
+            [(10000, 0, 0, (o1, o2))])
+
+    def test_multiple_order_ids(self):
+        a1 = order(order_id='A', total_charged='$1.00')
+        a2 = order(order_id='A', total_charged='$2.00')
+        b1 = order(order_id='B', total_charged='$4.00')
+        t1 = transaction(amount='$3.00')
+        t2 = transaction(amount='$5.00')
+
+        index = index_combinations(
+            [[a1, a2, b1]], [t1, t2], multiple_order_ids=True)
+
+        self.assertEqual(
+            list(index.near(3000000, a1.transact_date())), [])
+        self.assertEqual(
+            list(index.near(5000000, a1.transact_date())),
+            [(0, 0, 0, (a1, b1))])
+
+    def test_multiple_order_ids_not_crowded_out(self):
+        # Many more than MAX_COMBINATIONS_PER_AMOUNT pairs of A's orders
+        # add up to the charge, and are found before the one with B's.
+        a = [order(order_id='A', total_charged='$1.00') for _ in range(12)]
+        a_half = order(order_id='A', total_charged='$0.50')
+        b = order(order_id='B', total_charged='$1.50')
+        t1 = transaction(amount='$2.00')
+
+        index = index_combinations(
+            [a[:5] + [a_half, b] + a[5:]], [t1], multiple_order_ids=True)
+
+        self.assertEqual(
+            list(index.near(2000000, b.transact_date())),
+            [(0, 0, 0, (a_half, b))])
+
+    def test_single_orders_skipped(self):
+        o1 = order()
+        t1 = transaction()
+
+        self.assertEqual(
+            list(index_combinations([[o1]], [t1]).near(
+                o1.transact_amount(), o1.transact_date())), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,13 @@
 from collections import defaultdict
-from copy import deepcopy
-from datetime import date, datetime
+from copy import copy
 import re
 
 import category
 from currency import micro_usd_to_usd_string
 from currency import parse_usd_as_micro_usd
 from currency import round_micro_usd_to_cent
+from dates import parse_mint_date
+from record import Record, RecordView
 
 
 def truncate_title(title, target_length, base_str=None):
@@ -57,43 +58,42 @@ def pythonify_mint_dict(raw_dict):
     ])
 
 
-def parse_mint_date(date_str):
-    current_year = datetime.isocalendar(date.today())[0]
-    try:
-        new_date = datetime.strptime(date_str + str(current_year), '%b %d%Y')
-    except ValueError:
-        new_date = datetime.strptime(date_str, '%m/%d/%y')
-    return new_date.date()
-
-
-class Transaction(object):
+class Transaction(Record):
     """A Mint tranaction."""
 
-    matched = False
-    orders = []
-    item = None  # Set in the case of itemized new transactions.
-    children = []
+    __slots__ = (
+        'amount',
+        'category',
+        'category_id',
+        'children',
+        'date',
+        'id',
+        'is_child',
+        'is_debit',
+        'is_pending',
+        'item',  # Set in the case of itemized new transactions.
+        'matched',
+        'merchant',
+        'note',
+        'odate',
+        'omerchant',
+        'orders',
+        'pid',
+    )
+
+    DEFAULTS = {
+        'matched': False,
+        'orders': [],
+        'item': None,
+        'children': [],
+    }
 
     def __init__(self, raw_dict):
-        self.__dict__.update(pythonify_mint_dict(raw_dict))
+        self.set_fields(pythonify_mint_dict(raw_dict))
 
     def split(self, amount, category, desc, note, is_debit=True):
         """Returns a new Transaction split from self."""
-        item = deepcopy(self)
-
-        # Itemized should NOT have this info, otherwise there are some lovely
-        # cycles.
-        item.matched = False
-        item.orders = []
-        item.children = []
-
-        item.merchant = desc
-        item.category = category
-        item.amount = amount
-        item.is_debit = is_debit
-        item.note = note
-
-        return item
+        return SplitTransaction(self, amount, category, desc, note, is_debit)
 
     def match(self, orders):
         self.matched = True
@@ -102,7 +102,7 @@ class Transaction(object):
     def bastardize(self):
         """Severes the child from the parent, making this a parent itself."""
         self.is_child = False
-        del self.__dict__['pid']
+        del self.pid
 
     def update_category_id(self, mint_cat_name_to_id):
         # Assert the category name is valid then update the categoryId.
@@ -156,7 +156,7 @@ class Transaction(object):
                 result.append(t)
 
         for pid, children in parent_id_to_trans.items():
-            parent = deepcopy(children[0])
+            parent = copy(children[0])
 
             parent.id = pid
             parent.bastardize()
@@ -180,6 +180,32 @@ class Transaction(object):
         return old_set == new_set
 
 
+class SplitTransaction(RecordView, Transaction):
+    """A transaction split from a parent Transaction.
+
+    Only the fields a split overrides are stored on it; everything else (id,
+    dates, account info, etc) is read through from the parent, so splitting
+    never copies the parent or the orders matched to it.
+    """
+
+    __slots__ = ('parent',)
+
+    def __init__(self, parent, amount, category, desc, note, is_debit=True):
+        self.parent = parent
+
+        # Itemized should NOT have this info, otherwise there are some lovely
+        # cycles.
+        self.matched = False
+        self.orders = []
+        self.children = []
+
+        self.merchant = desc
+        self.category = category
+        self.amount = amount
+        self.is_debit = is_debit
+        self.note = note
+
+
 def itemize_new_trans(new_trans, prefix):
     # Add a prefix to all itemized transactions for easy keyword searching
     # within Mint. Use the same prefix, based on if the original transaction
@@ -219,13 +245,14 @@ def summarize_new_trans(t, new_trans, prefix):
             [' - ' + nt.merchant
              for nt in new_trans]))
 
-    summary_trans = deepcopy(t)
-    summary_trans.merchant = title
+    summary_trans = t.split(
+        amount=t.amount,
+        category=category.DEFAULT_MINT_CATEGORY,
+        desc=title,
+        note=notes,
+        is_debit=t.is_debit)
     if len([nt for nt in new_trans
             if nt.merchant not in NON_ITEM_MERCHANTS]) == 1:
         summary_trans.category = new_trans[0].category
         summary_trans.category_id = new_trans[0].category_id
-    else:
-        summary_trans.category = category.DEFAULT_MINT_CATEGORY
-    summary_trans.note = notes
     return [summary_trans]
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+# A local stand-in for the parts of the Mint API the tagger uses, for load
+# testing and end-to-end benchmarks without a Mint account. Run directly:
+#   python3 mint_standin.py --port 8080 --latency 0.2 --error_rate 0.05
+# then point the tagger at it:
+#   ./tagger.py --mint_standin_url http://localhost:8080 ...
+
+import argparse
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import category
+from currency import (
+    micro_usd_to_usd_string, parse_usd_as_micro_usd, CENT_MICRO_USD)
+from dates import parse_mint_date
+from mintupdates import UPDATE_TRANS_ENDPOINT
+from mockdata import transaction_json
+
+TRANSACTIONS_ENDPOINT = '/transactions.json'
+CATEGORIES_ENDPOINT = '/categories.json'
+STATS_ENDPOINT = '/stats.json'
+
+STANDIN_TOKEN = 'standin-token'
+
+MERCHANTS = [
+    ('Amazon', 'AMAZON MKTPLACE PMTS'),
+    ('Amazon', 'AMZN Mktp US'),
+    ('Amazon', 'Amazon.com'),
+    ('Whole Foods', 'WHOLEFDS'),
+    ('Shell', 'SHELL OIL'),
+    ('Netflix', 'NETFLIX.COM'),
+]
+
+
+def generate_transactions(num_trans, seed=0, end_date=None):
+    """Returns num_trans made up Mint transaction JSON dicts, about 10 a day
+    up to end_date (today by default), half of them from Amazon."""
+    rand = random.Random(seed)
+    end_date = end_date or date.today()
+    num_days = max(30, num_trans // 10)
+    result = []
+    for i in range(num_trans):
+        merchant, description = rand.choice(MERCHANTS)
+        is_debit = rand.random() > 0.1
+        result.append(transaction_json(
+            amount=micro_usd_to_usd_string(
+                rand.randint(100, 20000) * CENT_MICRO_USD),
+            is_debit=is_debit,
+            category='Shopping' if is_debit else 'Returned Purchase',
+            date=(end_date - timedelta(days=rand.randrange(num_days))
+                  ).strftime('%m/%d/%y'),
+            merchant=merchant,
+            original_description=description,
+            id=1000000000 + i,
+            note=''))
+    return result
+
+
+def signed_amount(trans_json):
+    amount = parse_usd_as_micro_usd(trans_json['amount'])
+    return amount if trans_json['isDebit'] else -amount
+
+
+class StandinState:
+    """The transactions and categories of the stand-in, and what the
+    update endpoint does to them.
+
+    Like Mint, splitting a transaction hides it and lists its children
+    (with isChild and pid) instead; splitting it again replaces them.
+    """
+
+    def __init__(self, trans_json, categories=None):
+        self.lock = threading.Lock()
+        self.trans = {t['id']: dict(t) for t in trans_json}
+        # Split transactions: id -> JSON dict; and their children's ids.
+        self.parents = {}
+        self.children = {}
+        self.categories = categories or category.DEFAULT_MINT_CATEGORIES_TO_IDS
+        self.next_ids = itertools.count(
+            max(self.trans, default=1000000000) + 1000000)
+        self.stats = Counter()
+
+    def get_transactions(self, start_date=None):
+        with self.lock:
+            trans = [t for t in self.trans.values()
+                     if not start_date or
+                     parse_mint_date(t['odate']) >= start_date]
+        trans.sort(key=lambda t: (parse_mint_date(t['date']), t['id']),
+                   reverse=True)
+        return trans
+
+    def get_categories(self):
+        # Like mintapi's get_categories: id -> details.
+        return {cat_id: {'id': cat_id, 'name': name}
+                for name, cat_id in self.categories.items()}
+
+    def update(self, data):
+        """Applies an update request (a dict of form fields). Returns the
+        HTTP status and JSON response."""
+        task = data.get('task')
+        try:
+            txn_id = int(data['txnId'].split(':')[0])
+        except (KeyError, ValueError):
+            return 400, {'error': 'Bad txnId'}
+        if data.get('token') != STANDIN_TOKEN:
+            return 403, {'error': 'Bad token'}
+        with self.lock:
+            if task == 'txnedit':
+                return self.edit(txn_id, data)
+            if task == 'split':
+                return self.split(txn_id, data)
+        return 400, {'error': 'Unknown task {}'.format(task)}
+
+    def edit(self, txn_id, data):
+        if txn_id not in self.trans:
+            return 400, {'error': 'No transaction {}'.format(txn_id)}
+        t = self.trans[txn_id]
+        for field, key in (('note', 'note'), ('merchant', 'merchant'),
+                           ('category', 'category'),
+                           ('catId', 'categoryId')):
+            if field in data:
+                t[key] = data[field]
+        self.stats['edits'] += 1
+        return 200, {'task': 'txnedit', 'txnId': [txn_id]}
+
+    def split(self, txn_id, data):
+        parent = self.parents.get(txn_id) or self.trans.get(txn_id)
+        if not parent or parent.get('isChild'):
+            return 400, {'error': 'Cannot split {}'.format(txn_id)}
+        new_children = []
+        for i in itertools.count():
+            if 'amount{}'.format(i) not in data:
+                break
+            # Positive amounts go the same way as the parent's.
+            amount = round(float(data['amount{}'.format(i)]) * 1000000)
+            is_debit = parent['isDebit'] == (amount >= 0)
+            child = dict(
+                parent,
+                id=next(self.next_ids),
+                amount=micro_usd_to_usd_string(abs(amount)),
+                isDebit=is_debit,
+                isChild=True,
+                pid=txn_id,
+                merchant=data.get('merchant{}'.format(i), parent['merchant']),
+                note='')
+            if 'category{}'.format(i) in data:
+                child['category'] = data['category{}'.format(i)]
+                child['categoryId'] = data['categoryId{}'.format(i)]
+            new_children.append(child)
+        total = sum(signed_amount(c) for c in new_children)
+        if abs(total - signed_amount(parent)) > CENT_MICRO_USD // 2:
+            return 400, {'error': 'Split amounts do not add up'}
+
+        for child_id in self.children.pop(txn_id, ()):
+            del self.trans[child_id]
+        self.trans.pop(txn_id, None)
+        self.parents[txn_id] = parent
+        self.children[txn_id] = [c['id'] for c in new_children]
+        for c in new_children:
+            self.trans[c['id']] = c
+        self.stats['splits'] += 1
+        return 200, {'task': 'split',
+                     'txnId': [txn_id] + self.children[txn_id]}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # Keep connections open, like Mint.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def misbehave(self):
+        """Waits out the configured latency, then maybe fails the request
+        (throttled or a server error). Returns whether it did."""
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep((0.5 + server.random()) * server.latency)
+        if server.is_throttled():
+            server.count('throttled')
+            self.send_json(429, {'error': 'Too many requests'})
+            return True
+        if server.random() < server.error_rate:
+            server.count('errors')
+            self.send_json(503, {'error': 'Try again later'})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == STATS_ENDPOINT:
+            self.send_json(200, dict(
+                self.server.stats + self.server.state.stats))
+            return
+        if self.misbehave():
+            return
+        if url.path == TRANSACTIONS_ENDPOINT:
+            start_date = parse_qs(url.query).get('start_date')
+            self.send_json(200, self.server.state.get_transactions(
+                parse_mint_date(start_date[0]) if start_date else None))
+        elif url.path == CATEGORIES_ENDPOINT:
+            self.send_json(200, self.server.state.get_categories())
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'),
+                        keep_blank_values=True)
+        if self.misbehave():
+            return
+        if urlparse(self.path).path != UPDATE_TRANS_ENDPOINT:
+            self.send_json(404, {'error': 'Not found'})
+            return
+        data = {key: values[0] for key, values in form.items()}
+        self.send_json(*self.server.state.update(data))
+
+
+class StandinServer(ThreadingHTTPServer):
+    """The stand-in's HTTP server. Requests take `latency` seconds (give or
+    take half), fail with a 503 at `error_rate`, and with a 429 beyond
+    `rate_limit` requests in any second (if given)."""
+
+    daemon_threads = True
+
+    def __init__(self, address, state, latency=0, error_rate=0,
+                 rate_limit=None, seed=0):
+        super().__init__(address, StandinHandler)
+        self.state = state
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rand = random.Random(seed)
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self.recent = []
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def random(self):
+        with self.lock:
+            return self.rand.random()
+
+    def is_throttled(self):
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if t > now - 1]
+            self.recent.append(now)
+            return len(self.recent) > self.rate_limit
+
+    def get_url(self):
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        """Serves from a background thread (e.g. in tests)."""
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={'poll_interval': 0.05},
+            daemon=True)
+        thread.start()
+        return thread
+
+
+class StandinClient:
+    """Talks to a stand-in server the way the tagger talks to Mint (via
+    mintapi's Mint)."""
+
+    def __init__(self, root_url):
+        self.root_url = root_url.rstrip('/')
+        self.token = STANDIN_TOKEN
+        self.session = requests.Session()
+
+    def close(self):
+        self.session.close()
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def get_categories(self):
+        response = self.session.get(self.root_url + CATEGORIES_ENDPOINT)
+        response.raise_for_status()
+        return {int(cat_id): cat
+                for cat_id, cat in response.json().items()}
+
+    def get_transactions_json(self, include_investment=False,
+                              skip_duplicates=False, start_date=None):
+        params = {'start_date': start_date} if start_date else {}
+        response = self.session.get(
+            self.root_url + TRANSACTIONS_ENDPOINT, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def get_stats(self):
+        return self.session.get(self.root_url + STATS_ENDPOINT).json()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a local stand-in for the Mint API.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--transactions_json', type=argparse.FileType('r'),
+        help='Mint transaction JSON to serve (instead of made up ones).')
+    parser.add_argument('--num_transactions', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds each request takes (give or take half).')
+    parser.add_argument(
+        '--error_rate', type=float, default=0.0,
+        help='Fraction of requests failing with a 503.')
+    parser.add_argument(
+        '--rate_limit', type=int, default=None,
+        help='Requests per second beyond which requests get a 429.')
+    args = parser.parse_args()
+
+    if args.transactions_json:
+        trans_json = json.load(args.transactions_json)
+    else:
+        trans_json = generate_transactions(args.num_transactions, args.seed)
+    server = StandinServer(
+        (args.host, args.port), StandinState(trans_json),
+        latency=args.latency, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, seed=args.seed)
+    print('Serving {} transactions at {}'.format(
+        len(trans_json), server.get_url()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+from datetime import date
+import unittest
+
+import mint
+import mintupdates
+from mint_standin import (
+    StandinClient, StandinServer, StandinState, generate_transactions)
+from mockdata import transaction_json
+
+
+class StandinTest(unittest.TestCase):
+    def start(self, trans_json, **kwargs):
+        server = StandinServer(
+            ('localhost', 0), StandinState(trans_json), **kwargs)
+        server.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = StandinClient(server.get_url())
+        self.addCleanup(client.close)
+        return server, client
+
+    def dispatcher(self, server, client, **kwargs):
+        return mintupdates.UpdateDispatcher(
+            client, server.get_url(), sleep=lambda s: None, **kwargs)
+
+
+class GenerateTransactions(unittest.TestCase):
+    def test_generate_transactions(self):
+        trans = generate_transactions(100, seed=1, end_date=date(2020, 3, 1))
+        self.assertEqual(len(trans), 100)
+        self.assertEqual(len(set(t['id'] for t in trans)), 100)
+        self.assertEqual(trans, generate_transactions(
+            100, seed=1, end_date=date(2020, 3, 1)))
+        parsed = mint.Transaction.parse_from_json(trans)
+        self.assertTrue(all(t.odate <= date(2020, 3, 1) for t in parsed))
+        self.assertTrue(any(t.merchant == 'Amazon' for t in parsed))
+
+
+class Listing(StandinTest):
+    def test_categories(self):
+        _, client = self.start([])
+        cats = client.get_categories()
+        self.assertEqual(cats[4], {'id': 4, 'name': 'Personal Care'})
+
+    def test_transactions_since(self):
+        _, client = self.start([
+            transaction_json(id=1, date='01/05/20'),
+            transaction_json(id=2, date='01/20/20'),
+            transaction_json(id=3, date='01/10/20'),
+        ])
+        self.assertEqual(
+            [t['id'] for t in client.get_transactions_json()], [2, 3, 1])
+        self.assertEqual(
+            [t['id'] for t in client.get_transactions_json(
+                start_date='01/10/20')],
+            [2, 3])
+
+
+class Updates(StandinTest):
+    def test_edit(self):
+        server, client = self.start([transaction_json(id=1)])
+        t = mint.Transaction(transaction_json(id=1))
+        t.note = 'New note'
+        t.merchant = 'Amazon.com: Thing'
+
+        failures = self.dispatcher(server, client).send(
+            mintupdates.plan_updates([(t, [t])]))
+
+        self.assertEqual(failures, [])
+        [edited] = client.get_transactions_json()
+        self.assertEqual(edited['note'], 'New note')
+        self.assertEqual(edited['merchant'], 'Amazon.com: Thing')
+
+    def test_split_and_resplit(self):
+        server, client = self.start([
+            transaction_json(id=1, amount='$10.00', is_debit=True)])
+        orig = mint.Transaction(transaction_json(id=1, amount='$10.00'))
+        new_trans = [
+            orig.split(12000000, 'Shopping', 'Thing', 'Note 1'),
+            orig.split(-2000000, 'Shopping', 'Promo', 'Note 2',
+                       is_debit=False),
+        ]
+        dispatcher = self.dispatcher(server, client)
+
+        self.assertEqual(
+            dispatcher.send(mintupdates.plan_updates([(orig, new_trans)])),
+            [])
+
+        children = mint.Transaction.parse_from_json(
+            client.get_transactions_json())
+        self.assertEqual(
+            sorted((t.merchant, t.amount, t.note, t.pid) for t in children),
+            [('Promo', -2000000, 'Note 2', 1),
+             ('Thing', 12000000, 'Note 1', 1)])
+
+        # Splitting the (now hidden) parent again replaces its children.
+        [parent] = mint.Transaction.unsplit(children)
+        self.assertEqual(parent.id, 1)
+        self.assertEqual(
+            dispatcher.send(mintupdates.plan_updates([(parent, [
+                parent.split(4000000, 'Shopping', 'A', 'a'),
+                parent.split(6000000, 'Shopping', 'B', 'b')])])),
+            [])
+        self.assertEqual(
+            sorted((t['merchant'], t['amount'], t['note'])
+                   for t in client.get_transactions_json()),
+            [('A', '$4.00', 'a'), ('B', '$6.00', 'b')])
+
+    def test_split_must_add_up(self):
+        server, client = self.start([transaction_json(id=1, amount='$10')])
+        orig = mint.Transaction(transaction_json(id=1, amount='$10'))
+        update = mintupdates.plan_updates([(orig, [
+            orig.split(3000000, 'Shopping', 'A', 'a'),
+            orig.split(3000000, 'Shopping', 'B', 'b')])])
+
+        failures = self.dispatcher(server, client).send(update)
+
+        # Mint doesn't answer with the new ids.
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(client.get_transactions_json()), 1)
+
+
+class Misbehaving(StandinTest):
+    def test_errors_are_retried(self):
+        trans_json = generate_transactions(20)
+        server, client = self.start(trans_json, error_rate=0.3, seed=2)
+        updates = []
+        for t in mint.Transaction.parse_from_json(trans_json):
+            t.note = 'Tagged'
+            updates.append((t, [t]))
+        dispatcher = self.dispatcher(
+            server, client, concurrency=4, max_retries=10)
+
+        failures = dispatcher.send(mintupdates.plan_updates(updates))
+
+        self.assertEqual(failures, [])
+        self.assertGreater(dispatcher.stats['retries'], 0)
+        self.assertEqual(client.get_stats()['edits'], 20)
+        server.error_rate = 0
+        self.assertTrue(all(t['note'] == 'Tagged'
+                            for t in client.get_transactions_json()))
+
+    def test_rate_limit(self):
+        server, client = self.start([], rate_limit=2)
+        statuses = [
+            client.post(client.root_url + '/updateTransaction.xevent',
+                        data={}).status_code
+            for _ in range(4)]
+        self.assertEqual(statuses[:2], [400, 400])
+        self.assertEqual(statuses[2:], [429, 429])
+        self.assertEqual(client.get_stats()['throttled'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,11 @@
 from datetime import datetime, date
+import pickle
 import unittest
 
 import category
 import mint
 from mint import Transaction
-from mockdata import transaction
+from mockdata import transaction, transaction_json
 
 
 class HelpMethods(unittest.TestCase):
@@ -81,6 +82,32 @@ class TransactionClass(unittest.TestCase):
         self.assertEqual(strans.category, 'Shopping')
         self.assertEqual(strans.merchant, 'Some new item')
         self.assertEqual(strans.note, 'Test note')
+        self.assertTrue(strans.is_debit)
+
+        # Fields that aren't overridden are read from the parent.
+        self.assertEqual(strans.id, trans.id)
+        self.assertEqual(strans.date, trans.date)
+        self.assertEqual(strans.category_id, trans.category_id)
+        self.assertEqual(strans.fi, 'Chase Credit Card')
+
+    def test_split_does_not_copy_or_modify_parent(self):
+        trans = transaction()
+        orders = [object()]
+        trans.match(orders)
+
+        strans = trans.split(1234, 'Shopping', 'Some new item', 'Test note',
+                             is_debit=False)
+        self.assertIs(strans.parent, trans)
+        self.assertFalse(strans.matched)
+        self.assertEqual(strans.orders, [])
+        self.assertEqual(strans.children, [])
+        self.assertFalse(strans.is_debit)
+
+        strans.category_id = 99
+        self.assertEqual(strans.category_id, 99)
+        self.assertEqual(trans.category_id, 4)
+        self.assertEqual(trans.merchant, 'Amazon')
+        self.assertIs(trans.orders, orders)
 
     def test_match(self):
         trans = transaction()
@@ -309,6 +336,28 @@ class TransactionClass(unittest.TestCase):
         self.assertTrue('Shipping' in actual_summary.note)
         self.assertTrue('Promotion(s)' in actual_summary.note)
 
+    def test_unpickle_legacy_transaction(self):
+        class LegacyTransaction:
+            """Pickles like Transaction did before it was slotted (e.g. in
+            the Mint pickles read by --pickled_epoch)."""
+
+            def __init__(self, raw_dict):
+                self.__dict__.update(mint.pythonify_mint_dict(raw_dict))
+
+            def __reduce_ex__(self, protocol):
+                return object.__new__, (Transaction,), self.__dict__
+
+        [trans] = pickle.loads(pickle.dumps(
+            [LegacyTransaction(transaction_json(amount='$5.00', id=7))]))
+
+        self.assertIsInstance(trans, Transaction)
+        self.assertEqual(trans.id, 7)
+        self.assertEqual(trans.amount, 5000000)
+        self.assertEqual(trans.fi, 'Chase Credit Card')
+        self.assertEqual(trans.orders, [])
+        self.assertFalse(trans.matched)
+        self.assertFalse(hasattr(trans, '__dict__'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,197 @@
+from datetime import date, timedelta
+import json
+import sqlite3
+import time
+
+from currency import parse_usd_as_micro_usd
+from dates import parse_mint_date
+
+# Lives next to the (legacy) Mint pickles.
+DEFAULT_MINT_CACHE_PATH = 'Mint Cache.sqlite'
+
+# Bump when the layout changes; an older cache is simply rebuilt from Mint.
+SCHEMA_VERSION = 2
+
+# How far back before the last sync to fetch again, as Mint transactions can
+# still post (or be edited) a while after their original date.
+DEFAULT_SYNC_LOOKBACK_DAYS = 30
+
+TABLES = ('meta', 'transactions', 'categories', 'syncs')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    odate TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_odate ON transactions (odate);
+CREATE INDEX IF NOT EXISTS transactions_amount ON transactions (amount);
+CREATE TABLE IF NOT EXISTS categories (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    synced_at INTEGER NOT NULL,
+    start_date TEXT,
+    num_trans INTEGER NOT NULL
+);
+'''
+
+
+def normalize_trans_json(trans_json):
+    """Returns a copy of a Mint transaction JSON dict with its dates spelled
+    out as m/d/yy.
+
+    Mint leaves the year off of this year's dates ('Feb 28'), which would
+    mean a different date once read back from the cache next year.
+    """
+    result = dict(trans_json)
+    for key in ('date', 'odate'):
+        result[key] = parse_mint_date(result[key]).strftime('%m/%d/%y')
+    return result
+
+
+class MintCache:
+    """A local copy of Mint transactions and categories, kept in SQLite.
+
+    Transactions are stored as their Mint JSON (which is stable across code
+    changes, unlike pickled Transactions), keyed by transaction id and
+    indexed by date and amount.
+
+    Like Mint's own transaction fetching, windows of transactions are by
+    original date (odate). Every sync fetches everything from its start date
+    through today, so the cache is complete from the earliest sync start on
+    and only needs the days since the last sync (plus a lookback, plus
+    anything marked stale) fetched again.
+    """
+
+    def __init__(self, path=DEFAULT_MINT_CACHE_PATH):
+        self.conn = sqlite3.connect(path)
+        version = None
+        if self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'meta'"
+        ).fetchone():
+            version = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'schema_version'"
+            ).fetchone()
+        with self.conn:
+            if version and int(version[0]) != SCHEMA_VERSION:
+                for table in TABLES:
+                    self.conn.execute('DROP TABLE IF EXISTS {}'.format(table))
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),))
+
+    def close(self):
+        self.conn.close()
+
+    def put_transactions(self, trans_json, start_date=None):
+        """Stores Mint transaction JSON dicts (trans_json isn't modified).
+
+        If start_date is given, trans_json is everything Mint has since
+        then (by original date): cached transactions since then that are no
+        longer in Mint (e.g. deleted or merged) are dropped.
+        """
+        rows = []
+        for t in trans_json:
+            t = normalize_trans_json(t)
+            amount = parse_usd_as_micro_usd(t['amount'])
+            rows.append((
+                t['id'],
+                parse_mint_date(t['date']).isoformat(),
+                parse_mint_date(t['odate']).isoformat(),
+                amount if t['isDebit'] else -amount,
+                json.dumps(t)))
+        with self.conn:
+            if start_date:
+                self.conn.execute(
+                    'DELETE FROM transactions WHERE odate >= ?',
+                    (start_date.isoformat(),))
+                stale_from = self.get_stale_from()
+                if stale_from and start_date <= stale_from:
+                    self.conn.execute(
+                        "DELETE FROM meta WHERE key = 'stale_from'")
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?)',
+                rows)
+            self.conn.execute(
+                'INSERT INTO syncs VALUES (?, ?, ?)',
+                (int(time.time()),
+                 start_date.isoformat() if start_date else None,
+                 len(rows)))
+
+    def get_transactions(self, start_date=None):
+        """Returns the cached Mint transaction JSON dicts (newest first),
+        optionally only those since start_date (by original date)."""
+        if start_date:
+            cursor = self.conn.execute(
+                'SELECT json FROM transactions WHERE odate >= ? '
+                'ORDER BY date DESC, id DESC',
+                (start_date.isoformat(),))
+        else:
+            cursor = self.conn.execute(
+                'SELECT json FROM transactions ORDER BY date DESC, id DESC')
+        return [json.loads(j) for (j,) in cursor]
+
+    def num_transactions(self):
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def put_categories(self, name_to_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM categories')
+            self.conn.executemany(
+                'INSERT INTO categories VALUES (?, ?)', name_to_id.items())
+
+    def get_categories(self):
+        return dict(self.conn.execute('SELECT name, id FROM categories'))
+
+    def get_last_sync_time(self):
+        """Returns when transactions were last stored (epoch seconds), or
+        None if never."""
+        return self.conn.execute(
+            'SELECT MAX(synced_at) FROM syncs').fetchone()[0]
+
+    def mark_stale(self, trans):
+        """Marks cached transactions as changed in Mint (e.g. by tagging
+        them), so the next sync fetches them again."""
+        dates = [t.odate for t in trans if t.odate]
+        if not dates:
+            return
+        stale_from = min(dates)
+        if self.get_stale_from():
+            stale_from = min(stale_from, self.get_stale_from())
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('stale_from', ?)",
+                (stale_from.isoformat(),))
+
+    def get_stale_from(self):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'stale_from'").fetchone()
+        return date.fromisoformat(row[0]) if row else None
+
+    def get_sync_start(self, start_date,
+                       lookback_days=DEFAULT_SYNC_LOOKBACK_DAYS):
+        """Returns the date to fetch Mint transactions from such that, merged
+        with the cache, everything since start_date is up to date."""
+        covered_from, last_synced_at = self.conn.execute(
+            'SELECT MIN(start_date), MAX(synced_at) FROM syncs '
+            'WHERE start_date IS NOT NULL').fetchone()
+        if not covered_from or start_date < date.fromisoformat(covered_from):
+            return start_date
+        sync_start = (
+            date.fromtimestamp(last_synced_at) -
+            timedelta(days=lookback_days))
+        stale_from = self.get_stale_from()
+        if stale_from:
+            sync_start = min(sync_start, stale_from)
+        return max(sync_start, start_date)
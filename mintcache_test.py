@@ -0,0 +1,143 @@
+from datetime import date, timedelta
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from mint import Transaction
+from mintcache import MintCache, SCHEMA_VERSION, normalize_trans_json
+from mockdata import transaction, transaction_json
+
+
+class NormalizeTransJson(unittest.TestCase):
+    def test_dates_get_a_year(self):
+        this_year = date.today().year
+        t = transaction_json(date='Feb 28')
+        result = normalize_trans_json(t)
+
+        self.assertEqual(
+            result['date'], '02/28/{:02d}'.format(this_year % 100))
+        self.assertEqual(result['odate'], result['date'])
+        # The input is left alone.
+        self.assertEqual(t['date'], 'Feb 28')
+
+    def test_slash_dates(self):
+        self.assertEqual(
+            normalize_trans_json(transaction_json(date='2/8/14'))['date'],
+            '02/08/14')
+
+
+class MintCacheClass(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        cache = MintCache(self.path)
+        cache.put_transactions([
+            transaction_json(id=1, date='2/28/14', amount='$1.00'),
+            transaction_json(id=2, date='3/1/14', amount='$2.00',
+                             is_debit=False),
+        ])
+        cache.put_categories({'Shopping': 2, 'Books': 202})
+        cache.close()
+
+        cache = MintCache(self.path)
+        trans = Transaction.parse_from_json(cache.get_transactions())
+        self.assertEqual([t.id for t in trans], [2, 1])
+        self.assertEqual(trans[0].amount, -2000000)
+        self.assertEqual(trans[1].date, date(2014, 2, 28))
+        self.assertEqual(
+            cache.get_categories(), {'Shopping': 2, 'Books': 202})
+        self.assertEqual(cache.num_transactions(), 2)
+        self.assertIsNotNone(cache.get_last_sync_time())
+        cache.close()
+
+    def test_get_transactions_since(self):
+        cache = MintCache(self.path)
+        cache.put_transactions([
+            transaction_json(id=1, date='2/28/14'),
+            transaction_json(id=2, date='3/1/14'),
+        ])
+
+        self.assertEqual(
+            [t['id'] for t in cache.get_transactions(date(2014, 3, 1))], [2])
+        cache.close()
+
+    def test_refresh_window(self):
+        cache = MintCache(self.path)
+        cache.put_transactions([
+            transaction_json(id=1, date='2/28/14'),
+            transaction_json(id=2, date='3/1/14', merchant='Old'),
+            transaction_json(id=3, date='3/2/14'),
+        ])
+        # Since 3/1, Mint now only has id 2 (edited); 3 was deleted.
+        cache.put_transactions(
+            [transaction_json(id=2, date='3/1/14', merchant='New')],
+            start_date=date(2014, 3, 1))
+
+        trans = cache.get_transactions()
+        self.assertEqual([t['id'] for t in trans], [2, 1])
+        self.assertEqual(trans[0]['merchant'], 'New')
+        cache.close()
+
+    def test_sync_start(self):
+        cache = MintCache(self.path)
+        today = date.today()
+        long_ago = today - timedelta(days=1000)
+
+        # Nothing cached yet: fetch everything.
+        self.assertEqual(cache.get_sync_start(long_ago), long_ago)
+
+        cache.put_transactions([], start_date=long_ago)
+        # Only the lookback before the last sync.
+        self.assertEqual(
+            cache.get_sync_start(long_ago, lookback_days=7),
+            today - timedelta(days=7))
+        # Never before what's needed.
+        self.assertEqual(
+            cache.get_sync_start(today - timedelta(days=2), lookback_days=7),
+            today - timedelta(days=2))
+        # Needs more than the cache has.
+        before = long_ago - timedelta(days=1)
+        self.assertEqual(cache.get_sync_start(before), before)
+        cache.close()
+
+    def test_stale_transactions_fetched_again(self):
+        cache = MintCache(self.path)
+        long_ago = date(2013, 1, 1)
+        cache.put_transactions([], start_date=long_ago)
+
+        cache.mark_stale([transaction(date='2/28/14')])
+        cache.mark_stale([transaction(date='3/28/14')])
+
+        self.assertEqual(cache.get_stale_from(), date(2014, 2, 28))
+        self.assertEqual(
+            cache.get_sync_start(long_ago, lookback_days=7),
+            date(2014, 2, 28))
+
+        cache.put_transactions([], start_date=date(2014, 2, 1))
+        self.assertIsNone(cache.get_stale_from())
+        cache.close()
+
+    def test_old_schema_is_rebuilt(self):
+        cache = MintCache(self.path)
+        cache.put_transactions([transaction_json(id=1)])
+        cache.close()
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'schema_version'",
+                (str(SCHEMA_VERSION - 1),))
+        conn.close()
+
+        cache = MintCache(self.path)
+        self.assertEqual(cache.get_transactions(), [])
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,374 @@
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+import requests
+
+from currency import micro_usd_to_usd_float
+from ratelimit import percentile
+
+logger = logging.getLogger(__name__)
+
+UPDATE_TRANS_ENDPOINT = '/updateTransaction.xevent'
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 3
+# Seconds before the first retry; doubles with every retry after that.
+DEFAULT_RETRY_BACKOFF = 1.0
+
+
+# Statuses of planned updates: not sent yet, handed to a thread to send (so
+# it may have gone out) but not known to have gone through, and done.
+PENDING = 'pending'
+SENT = 'sent'
+CONFIRMED = 'confirmed'
+
+
+class UpdateError(Exception):
+    """Raised when Mint didn't accept an update request."""
+
+
+def get_edit_request(trans, ignore_category=False):
+    """Returns the txnedit request updating a transaction in place (less the
+    session token)."""
+    modify_trans = {
+        'task': 'txnedit',
+        'txnId': '{}:0'.format(trans.id),
+        'note': trans.note,
+        'merchant': trans.merchant,
+    }
+    if not ignore_category:
+        modify_trans = {
+            **modify_trans,
+            'category': trans.category,
+            'catId': trans.category_id,
+        }
+    return modify_trans
+
+
+def get_split_request(orig_trans, new_trans, ignore_category=False):
+    """Returns the split request itemizing orig_trans into new_trans (less
+    the session token)."""
+    # Split the existing transaction into many.
+    # If the existing transaction is a:
+    #   - credit: positive amount is credit, negative debit
+    #   - debit: positive amount is debit, negative credit
+    itemized_split = {
+        'txnId': '{}:0'.format(orig_trans.id),
+        'task': 'split',
+        'data': '',  # Yup this is weird.
+    }
+    for (i, trans) in enumerate(new_trans):
+        amount = trans.amount
+        # Based on the comment above, if the original transaction is a
+        # credit, flip the amount sign for things to work out!
+        if not orig_trans.is_debit:
+            amount *= -1
+        amount = micro_usd_to_usd_float(amount)
+        itemized_split['amount{}'.format(i)] = amount
+        # Yup. Weird:
+        itemized_split['percentAmount{}'.format(i)] = amount
+        itemized_split['merchant{}'.format(i)] = trans.merchant
+        # Yup weird. '0' means new?
+        itemized_split['txnId{}'.format(i)] = 0
+        if not ignore_category:
+            itemized_split['category{}'.format(i)] = trans.category
+            itemized_split['categoryId{}'.format(i)] = trans.category_id
+    return itemized_split
+
+
+def get_note_request(txn_id, note):
+    """Returns the txnedit request setting only a transaction's note (less
+    the session token)."""
+    return {
+        'task': 'txnedit',
+        'txnId': '{}:0'.format(txn_id),
+        'note': note,
+    }
+
+
+class PlannedUpdate:
+    """The requests making one update to a Mint transaction.
+
+    That's either a txnedit, or a split followed by a note edit for each
+    transaction it makes (notes, by position; empty ones are skipped). Once a
+    split is confirmed, child_ids are the ids of the transactions it made
+    and done_notes the positions of the notes that were set since.
+    """
+
+    __slots__ = ('id', 'trans_id', 'request', 'notes', 'status', 'child_ids',
+                 'done_notes')
+
+    def __init__(self, trans_id, request, notes=None, id=None,
+                 status=PENDING, child_ids=None, done_notes=()):
+        self.id = id
+        self.trans_id = trans_id
+        self.request = request
+        self.notes = notes
+        self.status = status
+        self.child_ids = child_ids
+        self.done_notes = set(done_notes)
+
+    def is_split(self):
+        return self.request['task'] == 'split'
+
+    def pending_notes(self):
+        """Returns the positions of the notes left to set."""
+        if not self.notes or self.status != CONFIRMED:
+            return []
+        return [seq for seq, note in enumerate(self.notes)
+                if note and seq not in self.done_notes]
+
+    def is_done(self):
+        return self.status == CONFIRMED and not self.pending_notes()
+
+    def __repr__(self):
+        return 'PlannedUpdate({} of {}, {})'.format(
+            self.request['task'], self.trans_id, self.status)
+
+
+def plan_updates(updates, ignore_category=False):
+    """Returns the PlannedUpdate of each (orig_trans, new_trans) update."""
+    result = []
+    for orig_trans, new_trans in updates:
+        if len(new_trans) == 1:
+            result.append(PlannedUpdate(
+                orig_trans.id,
+                get_edit_request(new_trans[0], ignore_category)))
+        else:
+            result.append(PlannedUpdate(
+                orig_trans.id,
+                get_split_request(orig_trans, new_trans, ignore_category),
+                [t.note for t in new_trans]))
+    return result
+
+
+class SessionClient:
+    """Posts to Mint with a plain requests session carrying the cookies of a
+    logged in Mint client.
+
+    The Mint client posts through its web driver, which must not be used
+    from several threads at once; a requests session can be.
+    """
+
+    def __init__(self, mint_client, pool_size=DEFAULT_CONCURRENCY):
+        self.token = mint_client.token
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        driver = mint_client.driver
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        self.session.headers['User-Agent'] = driver.execute_script(
+            'return navigator.userAgent')
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+
+class UpdateDispatcher:
+    """Sends transaction updates to Mint from a pool of threads.
+
+    Updates are independent of each other, so up to `concurrency` are in
+    flight at once. Within an update, ordering is kept where it matters: the
+    notes of an itemized split are only sent once the split has come back
+    with the ids of the new transactions. Failed requests (connection
+    errors, or 5xx/429 responses) are retried with exponential backoff. Any
+    other response but a 2xx (e.g. a rejected edit, or an expired session)
+    fails its update right away.
+
+    If a limiter (ratelimit.AdaptiveRateLimiter) is given, every request
+    first waits its turn with it, and tells it how it went. The latency of
+    every request is kept in latencies.
+    """
+
+    def __init__(self, client, root_url, concurrency=DEFAULT_CONCURRENCY,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF, limiter=None,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.client = client
+        self.url = '{}{}'.format(root_url, UPDATE_TRANS_ENDPOINT)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limiter = limiter
+        self.sleep = sleep
+        self.clock = clock
+        self.stats = Counter()
+        self.latencies = []
+        # Guards what worker threads record (requests, latencies and
+        # retries).
+        self.lock = threading.Lock()
+
+    def post(self, data):
+        """Posts one update request (adding the session token), retrying
+        failures. Returns the response, or raises UpdateError once out of
+        retries."""
+        data = dict(data, token=self.client.token)
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            start = self.clock()
+            try:
+                response = self.client.post(self.url, data=data)
+                status = response.status_code
+                ok = 200 <= status < 300
+                throttled = status == 429
+                # Other client errors won't go away by trying again.
+                retryable = throttled or status >= 500
+                error = 'status {}'.format(status)
+            except requests.RequestException as e:
+                ok = throttled = False
+                retryable = True
+                error = e
+            latency = self.clock() - start
+            give_up = not ok and (
+                not retryable or attempt >= self.max_retries)
+            with self.lock:
+                self.stats['requests'] += 1
+                self.latencies.append(latency)
+                if not ok:
+                    self.stats['failed_requests' if give_up
+                               else 'retries'] += 1
+            if self.limiter:
+                # A request the server turned down still says it coped.
+                if ok or not retryable:
+                    self.limiter.on_success(latency)
+                else:
+                    self.limiter.on_failure(throttled)
+            if ok:
+                return response
+            if not retryable:
+                raise UpdateError('Mint rejected {} of {}: {}'.format(
+                    data['task'], data['txnId'], error))
+            if give_up:
+                raise UpdateError(
+                    'Gave up on {} of {} after {} tries: {}'.format(
+                        data['task'], data['txnId'], attempt + 1, error))
+            self.sleep(self.retry_backoff * 2 ** attempt)
+            attempt += 1
+
+    def get_latency_percentiles(self, pcts=(50, 90, 99, 100)):
+        """Returns {pct: seconds} over every request sent so far."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        return {pct: percentile(latencies, pct) for pct in pcts}
+
+    def send_update(self, update):
+        """Sends the edit or split of an update. Returns the ids of the
+        transactions a split made."""
+        logger.debug('Sending a "{}" transaction request: {}'.format(
+            update.request['task'], update.request))
+        response = self.post(update.request)
+        logger.debug('Received response: {}'.format(response.text))
+        if not update.is_split():
+            return None
+        # The first id is always the original transaction (now parent
+        # transaction id).
+        new_trans_ids = response.json()['txnId'][1:]
+        if len(new_trans_ids) != len(update.notes):
+            raise UpdateError(
+                'Split of {} returned {} ids for {} transactions'.format(
+                    update.trans_id, len(new_trans_ids), len(update.notes)))
+        return new_trans_ids
+
+    def send_note(self, update, seq):
+        # The split request has no way to set notes; each new transaction
+        # needs its own edit.
+        response = self.post(
+            get_note_request(update.child_ids[seq], update.notes[seq]))
+        logger.debug('Received note response: {}'.format(response.text))
+
+    def send(self, updates, progress=None, journal=None):
+        """Sends planned updates, picking up where they left off (e.g. only
+        the remaining notes of a split that's done). Returns a list of
+        (update, error) for the updates that failed.
+
+        The note edits following a split are queued as requests of their
+        own as soon as the split is done, so they go out alongside
+        everything else in flight rather than one after another. Requests
+        are only handed to the threads as others complete, so no more than
+        `concurrency` are ever in flight: if sending is interrupted (e.g.
+        Ctrl-C), nothing beyond those goes out. If a journal (UpdateJournal)
+        is given, progress is recorded in it as requests go out and
+        complete. How many requests were sent (every attempt, retries
+        included) is kept in stats.
+        """
+        failures = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # future -> (update, note position or None).
+            futures = {}
+            # (update, note position or None) of the requests not yet
+            # handed to the threads.
+            queued = deque()
+            num_outstanding = {}
+
+            def submit_queued():
+                while queued and len(futures) < self.concurrency:
+                    update, seq = queued.popleft()
+                    if seq is None:
+                        if journal:
+                            journal.mark_sent([update])
+                        future = executor.submit(self.send_update, update)
+                    else:
+                        future = executor.submit(self.send_note, update, seq)
+                    futures[future] = (update, seq)
+
+            def send_notes(update):
+                self.stats['notes_skipped'] += sum(
+                    1 for note in update.notes or () if not note)
+                # Ahead of other updates, so splits are done (with their
+                # notes) as soon as possible.
+                seqs = update.pending_notes()
+                queued.extendleft((update, seq) for seq in reversed(seqs))
+                num_outstanding[update] += len(seqs)
+
+            def finish(update):
+                self.stats['updates'] += 1
+                if progress:
+                    progress.next()
+
+            for update in updates:
+                num_outstanding[update] = 0
+                if update.status != CONFIRMED:
+                    queued.append((update, None))
+                    num_outstanding[update] += 1
+                else:
+                    send_notes(update)
+                    if not num_outstanding[update]:
+                        finish(update)
+
+            # Only this thread touches the updates, journal, progress bar
+            # and the stats of updates.
+            submit_queued()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    update, seq = futures.pop(future)
+                    num_outstanding[update] -= 1
+                    try:
+                        result = future.result()
+                    except (UpdateError, ValueError, KeyError) as e:
+                        failures.setdefault(update, e)
+                    else:
+                        if seq is None:
+                            update.status = CONFIRMED
+                            update.child_ids = result
+                            if journal:
+                                journal.mark_confirmed(update)
+                            send_notes(update)
+                        else:
+                            update.done_notes.add(seq)
+                            if journal:
+                                journal.mark_note_done(update, seq)
+                    if not num_outstanding[update]:
+                        finish(update)
+                submit_queued()
+        self.stats['failed_updates'] += len(failures)
+        return [(u, failures[u]) for u in updates if u in failures]
@@ -0,0 +1,363 @@
+import itertools
+import threading
+import unittest
+
+import requests
+
+import mintupdates
+from mockdata import FakeClock, transaction
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, json=None):
+        self.status_code = status_code
+        self._json = json or {}
+        self.text = str(self._json)
+
+    def json(self):
+        return self._json
+
+
+class FakeClient:
+    """Answers update requests like Mint, optionally failing the first
+    num_failures requests of each transaction (or of only those in
+    failing_ids)."""
+
+    token = 'token123'
+
+    def __init__(self, num_failures=0, failure=None, failing_ids=None):
+        self.num_failures = num_failures
+        self.failing_ids = failing_ids
+        self.failure = failure or FakeResponse(503)
+        self.posts = []
+        self.attempts = {}
+        self.new_ids = itertools.count(1000)
+        self.lock = threading.Lock()
+
+    def post(self, url, data):
+        with self.lock:
+            self.posts.append((url, dict(data)))
+            key = (data['task'], data['txnId'])
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            if (self.attempts[key] <= self.num_failures and
+                    (self.failing_ids is None or
+                     data['txnId'] in self.failing_ids)):
+                if isinstance(self.failure, Exception):
+                    raise self.failure
+                return self.failure
+            if data['task'] == 'split':
+                num_splits = sum(1 for k in data if k.startswith('amount'))
+                return FakeResponse(json={'txnId': [
+                    int(data['txnId'].split(':')[0])] + [
+                        next(self.new_ids) for _ in range(num_splits)]})
+            return FakeResponse(json={'task': data['task']})
+
+
+class FakeProgress:
+    def __init__(self):
+        self.count = 0
+
+    def next(self):
+        self.count += 1
+
+
+class InterruptingProgress(FakeProgress):
+    """Like a Ctrl-C once the first update is done."""
+
+    def next(self):
+        super().next()
+        raise KeyboardInterrupt()
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.num_acquired = 0
+        self.num_failures = 0
+        self.latencies = []
+
+    def acquire(self):
+        self.num_acquired += 1
+
+    def on_success(self, latency):
+        self.latencies.append(latency)
+
+    def on_failure(self, throttled=False):
+        self.num_failures += 1
+
+
+def edit_update(id, note='A note'):
+    t = transaction(id=id, note=note)
+    return (t, [t])
+
+
+def split_update(id, amounts, is_debit=True, notes=None):
+    t = transaction(id=id, is_debit=is_debit)
+    if notes is None:
+        notes = ['Note {}'.format(i) for i in range(len(amounts))]
+    new_trans = [
+        t.split(amount, 'Shopping', 'Item {}'.format(i), note)
+        for i, (amount, note) in enumerate(zip(amounts, notes))]
+    return (t, new_trans)
+
+
+def plan(updates):
+    return mintupdates.plan_updates(updates)
+
+
+class RequestBuilders(unittest.TestCase):
+    def test_get_edit_request(self):
+        t = transaction(id=5, note='Hi', merchant='Amazon.com: Thing')
+        self.assertEqual(
+            mintupdates.get_edit_request(t),
+            {'task': 'txnedit', 'txnId': '5:0', 'note': 'Hi',
+             'merchant': 'Amazon.com: Thing',
+             'category': 'Personal Care', 'catId': 4})
+        self.assertNotIn(
+            'category',
+            mintupdates.get_edit_request(t, ignore_category=True))
+
+    def test_get_split_request(self):
+        orig, new_trans = split_update(7, [1000000, 2500000])
+        split = mintupdates.get_split_request(orig, new_trans)
+        self.assertEqual(split['task'], 'split')
+        self.assertEqual(split['txnId'], '7:0')
+        self.assertEqual(split['amount0'], 1.0)
+        self.assertEqual(split['amount1'], 2.5)
+        self.assertEqual(split['merchant1'], 'Item 1')
+        self.assertEqual(split['category0'], 'Shopping')
+
+    def test_get_split_request_credit(self):
+        orig, new_trans = split_update(7, [1000000, 2500000], is_debit=False)
+        split = mintupdates.get_split_request(
+            orig, new_trans, ignore_category=True)
+        self.assertEqual(split['amount0'], -1.0)
+        self.assertNotIn('category0', split)
+
+    def test_plan_updates(self):
+        edit, split = plan([edit_update(1, note='Hi'),
+                            split_update(2, [1000000, 2000000])])
+        self.assertEqual(edit.trans_id, 1)
+        self.assertEqual(edit.request['task'], 'txnedit')
+        self.assertIsNone(edit.notes)
+        self.assertEqual(split.trans_id, 2)
+        self.assertEqual(split.request['task'], 'split')
+        self.assertEqual(split.notes, ['Note 0', 'Note 1'])
+        self.assertEqual(split.status, mintupdates.PENDING)
+        self.assertEqual(split.pending_notes(), [])
+        self.assertFalse(split.is_done())
+
+    def test_get_note_request(self):
+        self.assertEqual(
+            mintupdates.get_note_request(12, 'Hi'),
+            {'task': 'txnedit', 'txnId': '12:0', 'note': 'Hi'})
+
+
+class UpdateDispatcher(unittest.TestCase):
+    def test_sends_edits_and_splits(self):
+        client = FakeClient()
+        progress = FakeProgress()
+        updates = [edit_update(1), split_update(2, [1000000, 2000000]),
+                   edit_update(3)]
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=3)
+
+        failures = dispatcher.send(plan(updates), progress=progress)
+
+        self.assertEqual(dispatcher.stats['requests'], 5)
+        self.assertEqual(failures, [])
+        self.assertEqual(progress.count, 3)
+        self.assertTrue(all(
+            url == 'https://mint/updateTransaction.xevent'
+            for url, _ in client.posts))
+        self.assertEqual(
+            sorted(d['txnId'] for _, d in client.posts),
+            ['1000:0', '1001:0', '1:0', '2:0', '3:0'])
+        self.assertTrue(all(
+            d['token'] == 'token123' for _, d in client.posts))
+
+    def test_split_notes_follow_split(self):
+        client = FakeClient()
+        updates = [split_update(i, [1000000, 2000000, 3000000])
+                   for i in range(10)]
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=4)
+
+        dispatcher.send(plan(updates))
+
+        tasks = [(d['task'], d['txnId']) for _, d in client.posts]
+        self.assertEqual(len(tasks), 40)
+        self.assertEqual(
+            len(set(txn_id for task, txn_id in tasks if task == 'split')), 10)
+        # Every note is for an id only handed out by an earlier split.
+        num_new_ids = 0
+        for task, txn_id in tasks:
+            if task == 'split':
+                num_new_ids += 3
+            else:
+                self.assertLess(int(txn_id.split(':')[0]), 1000 + num_new_ids)
+        notes = [d['note'] for _, d in client.posts if d['task'] == 'txnedit']
+        self.assertEqual(sorted(set(notes)), ['Note 0', 'Note 1', 'Note 2'])
+
+    def test_skips_empty_notes(self):
+        client = FakeClient()
+        progress = FakeProgress()
+        dispatcher = mintupdates.UpdateDispatcher(client, 'https://mint')
+
+        failures = dispatcher.send(
+            plan([split_update(1, [1000000, 2000000, 3000000],
+                               notes=['Order 1', '', 'Order 1'])]),
+            progress=progress)
+
+        self.assertEqual(failures, [])
+        self.assertEqual(dispatcher.stats['requests'], 3)
+        self.assertEqual(dispatcher.stats['notes_skipped'], 1)
+        self.assertEqual(dispatcher.stats['updates'], 1)
+        self.assertEqual(progress.count, 1)
+        self.assertEqual(
+            [d['txnId'] for _, d in client.posts],
+            ['1:0', '1000:0', '1002:0'])
+
+    def test_failed_note_fails_its_update(self):
+        client = FakeClient(
+            num_failures=10, failing_ids={'1001:0'})
+        progress = FakeProgress()
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', max_retries=1, sleep=lambda s: None)
+        update = split_update(1, [1000000, 2000000, 3000000])
+
+        failures = dispatcher.send(plan([update]), progress=progress)
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0].trans_id, 1)
+        # The other notes are still sent: the split, 3 notes and a retry.
+        self.assertEqual(dispatcher.stats['requests'], 5)
+        self.assertEqual(dispatcher.stats['failed_updates'], 1)
+        self.assertEqual(progress.count, 1)
+
+    def test_resumes_confirmed_split(self):
+        client = FakeClient()
+        update = mintupdates.PlannedUpdate(
+            2, {'task': 'split', 'txnId': '2:0'}, ['A', '', 'C'],
+            status=mintupdates.CONFIRMED, child_ids=[20, 21, 22],
+            done_notes=[0])
+        self.assertEqual(update.pending_notes(), [2])
+        dispatcher = mintupdates.UpdateDispatcher(client, 'https://mint')
+
+        failures = dispatcher.send([update])
+
+        self.assertEqual(failures, [])
+        self.assertEqual(
+            [d['txnId'] for _, d in client.posts], ['22:0'])
+        self.assertTrue(update.is_done())
+
+    def test_retries_with_backoff(self):
+        client = FakeClient(num_failures=2)
+        sleeps = []
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=1, max_retries=3,
+            retry_backoff=0.5, sleep=sleeps.append)
+
+        failures = dispatcher.send(plan([edit_update(1)]))
+
+        # Retries count as requests too.
+        self.assertEqual(dispatcher.stats['requests'], 3)
+        self.assertEqual(failures, [])
+        self.assertEqual(len(client.posts), 3)
+        self.assertEqual(sleeps, [0.5, 1.0])
+
+    def test_retries_connection_errors(self):
+        client = FakeClient(
+            num_failures=1, failure=requests.ConnectionError('reset'))
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', sleep=lambda s: None)
+
+        failures = dispatcher.send(
+            plan([split_update(1, [1000000, 2000000])]))
+
+        self.assertEqual(dispatcher.stats['requests'], 6)
+        self.assertEqual(failures, [])
+        self.assertEqual(len(client.posts), 6)
+
+    def test_gives_up_after_retries(self):
+        client = FakeClient(
+            num_failures=10, failure=FakeResponse(429), failing_ids={'1:0'})
+        progress = FakeProgress()
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', max_retries=2, sleep=lambda s: None)
+        bad, good = edit_update(1), edit_update(2)
+
+        failures = dispatcher.send(plan([bad, good]), progress=progress)
+
+        self.assertEqual(dispatcher.stats['requests'], 4)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0][0].trans_id, 1)
+        self.assertIsInstance(failures[0][1], mintupdates.UpdateError)
+        self.assertEqual(progress.count, 2)
+        self.assertEqual(client.attempts[('txnedit', '1:0')], 3)
+
+    def test_interrupted_send_stops_sending(self):
+        client = FakeClient()
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=4)
+        updates = plan([edit_update(i) for i in range(1, 101)])
+
+        with self.assertRaises(KeyboardInterrupt):
+            dispatcher.send(updates, progress=InterruptingProgress())
+
+        # Only the requests that were already in flight went out.
+        self.assertLessEqual(len(client.posts), 4)
+
+    def test_reports_retries_and_latencies(self):
+        client = FakeClient(num_failures=1, failing_ids={'1:0'})
+        # Every request takes a quarter second.
+        clock = FakeClock(tick=0.25)
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=1, sleep=lambda s: None,
+            clock=clock)
+
+        dispatcher.send(plan([edit_update(1), edit_update(2)]))
+
+        self.assertEqual(dispatcher.stats['retries'], 1)
+        self.assertEqual(dispatcher.stats['failed_requests'], 0)
+        self.assertEqual(len(dispatcher.latencies), 3)
+        self.assertEqual(
+            dispatcher.get_latency_percentiles(),
+            {50: 0.25, 90: 0.25, 99: 0.25, 100: 0.25})
+
+    def test_feeds_rate_limiter(self):
+        client = FakeClient(num_failures=1, failing_ids={'1:0'})
+        limiter = FakeLimiter()
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', concurrency=1, sleep=lambda s: None,
+            limiter=limiter)
+
+        dispatcher.send(plan([edit_update(1), edit_update(2)]))
+
+        self.assertEqual(limiter.num_acquired, 3)
+        self.assertEqual(limiter.num_failures, 1)
+        self.assertEqual(len(limiter.latencies), 2)
+
+    def test_client_errors_fail_without_retries(self):
+        # E.g. the session expired.
+        client = FakeClient(
+            num_failures=1, failure=FakeResponse(403), failing_ids={'1:0'})
+        limiter = FakeLimiter()
+        dispatcher = mintupdates.UpdateDispatcher(
+            client, 'https://mint', sleep=lambda s: None, limiter=limiter)
+        updates = plan([edit_update(1), edit_update(2)])
+
+        failures = dispatcher.send(updates)
+
+        self.assertEqual(len(failures), 1)
+        self.assertIs(failures[0][0], updates[0])
+        self.assertIsInstance(failures[0][1], mintupdates.UpdateError)
+        self.assertNotEqual(updates[0].status, mintupdates.CONFIRMED)
+        self.assertEqual(updates[1].status, mintupdates.CONFIRMED)
+        self.assertEqual(client.attempts[('txnedit', '1:0')], 1)
+        self.assertEqual(dispatcher.stats['retries'], 0)
+        self.assertEqual(dispatcher.stats['failed_requests'], 1)
+        self.assertEqual(limiter.num_failures, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
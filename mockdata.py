@@ -1,4 +1,6 @@
 from collections import OrderedDict
+import csv
+import io
 
 import amazon
 import mint
@@ -20,6 +22,33 @@ def refund(*args, **kwargs):
     return amazon.Refund(refund_dict(*args, **kwargs))
 
 
+class FakeClock:
+    """A clock (like time.monotonic) that only moves when slept on, plus
+    tick seconds after every reading."""
+
+    def __init__(self, now=100.0, tick=0.0):
+        self.now = now
+        self.tick = tick
+
+    def __call__(self):
+        now = self.now
+        self.now += self.tick
+        return now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def to_csv_file(dicts):
+    """Returns dicts written out as a CSV report, ready to be read."""
+    result = io.StringIO()
+    writer = csv.DictWriter(result, fieldnames=list(dicts[0].keys()))
+    writer.writeheader()
+    writer.writerows(dicts)
+    result.seek(0)
+    return result
+
+
 def transaction_json(
         amount='$11.95',
         is_debit=True,
@@ -125,13 +154,15 @@ def item_dict(
         order_id='123-3211232-7655671',
         order_date='02/26/14',
         shipment_date='02/28/14',
-        payment_type='Great Credit Card'):
+        payment_type='Great Credit Card',
+        category='Misc.',
+        asin='B00009V2QX'):
     return OrderedDict([
         ('Order Date', order_date),
         ('Order ID', order_id),
         ('Title', title),
-        ('Category', 'Misc.'),
-        ('ASIN/ISBN', 'B00009V2QX'),
+        ('Category', category),
+        ('ASIN/ISBN', asin),
         ('UNSPSC Code', '26111700'),
         ('Website', 'Amazon.com'),
         ('Release Date', '04/15/10'),
@@ -175,13 +206,15 @@ def refund_dict(
         quantity=2,
         order_id='123-3211232-7655671',
         order_date='02/26/14',
-        refund_date='03/16/14'):
+        refund_date='03/16/14',
+        category='Apparel',
+        asin='B0174V9GZW'):
     return OrderedDict([
         ('Order Date', order_date),
         ('Order ID', order_id),
         ('Title', title),
-        ('Category', 'Apparel'),
-        ('ASIN/ISBN', 'B0174V9GZW'),
+        ('Category', category),
+        ('ASIN/ISBN', asin),
         ('Website', 'Amazon.com'),
         ('Purchase Order Number', ''),
         ('Refund Date', refund_date),
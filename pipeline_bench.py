@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+
+# End-to-end benchmarks of the tagger, stage by stage (parsing, matching,
+# determining updates, ...), on synthetic datasets (see datagen.py) of a few
+# sizes or on local reports. Nothing is sent to Mint. Run directly:
+#   python3 pipeline_bench.py --sizes 1000,10000 --output results.json
+# and later, to catch regressions:
+#   python3 pipeline_bench.py --sizes 1000,10000 --baseline results.json
+
+import argparse
+from collections import Counter
+import gc
+import json
+import logging
+import os
+import pickle
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import amazon
+import category
+import categoryhistory
+import datagen
+import mint
+import mint_standin
+import tagger
+
+MB = 1024 * 1024
+
+
+class StageTimer:
+    """Times consecutive stages: start(stage) ends the stage before it. With
+    trace_memory, also records each stage's peak (and net) memory allocated
+    (on top of what was allocated when it started), via tracemalloc.
+
+    Timings are skewed while tracing memory, so best keep them apart.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+        self.stage = None
+
+    def start(self, stage):
+        self.stop()
+        self.stage = stage
+        if self.trace_memory:
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        if self.stage is None:
+            return
+        result = {'seconds': time.perf_counter() - self.start_time}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            result['peak_bytes'] = peak - self.start_bytes
+            result['net_bytes'] = current - self.start_bytes
+        self.results[self.stage] = result
+        self.stage = None
+
+
+class Inputs:
+    """Where the reports and Mint transactions (JSON, or an epoch of the
+    tagger's pickles) to benchmark with are."""
+
+    def __init__(self, orders_csv, items_csv, refunds_csv=None,
+                 trans_json=None, pickled_epoch=None):
+        self.orders_csv = orders_csv
+        self.items_csv = items_csv
+        self.refunds_csv = refunds_csv
+        self.trans_json = trans_json
+        self.pickled_epoch = pickled_epoch
+
+
+def get_synthetic_inputs(num_orders, seed, data_dir):
+    """Returns the Inputs of a synthetic dataset, generating it into
+    data_dir unless it's there from an earlier run."""
+    out_dir = os.path.join(
+        data_dir, '{}-orders-seed-{}'.format(num_orders, seed))
+    trans_json = os.path.join(out_dir, datagen.MINT_TRANSACTIONS_JSON)
+    if not os.path.exists(trans_json):
+        print('Generating {} orders into {}'.format(num_orders, out_dir))
+        datagen.write_dataset(out_dir, num_orders, datagen.DatasetGenerator(
+            seed=seed, num_days=datagen.default_num_days(num_orders)))
+    return Inputs(
+        os.path.join(out_dir, datagen.ORDERS_CSV),
+        os.path.join(out_dir, datagen.ITEMS_CSV),
+        os.path.join(out_dir, datagen.REFUNDS_CSV),
+        trans_json)
+
+
+def get_tagger_args(args):
+    """The tagger's defaults, but for update sending (with --send)."""
+    parser = argparse.ArgumentParser()
+    tagger.define_args(parser)
+    tagger_args = parser.parse_args([])
+    tagger_args.dry_run = not args.send
+    tagger_args.update_concurrency = args.update_concurrency
+    return tagger_args
+
+
+def run_pipeline(inputs, tagger_args, timer, mint_client=None,
+                 root_url=None):
+    """Runs what tagger.main does, minus talking to Mint (unless a client
+    for a stand-in is given), timing each stage. Returns the counts of
+    what went in and came out."""
+    timer.start('parse_orders')
+    with open(inputs.orders_csv) as f:
+        orders = amazon.Order.parse_from_csv(f)
+    timer.start('parse_items')
+    with open(inputs.items_csv) as f:
+        items = amazon.Item.parse_from_csv(f)
+    timer.start('parse_refunds')
+    refunds = []
+    if inputs.refunds_csv:
+        with open(inputs.refunds_csv) as f:
+            refunds = amazon.Refund.parse_from_csv(f)
+
+    timer.start('load_trans')
+    cats = category.DEFAULT_MINT_CATEGORIES_TO_IDS
+    if inputs.pickled_epoch:
+        # Not via tagger (its spinner would be timed too).
+        with open(tagger.MINT_TRANS_PICKLE_FMT.format(
+                inputs.pickled_epoch), 'rb') as f:
+            trans = pickle.load(f)
+        with open(tagger.MINT_CATS_PICKLE_FMT.format(
+                inputs.pickled_epoch), 'rb') as f:
+            cats = pickle.load(f)
+    else:
+        with open(inputs.trans_json) as f:
+            trans = mint.Transaction.parse_from_json(json.load(f))
+    num_trans = len(trans)
+
+    with tempfile.TemporaryDirectory() as history_dir:
+        timer.start('personalization')
+        history = categoryhistory.CategoryHistory(
+            os.path.join(history_dir, 'history.sqlite'))
+        renames = tagger.get_mint_category_history_for_items(
+            trans, tagger_args, history)
+        history.close()
+
+    stats = Counter()
+    updates, unmatched = tagger.get_mint_updates(
+        orders, items, refunds, trans, tagger_args, stats, renames, cats,
+        [], stage_timer=timer)
+
+    timer.start('dry_run_print')
+    tagger.print_dry_run(updates)
+
+    failed_ids = ()
+    if mint_client:
+        timer.start('send_updates')
+        failed_ids = tagger.send_updates_to_mint(
+            updates, mint_client,
+            concurrency=tagger_args.update_concurrency,
+            max_retries=tagger_args.update_retries,
+            root_url=root_url)
+    timer.stop()
+
+    return {
+        'orders': len(orders),
+        'items': len(items),
+        'refunds': len(refunds),
+        'trans': num_trans,
+        'trans_match': stats['trans_match'],
+        'updates': len(updates),
+        'unmatched': len(unmatched),
+        'failed_updates': len(failed_ids),
+    }
+
+
+def bench_inputs(inputs, tagger_args, repeat, trace_memory, send_latency):
+    """Runs the pipeline repeat times (and once more tracing memory).
+    Returns the counts and every stage's best time (and memory)."""
+    best = {}
+    counts = None
+    passes = [False] * repeat + ([True] if trace_memory else [])
+    for traced in passes:
+        server = client = None
+        if send_latency is not None:
+            with open(inputs.trans_json) as f:
+                server = mint_standin.StandinServer(
+                    ('localhost', 0),
+                    mint_standin.StandinState(json.load(f)),
+                    latency=send_latency)
+            server.start()
+            client = mint_standin.StandinClient(server.get_url())
+
+        # Don't leave garbage from the pass before to be collected mid-stage.
+        gc.collect()
+        timer = StageTimer(trace_memory=traced)
+        if traced:
+            tracemalloc.start()
+        try:
+            counts = run_pipeline(
+                inputs, tagger_args, timer, client,
+                server and server.get_url())
+        finally:
+            if traced:
+                tracemalloc.stop()
+            if server:
+                client.close()
+                server.shutdown()
+                server.server_close()
+
+        for stage, result in timer.results.items():
+            stage_best = best.setdefault(stage, {})
+            if traced:
+                stage_best['peak_bytes'] = result['peak_bytes']
+                stage_best['net_bytes'] = result['net_bytes']
+            elif ('seconds' not in stage_best or
+                  result['seconds'] < stage_best['seconds']):
+                stage_best['seconds'] = result['seconds']
+    return {
+        'counts': counts,
+        'stages': best,
+        'total_seconds': sum(
+            s.get('seconds', 0) for s in best.values()),
+    }
+
+
+def compare_to_baseline(results, baseline, max_slowdown, min_seconds,
+                        max_memory_growth, min_bytes=MB):
+    """Returns a description of every stage (of every dataset in both)
+    that got slower than baseline by more than max_slowdown (a fraction,
+    and at least min_seconds), or grew its peak memory by more than
+    max_memory_growth (and at least min_bytes)."""
+    regressions = []
+    for dataset, result in results['datasets'].items():
+        base = baseline['datasets'].get(dataset)
+        if not base:
+            continue
+        for stage, r in result['stages'].items():
+            b = base['stages'].get(stage)
+            if not b:
+                continue
+            if ('seconds' in r and 'seconds' in b and
+                    r['seconds'] > b['seconds'] * (1 + max_slowdown) and
+                    r['seconds'] - b['seconds'] > min_seconds):
+                regressions.append('{} {}: {:.3f}s, was {:.3f}s'.format(
+                    dataset, stage, r['seconds'], b['seconds']))
+            if ('peak_bytes' in r and 'peak_bytes' in b and
+                    r['peak_bytes'] >
+                    b['peak_bytes'] * (1 + max_memory_growth) and
+                    r['peak_bytes'] - b['peak_bytes'] > min_bytes):
+                regressions.append(
+                    '{} {}: peak {:.1f}MB, was {:.1f}MB'.format(
+                        dataset, stage, r['peak_bytes'] / MB,
+                        b['peak_bytes'] / MB))
+    return regressions
+
+
+def print_result(dataset, result, baseline=None):
+    counts = result['counts']
+    print('\n{}: {} orders, {} items, {} refunds, {} Mint transactions; '
+          '{} matched, {} updates:'.format(
+              dataset, counts['orders'], counts['items'], counts['refunds'],
+              counts['trans'], counts['trans_match'], counts['updates']))
+    base = baseline and baseline['datasets'].get(dataset)
+    for stage, r in result['stages'].items():
+        line = '  {:<22} {:8.3f}s'.format(stage, r['seconds'])
+        if 'peak_bytes' in r:
+            line += ' {:9.1f}MB peak {:9.1f}MB kept'.format(
+                r['peak_bytes'] / MB, r['net_bytes'] / MB)
+        b = base and base['stages'].get(stage)
+        if b and b.get('seconds'):
+            line += ' {:+7.1%} time'.format(
+                r['seconds'] / b['seconds'] - 1)
+        print(line)
+    print('  {:<22} {:8.3f}s'.format('total', result['total_seconds']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the tagger end to end, stage by stage.')
+    parser.add_argument(
+        '--sizes', default='1000,10000',
+        help='Comma separated numbers of order ids of the synthetic '
+             'datasets to benchmark with.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--data_dir', default=None,
+        help='Where to keep generated datasets between runs (by default, '
+             'they are generated into a temporary directory).')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Runs per dataset; the best time of each stage is kept.')
+    parser.add_argument(
+        '--skip_memory', action='store_true',
+        help='Skip the extra (slower) run tracing memory per stage.')
+
+    parser.add_argument(
+        '--orders_csv', help='Benchmark with these reports instead.')
+    parser.add_argument('--items_csv')
+    parser.add_argument('--refunds_csv')
+    parser.add_argument(
+        '--mint_transactions_json',
+        help='Mint transaction JSON to go with --orders_csv/--items_csv.')
+    parser.add_argument(
+        '--pickled_epoch', type=int,
+        help='Or the Mint transactions pickled by the tagger at this epoch.')
+
+    parser.add_argument(
+        '--send', action='store_true',
+        help='Also send the updates, to a local Mint stand-in.')
+    parser.add_argument('--standin_latency', type=float, default=0.0)
+    parser.add_argument('--update_concurrency', type=int, default=4)
+
+    parser.add_argument('--output', help='Where to write the JSON results.')
+    parser.add_argument(
+        '--baseline',
+        help='JSON results of an earlier run to compare with; exits with '
+             'status 1 on regressions.')
+    parser.add_argument(
+        '--max_slowdown', type=float, default=0.25,
+        help='How much slower than the baseline (a fraction) a stage may '
+             'get.')
+    parser.add_argument(
+        '--min_slowdown_seconds', type=float, default=0.05,
+        help='Ignore stages slowing down by less than this (noise).')
+    parser.add_argument(
+        '--max_memory_growth', type=float, default=0.25,
+        help='How much more peak memory than the baseline (a fraction) a '
+             'stage may use.')
+    args = parser.parse_args(argv)
+
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    if args.orders_csv or args.items_csv:
+        if not (args.orders_csv and args.items_csv and
+                (args.mint_transactions_json or args.pickled_epoch)):
+            parser.error(
+                '--orders_csv, --items_csv and either '
+                '--mint_transactions_json or --pickled_epoch go together')
+        if args.send and not args.mint_transactions_json:
+            parser.error('--send needs --mint_transactions_json')
+
+    # Keep the tagger's logging (e.g. the dry run) from being printed.
+    devnull = open(os.devnull, 'w')
+    for handler in tagger.logger.handlers:
+        handler.setStream(devnull)
+    logging.getLogger('mintupdates').setLevel(logging.WARNING)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    tagger_args = get_tagger_args(args)
+    send_latency = args.standin_latency if args.send else None
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'datasets': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.orders_csv:
+            datasets = [('local', Inputs(
+                args.orders_csv, args.items_csv, args.refunds_csv,
+                args.mint_transactions_json, args.pickled_epoch))]
+        else:
+            datasets = [
+                ('{}-orders'.format(size), get_synthetic_inputs(
+                    size, args.seed, args.data_dir or tmp_dir))
+                for size in (int(s) for s in args.sizes.split(','))]
+
+        for dataset, inputs in datasets:
+            result = bench_inputs(
+                inputs, tagger_args, args.repeat, not args.skip_memory,
+                send_latency)
+            results['datasets'][dataset] = result
+            print_result(dataset, result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('\nWrote results to {}'.format(args.output))
+
+    if baseline:
+        regressions = compare_to_baseline(
+            results, baseline, args.max_slowdown,
+            args.min_slowdown_seconds, args.max_memory_growth)
+        if regressions:
+            print('\nRegressions from {}:'.format(args.baseline))
+            for r in regressions:
+                print('  ' + r)
+            exit(1)
+        print('\nNo regressions from {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+from argparse import Namespace
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+import pipeline_bench
+from pipeline_bench import MB, StageTimer, compare_to_baseline
+
+
+def results(seconds=None, peak_bytes=None, dataset='1000-orders',
+            stage='match'):
+    stage_result = {}
+    if seconds is not None:
+        stage_result['seconds'] = seconds
+    if peak_bytes is not None:
+        stage_result['peak_bytes'] = peak_bytes
+    return {'datasets': {dataset: {'stages': {stage: stage_result}}}}
+
+
+def compare(result, baseline):
+    return compare_to_baseline(
+        result, baseline, max_slowdown=0.25, min_seconds=0.05,
+        max_memory_growth=0.25)
+
+
+class StageTimerClass(unittest.TestCase):
+    def test_times_consecutive_stages(self):
+        timer = StageTimer()
+        timer.start('parse')
+        time.sleep(0.01)
+        timer.start('match')
+        timer.stop()
+        # Stopping again is harmless.
+        timer.stop()
+
+        self.assertEqual(list(timer.results), ['parse', 'match'])
+        self.assertGreaterEqual(timer.results['parse']['seconds'], 0.01)
+        self.assertNotIn('peak_bytes', timer.results['parse'])
+
+    def test_trace_memory(self):
+        timer = StageTimer(trace_memory=True)
+        tracemalloc.start()
+        try:
+            timer.start('allocate')
+            kept = bytearray(2 * MB)
+            timer.start('nothing')
+            timer.stop()
+        finally:
+            tracemalloc.stop()
+
+        allocate = timer.results['allocate']
+        self.assertGreaterEqual(allocate['peak_bytes'], 2 * MB)
+        self.assertGreaterEqual(allocate['net_bytes'], 2 * MB)
+        self.assertLess(timer.results['nothing']['peak_bytes'], MB)
+        del kept
+
+
+class CompareToBaseline(unittest.TestCase):
+    def test_slowdown(self):
+        self.assertEqual(
+            compare(results(seconds=1.3), results(seconds=1.0)),
+            ['1000-orders match: 1.300s, was 1.000s'])
+        # Within max_slowdown.
+        self.assertEqual(
+            compare(results(seconds=1.2), results(seconds=1.0)), [])
+
+    def test_slowdown_below_min_seconds(self):
+        # 100% slower, but only by 0.04s.
+        self.assertEqual(
+            compare(results(seconds=0.08), results(seconds=0.04)), [])
+
+    def test_memory_growth(self):
+        self.assertEqual(
+            compare(results(peak_bytes=13 * MB),
+                    results(peak_bytes=10 * MB)),
+            ['1000-orders match: peak 13.0MB, was 10.0MB'])
+        # Within max_memory_growth.
+        self.assertEqual(
+            compare(results(peak_bytes=12 * MB),
+                    results(peak_bytes=10 * MB)), [])
+
+    def test_memory_growth_below_min_bytes(self):
+        # 50% more, but only by half a MB.
+        self.assertEqual(
+            compare(results(peak_bytes=MB * 3 // 2), results(peak_bytes=MB)),
+            [])
+
+    def test_faster_is_fine(self):
+        self.assertEqual(
+            compare(results(seconds=0.5, peak_bytes=MB),
+                    results(seconds=1.0, peak_bytes=10 * MB)), [])
+
+    def test_only_what_both_have(self):
+        self.assertEqual(
+            compare(results(seconds=2.0, dataset='10000-orders'),
+                    results(seconds=1.0)), [])
+        self.assertEqual(
+            compare(results(seconds=2.0, stage='parse_orders'),
+                    results(seconds=1.0)), [])
+        # Memory wasn't traced in the baseline.
+        self.assertEqual(
+            compare(results(seconds=1.0, peak_bytes=100 * MB),
+                    results(seconds=1.0)), [])
+
+
+class BenchInputs(unittest.TestCase):
+    def test_end_to_end(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        with contextlib.redirect_stdout(io.StringIO()):
+            inputs = pipeline_bench.get_synthetic_inputs(
+                20, 0, data_dir.name)
+        self.assertTrue(os.path.exists(inputs.trans_json))
+        tagger_args = pipeline_bench.get_tagger_args(
+            Namespace(send=False, update_concurrency=1))
+
+        # (Capturing the dry run's logging.)
+        with self.assertLogs(pipeline_bench.tagger.logger):
+            result = pipeline_bench.bench_inputs(
+                inputs, tagger_args, repeat=2, trace_memory=True,
+                send_latency=None)
+
+        counts = result['counts']
+        self.assertGreater(counts['orders'], 0)
+        self.assertGreater(counts['trans_match'], 0)
+        self.assertEqual(counts['failed_updates'], 0)
+        stages = result['stages']
+        for stage in ('parse_orders', 'parse_items', 'load_trans',
+                      'dry_run_print'):
+            self.assertIn('seconds', stages[stage])
+            self.assertIn('peak_bytes', stages[stage])
+        self.assertAlmostEqual(
+            result['total_seconds'],
+            sum(s['seconds'] for s in stages.values()))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            pipeline_bench.print_result('20-orders', result)
+        self.assertIn('parse_orders', output.getvalue())
+
+    def test_rejects_no_timed_runs(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                pipeline_bench.main(['--repeat', '0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import threading
+import time
+
+DEFAULT_RATE = 5.0
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_MIN_RATE = 0.5
+
+
+def percentile(sorted_values, pct):
+    """Returns the pct-th percentile (nearest rank) of sorted_values."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class AdaptiveRateLimiter:
+    """A token bucket whose rate adapts to how the server copes (AIMD).
+
+    acquire() takes a token, waiting as needed: tokens refill at `rate` per
+    second, up to `burst` saved up. Every request's outcome is then fed
+    back:
+
+    - on_success(latency) increases the rate additively, by `increase`
+      requests/second for about every second's worth of successes. Until
+      the first failure, it "slow starts" instead (like TCP): every
+      success adds 1 request/second, doubling the rate about every second,
+      to find roughly what the server tolerates quickly. A success doesn't
+      count if the server is slowing down: once the (smoothed) latency is
+      more than `slow_factor` times the lowest seen (and more than
+      `min_slow_latency`; jitter between fast responses means nothing),
+      it's a failure.
+    - on_failure(throttled) cuts the rate in half (`decrease`) if the
+      server said to slow down (throttled), or if errors are piling up: more
+      than `max_error_rate` of recent requests (smoothed) failed. The odd
+      error is just retried at the same rate. Requests in flight when the
+      server struggles tend to fail together, so the rate is cut at most
+      once per `cooldown` seconds.
+
+    The rate always stays within [min_rate, max_rate]. Safe to use from
+    several threads.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, max_rate=DEFAULT_MAX_RATE,
+                 min_rate=DEFAULT_MIN_RATE, burst=None, increase=1.0,
+                 decrease=0.5, slow_factor=3.0, min_slow_latency=0.25,
+                 max_error_rate=0.25, cooldown=1.0, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max(self.min_rate, min(rate, max_rate))
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.min_slow_latency = min_slow_latency
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.last_refill = clock()
+        self.last_decrease = None
+        self.min_latency = None
+        self.avg_latency = None
+        self.error_rate = 0.0
+        self.num_decreases = 0
+        self.slow_start = True
+
+    def acquire(self):
+        """Takes a token, first waiting for one if there are none."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            # Take the token now (going into debt if need be) so that
+            # concurrent callers line up behind each other.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            self.sleep(wait)
+
+    def on_success(self, latency):
+        with self.lock:
+            self.error_rate *= 0.9
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            self.avg_latency = (
+                latency if self.avg_latency is None
+                else 0.8 * self.avg_latency + 0.2 * latency)
+            if self.avg_latency > max(self.min_slow_latency,
+                                      self.slow_factor * self.min_latency):
+                self._decrease()
+            else:
+                self.rate = min(
+                    self.max_rate,
+                    self.rate + (1 if self.slow_start
+                                 else self.increase / self.rate))
+
+    def on_failure(self, throttled=False):
+        with self.lock:
+            self.error_rate = 0.9 * self.error_rate + 0.1
+            if throttled or self.error_rate > self.max_error_rate:
+                self._decrease()
+
+    def _decrease(self):
+        now = self.clock()
+        if (self.last_decrease is not None and
+                now - self.last_decrease < self.cooldown):
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.num_decreases += 1
+
+    def __repr__(self):
+        return 'AdaptiveRateLimiter({:.2f}/s)'.format(self.rate)
@@ -0,0 +1,127 @@
+import unittest
+
+from mockdata import FakeClock
+from ratelimit import AdaptiveRateLimiter, percentile
+
+
+def limiter(clock, **kwargs):
+    return AdaptiveRateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+class Percentile(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3], 50), 3)
+        self.assertEqual(percentile([1, 2], 90), 2)
+        self.assertIsNone(percentile([], 50))
+
+
+class AdaptiveRateLimiterClass(unittest.TestCase):
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=10, burst=5)
+
+        for _ in range(5):
+            lim.acquire()
+        self.assertEqual(clock.now, 100.0)
+        for _ in range(10):
+            lim.acquire()
+        self.assertAlmostEqual(clock.now, 101.0)
+
+    def test_refills_up_to_burst(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=10, burst=2)
+        lim.acquire()
+        lim.acquire()
+        clock.now += 60
+        for _ in range(2):
+            lim.acquire()
+        self.assertEqual(clock.now, 160.0)
+        lim.acquire()
+        self.assertAlmostEqual(clock.now, 160.1)
+
+    def test_slow_start(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=4)
+        for _ in range(4):
+            lim.on_success(0.1)
+        self.assertEqual(lim.rate, 8)
+        lim.on_failure(throttled=True)
+        self.assertEqual(lim.rate, 4)
+        self.assertFalse(lim.slow_start)
+
+    def test_additive_increase(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=8, increase=1.0)
+        lim.on_failure(throttled=True)
+        # About a second's worth of successes adds about 1 request/s.
+        for _ in range(4):
+            lim.on_success(0.1)
+        self.assertGreater(lim.rate, 4.8)
+        self.assertLess(lim.rate, 5.0)
+
+    def test_max_rate(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=4, max_rate=5, increase=10.0)
+        for _ in range(10):
+            lim.on_success(0.1)
+        self.assertEqual(lim.rate, 5)
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=8, min_rate=1, cooldown=1.0)
+        lim.on_failure(throttled=True)
+        self.assertEqual(lim.rate, 4)
+        # Requests that were in flight at the same time failing too.
+        lim.on_failure(throttled=True)
+        lim.on_failure(throttled=True)
+        self.assertEqual(lim.rate, 4)
+        clock.now += 1.5
+        lim.on_failure(throttled=True)
+        self.assertEqual(lim.rate, 2)
+        clock.now += 1.5
+        lim.on_failure(throttled=True)
+        clock.now += 1.5
+        lim.on_failure(throttled=True)
+        self.assertEqual(lim.rate, 1)
+        self.assertEqual(lim.num_decreases, 4)
+
+    def test_odd_errors_do_not_decrease(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=8, max_error_rate=0.25)
+        for i in range(100):
+            if i % 20 == 0:
+                lim.on_failure()
+            else:
+                lim.on_success(0.1)
+        self.assertEqual(lim.num_decreases, 0)
+        # But many errors at once do.
+        for _ in range(3):
+            lim.on_failure()
+        self.assertEqual(lim.num_decreases, 1)
+
+    def test_slow_responses_decrease(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=8, slow_factor=3.0)
+        lim.on_success(0.1)
+        lim.on_success(0.2)
+        self.assertEqual(lim.rate, 10)
+        for _ in range(10):
+            lim.on_success(2.0)
+        self.assertLess(lim.rate, 10)
+        self.assertEqual(lim.num_decreases, 1)
+
+    def test_fast_responses_never_slow(self):
+        clock = FakeClock()
+        lim = limiter(clock, rate=8, slow_factor=3.0, min_slow_latency=0.25)
+        lim.on_success(0.01)
+        for _ in range(10):
+            lim.on_success(0.2)
+        self.assertEqual(lim.num_decreases, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+class Record:
+    """A compact, slotted record of report fields.
+
+    Subclasses declare the fields the tagger actually uses in __slots__. Any
+    other column from a report/JSON dict is kept as overflow: a tuple of
+    values plus a tuple of names that is shared by every record built from
+    the same set of columns. Overflow fields are still readable as
+    attributes, so records never need a per-instance __dict__.
+
+    DEFAULTS are assigned on construction for fields that aren't in the
+    input (e.g. matching state).
+    """
+    __slots__ = ('extra_names', 'extra_values')
+
+    DEFAULTS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # All slot names, including those declared by base classes.
+        cls.FIELD_NAMES = frozenset(
+            name
+            for klass in cls.__mro__
+            for name in klass.__dict__.get('__slots__', ())
+            if name not in Record.__slots__)
+        # Column names -> (slotted names, overflow names).
+        cls.LAYOUTS = {}
+
+    @classmethod
+    def from_fields(cls, fields):
+        """Constructs from an already pythonified dict of fields."""
+        result = cls.__new__(cls)
+        result.set_fields(fields)
+        return result
+
+    @classmethod
+    def get_layout(cls, names):
+        layout = cls.LAYOUTS.get(names)
+        if not layout:
+            layout = cls.LAYOUTS[names] = (
+                tuple(n for n in names if n in cls.FIELD_NAMES),
+                tuple(n for n in names if n not in cls.FIELD_NAMES))
+        return layout
+
+    def set_fields(self, fields):
+        slot_names, extra_names = self.get_layout(tuple(fields))
+        for name, value in self.DEFAULTS.items():
+            setattr(self, name, value)
+        for name in slot_names:
+            setattr(self, name, fields[name])
+        self.extra_names = extra_names
+        self.extra_values = tuple([fields[name] for name in extra_names])
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # Pickled as a Record: (no __dict__, slot values).
+            for name, value in state[1].items():
+                object.__setattr__(self, name, value)
+        else:
+            # Pickled before records were slotted: the old __dict__ of
+            # fields (e.g. the Mint pickles read with --pickled_epoch).
+            self.set_fields(state)
+
+    def get_extras(self):
+        """Returns a dict of all overflow (non-slotted) fields."""
+        return dict(zip(self.extra_names, self.extra_values))
+
+    def __getattr__(self, name):
+        # Only reached when name isn't a set slot (or a class attribute).
+        if name in Record.__slots__ or name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            return self.extra_values[self.extra_names.index(name)]
+        except ValueError:
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(
+                    type(self).__name__, name))
+
+
+class RecordView:
+    """Mixin for a record backed by a `parent` record.
+
+    Only fields set on the view itself are stored on it; every other field is
+    read through from the parent. Declare `parent` in the subclass' slots.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        # Only reached when name isn't set on the view itself.
+        if name == 'parent' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.parent, name)
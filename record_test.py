@@ -0,0 +1,80 @@
+import copy
+import pickle
+import unittest
+
+from record import Record
+
+
+class Point(Record):
+    __slots__ = ('x', 'y', 'visited')
+
+    DEFAULTS = {'visited': False}
+
+
+class Point3D(Point):
+    __slots__ = ('z',)
+
+
+class RecordClass(unittest.TestCase):
+    def test_field_names(self):
+        self.assertEqual(Point.FIELD_NAMES, {'x', 'y', 'visited'})
+        self.assertEqual(Point3D.FIELD_NAMES, {'x', 'y', 'visited', 'z'})
+
+    def test_from_fields(self):
+        p = Point.from_fields({'x': 1, 'y': 2})
+        self.assertEqual(p.x, 1)
+        self.assertEqual(p.y, 2)
+        self.assertFalse(p.visited)
+        self.assertEqual(p.get_extras(), {})
+        self.assertFalse(hasattr(p, '__dict__'))
+
+    def test_extras(self):
+        p = Point3D.from_fields({'x': 1, 'z': 3, 'label': 'origin-ish'})
+        self.assertEqual(p.z, 3)
+        self.assertEqual(p.label, 'origin-ish')
+        self.assertEqual(p.get_extras(), {'label': 'origin-ish'})
+
+        self.assertFalse(hasattr(p, 'y'))
+        with self.assertRaises(AttributeError):
+            p.not_a_field
+        with self.assertRaises(AttributeError):
+            p.not_a_field = 'nope'
+
+    def test_copy_and_pickle(self):
+        p = Point3D.from_fields({'x': 1, 'y': 2, 'label': 'a'})
+        for other in (copy.copy(p),
+                      copy.deepcopy(p),
+                      pickle.loads(pickle.dumps(p))):
+            self.assertEqual(other.x, 1)
+            self.assertEqual(other.y, 2)
+            self.assertEqual(other.label, 'a')
+            self.assertFalse(hasattr(other, 'z'))
+
+    def test_unpickle_legacy_dict(self):
+        class LegacyPoint:
+            """Pickles like Point did before it was slotted."""
+
+            def __init__(self, fields):
+                self.__dict__.update(fields)
+
+            def __reduce_ex__(self, protocol):
+                return object.__new__, (Point3D,), self.__dict__
+
+        p = pickle.loads(pickle.dumps(
+            LegacyPoint({'x': 1, 'z': 3, 'label': 'a'})))
+        self.assertIsInstance(p, Point3D)
+        self.assertEqual(p.x, 1)
+        self.assertEqual(p.z, 3)
+        self.assertEqual(p.label, 'a')
+        self.assertFalse(p.visited)
+        self.assertFalse(hasattr(p, 'y'))
+
+    def test_layout_is_shared(self):
+        p1 = Point.from_fields({'x': 1, 'y': 2, 'label': 'a'})
+        p2 = Point.from_fields({'x': 3, 'y': 4, 'label': 'b'})
+        self.assertIs(p1.extra_names, p2.extra_names)
+        self.assertEqual(p2.label, 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import hashlib
+import sqlite3
+import time
+
+# Lives next to the Mint pickles.
+DEFAULT_RUN_STATE_PATH = 'Tagger Run State.sqlite'
+
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS done_rows (
+    report TEXT NOT NULL,
+    row_hash TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    PRIMARY KEY (report, row_hash)
+);
+CREATE TABLE IF NOT EXISTS done_orders (
+    report TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    done_at INTEGER NOT NULL,
+    PRIMARY KEY (report, order_id)
+);
+CREATE TABLE IF NOT EXISTS tagged_trans (
+    trans_id INTEGER PRIMARY KEY,
+    tagged_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matched_order_ids (
+    trans_id INTEGER NOT NULL,
+    order_id TEXT NOT NULL,
+    PRIMARY KEY (trans_id, order_id)
+);
+'''
+
+
+def hash_row(row):
+    """Returns a content hash of a raw report row (a list of strings)."""
+    return hashlib.blake2b(
+        '\x1f'.join(row).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class RunState:
+    """What earlier runs have already finished, kept in a SQLite file.
+
+    An order id is done for a report once every one of its rows was matched
+    with a Mint transaction that was tagged (or was already up to date).
+    Later runs skip the rows of done order ids while parsing (by the hash of
+    their content, so a row that changes is parsed again) and skip the
+    Mint transactions that were already tagged. Tagged transactions that
+    were matched with an order id that isn't done (e.g. one shipment of an
+    order that's still partly shipped) are kept, so its rows (parsed again)
+    match them rather than some other transaction.
+    """
+
+    def __init__(self, path=DEFAULT_RUN_STATE_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        version = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version and int(version[0]) != SCHEMA_VERSION:
+            raise ValueError(
+                'Unsupported run state schema version {} in {}'.format(
+                    version[0], path))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),))
+        self.done_rows = {}
+        for report, row_hash in self.conn.execute(
+                'SELECT report, row_hash FROM done_rows'):
+            self.done_rows.setdefault(report, set()).add(row_hash)
+        self.tagged_trans_ids = set(
+            trans_id for (trans_id,) in self.conn.execute(
+                'SELECT trans_id FROM tagged_trans'))
+        # trans id -> the order ids it was matched with.
+        self.matched_order_ids = {}
+        for trans_id, order_id in self.conn.execute(
+                'SELECT trans_id, order_id FROM matched_order_ids'):
+            self.matched_order_ids.setdefault(trans_id, set()).add(order_id)
+        # report -> order id -> hashes of the rows parsed this run.
+        self.parsed_rows = {}
+        # The order ids (of any report) with rows parsed this run.
+        self.parsed_order_ids = set()
+        self.num_skipped_rows = 0
+
+    def close(self):
+        self.conn.close()
+
+    def row_filter(self, report):
+        """Returns a keep_row function for parsing report (e.g. 'orders')
+        that skips the rows of done order ids."""
+        done = self.done_rows.setdefault(report, set())
+        parsed = self.parsed_rows.setdefault(report, {})
+        # The header last seen, and where its order id column is (looked up
+        # once per header, not once per row).
+        header = None
+        order_id_idx = None
+
+        def keep_row(fieldnames, row):
+            nonlocal header, order_id_idx
+            row_hash = hash_row(row)
+            if row_hash in done:
+                self.num_skipped_rows += 1
+                return False
+            if fieldnames is not header:
+                if 'Order ID' not in fieldnames:
+                    raise ValueError(
+                        'The {} report has no "Order ID" column'.format(
+                            report))
+                header = fieldnames
+                order_id_idx = fieldnames.index('Order ID')
+            order_id = row[order_id_idx]
+            parsed.setdefault(order_id, []).append(row_hash)
+            self.parsed_order_ids.add(order_id)
+            return True
+
+        return keep_row
+
+    def is_tagged(self, trans):
+        """Whether trans (or the parent it was split from) was tagged by an
+        earlier run, and isn't matched with an order id parsed this run."""
+        if trans.id in self.tagged_trans_ids:
+            trans_id = trans.id
+        elif trans.is_child and trans.pid in self.tagged_trans_ids:
+            trans_id = trans.pid
+        else:
+            return False
+        return not any(
+            oid in self.parsed_order_ids
+            for oid in self.matched_order_ids.get(trans_id, ()))
+
+    def record_tagged(self, trans_ids):
+        """Records transactions as tagged by id (e.g. when finishing updates
+        whose orders are no longer at hand)."""
+        now = int(time.time())
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO tagged_trans VALUES (?, ?)',
+                [(trans_id, now) for trans_id in trans_ids])
+        self.tagged_trans_ids.update(trans_ids)
+
+    def record_done(self, trans, orders_by_report):
+        """Records trans as tagged, and every order id of orders_by_report
+        (report -> parsed orders/refunds) whose orders were all matched with
+        one of trans as done. Which order ids every matched transaction was
+        matched with is recorded too (see is_tagged)."""
+        now = int(time.time())
+        trans_ids = set(t.id for t in trans)
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO tagged_trans VALUES (?, ?)',
+                [(trans_id, now) for trans_id in trans_ids])
+            for report, orders in orders_by_report.items():
+                matched = set(
+                    (o.trans_id, o.order_id) for o in orders
+                    if o.trans_id is not None)
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO matched_order_ids VALUES (?, ?)',
+                    matched)
+                for trans_id, oid in matched:
+                    self.matched_order_ids.setdefault(
+                        trans_id, set()).add(oid)
+                done_ids = {}
+                for o in orders:
+                    done_ids[o.order_id] = (
+                        done_ids.get(o.order_id, True) and
+                        o.trans_id in trans_ids)
+                done_ids = [oid for oid, done in done_ids.items() if done]
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO done_orders VALUES (?, ?, ?)',
+                    [(report, oid, now) for oid in done_ids])
+                # Items are done along with their orders.
+                for row_report in (
+                        (report, 'items') if report == 'orders'
+                        else (report,)):
+                    parsed = self.parsed_rows.get(row_report, {})
+                    rows = [(row_report, row_hash, oid)
+                            for oid in done_ids
+                            for row_hash in parsed.get(oid, ())]
+                    self.conn.executemany(
+                        'INSERT OR IGNORE INTO done_rows VALUES (?, ?, ?)',
+                        rows)
+                    self.done_rows.setdefault(row_report, set()).update(
+                        row_hash for _, row_hash, _ in rows)
+        self.tagged_trans_ids.update(trans_ids)
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from amazon import Order, Refund
+from mockdata import order_dict, refund_dict, to_csv_file, transaction
+from runstate import RunState, hash_row
+
+
+class RunStateClass(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'state.sqlite')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def parse_orders(self, state, dicts):
+        return Order.parse_from_csv(
+            to_csv_file(dicts), keep_row=state.row_filter('orders'))
+
+    def test_hash_row(self):
+        self.assertEqual(hash_row(['a', 'b']), hash_row(['a', 'b']))
+        self.assertNotEqual(hash_row(['a', 'b']), hash_row(['ab', '']))
+
+    def test_skips_done_orders_on_rerun(self):
+        dicts = [
+            order_dict(order_id='A'),
+            order_dict(order_id='B', total_charged='$3.21'),
+        ]
+        state = RunState(self.path)
+        o1, o2 = self.parse_orders(state, dicts)
+        t1 = transaction(id=1)
+        o1.match(t1)
+        state.record_done([t1], {'orders': [o1, o2]})
+        state.close()
+
+        state = RunState(self.path)
+        orders = self.parse_orders(state, dicts)
+
+        self.assertEqual([o.order_id for o in orders], ['B'])
+        self.assertEqual(state.num_skipped_rows, 1)
+        self.assertTrue(state.is_tagged(t1))
+        self.assertFalse(state.is_tagged(transaction(id=2)))
+        state.close()
+
+    def test_changed_row_is_parsed_again(self):
+        state = RunState(self.path)
+        [o1] = self.parse_orders(state, [order_dict(order_id='A')])
+        t1 = transaction(id=1)
+        o1.match(t1)
+        state.record_done([t1], {'orders': [o1]})
+
+        orders = self.parse_orders(
+            state, [order_dict(order_id='A', order_status='Returned')])
+
+        self.assertEqual(len(orders), 1)
+        state.close()
+
+    def test_partially_matched_order_not_done(self):
+        state = RunState(self.path)
+        o1, o2 = self.parse_orders(state, [
+            order_dict(order_id='A', tracking='1'),
+            order_dict(order_id='A', tracking='2'),
+        ])
+        t1 = transaction(id=1)
+        o1.match(t1)
+        state.record_done([t1], {'orders': [o1, o2]})
+        state.close()
+
+        state = RunState(self.path)
+        orders = self.parse_orders(state, [
+            order_dict(order_id='A', tracking='1'),
+            order_dict(order_id='A', tracking='2'),
+        ])
+
+        self.assertEqual(len(orders), 2)
+        # Still there for the first shipment to match.
+        self.assertFalse(state.is_tagged(t1))
+        state.close()
+
+    def test_report_without_order_ids(self):
+        state = RunState(self.path)
+        with self.assertRaisesRegex(ValueError, 'orders report has no'):
+            state.row_filter('orders')(['Title'], ['Duracell AAs'])
+        state.close()
+
+    def test_refunds(self):
+        state = RunState(self.path)
+        [r1] = Refund.parse_from_csv(
+            to_csv_file([refund_dict()]), keep_row=state.row_filter('refunds'))
+        t1 = transaction(id=1, is_debit=False)
+        r1.match(t1)
+        state.record_done([t1], {'refunds': [r1]})
+
+        self.assertEqual(Refund.parse_from_csv(
+            to_csv_file([refund_dict()]),
+            keep_row=state.row_filter('refunds')), [])
+        state.close()
+
+    def test_split_children_of_tagged_trans(self):
+        state = RunState(self.path)
+        state.record_done([transaction(id=10)], {})
+        child = transaction(id=11, pid=10)
+
+        self.assertTrue(state.is_tagged(child))
+        state.close()
+
+    def test_record_tagged(self):
+        state = RunState(self.path)
+        state.record_tagged([10, 12])
+        state.close()
+
+        state = RunState(self.path)
+        self.assertTrue(state.is_tagged(transaction(id=10)))
+        self.assertFalse(state.is_tagged(transaction(id=11)))
+        state.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
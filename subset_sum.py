@@ -0,0 +1,215 @@
+from bisect import bisect_left, bisect_right
+from math import gcd
+
+from currency import MICRO_USD_EPS
+
+# Sums reachable by the amounts left to place are tracked as bitsets of
+# multiples of the amounts' common unit (e.g. a cent), unless the totals
+# need more bits than this.
+MAX_REACHABLE_SUM_BITS = 1 << 22
+
+
+def reachable_sums(amounts, counts, kinds, targets,
+                   max_bits=MAX_REACHABLE_SUM_BITS):
+    """Returns (unit, sums) where bit i of sums[pos] is set if some copies
+    of kinds[pos:] add up to i * unit, or None if there are no amounts, they
+    can be negative or the bitsets would be too large."""
+    if not amounts:
+        return None
+    values = list(amounts) + list(targets)
+    if any(not isinstance(v, int) for v in values) or min(amounts) < 0:
+        return None
+    unit = 0
+    for v in values:
+        unit = gcd(unit, v)
+    total = sum(a * c for a, c in zip(amounts, counts))
+    if not unit or total // unit > max_bits:
+        return None
+    sums = [1] * (len(kinds) + 1)
+    for pos in range(len(kinds) - 1, -1, -1):
+        bits = sums[pos + 1]
+        shift = amounts[kinds[pos]] // unit
+        if shift:
+            for _ in range(counts[kinds[pos]]):
+                bits |= bits << shift
+        sums[pos] = bits
+    return unit, sums
+
+
+def partition_counts_into_targets(amounts, counts, targets,
+                                  eps=MICRO_USD_EPS, budget=None):
+    """Splits counts[k] identical copies of every amounts[k] between the
+    targets such that the copies given to each target add up to it (within
+    eps).
+
+    The search runs over how many copies of each kind go to each target, not
+    over individual copies, so identical copies never multiply the search
+    space. Larger amounts are placed first, a target never receives more
+    copies than it can fit, nor is left needing a total the copies still to
+    be placed can't add up to (see reachable_sums), and dead ends are
+    memoized by the remaining totals.
+
+    Returns a list with one list per target of how many copies of each kind
+    it gets, or None if no such split exists. If a budget.Budget is given,
+    every search step is charged to it (and BudgetExhausted propagates).
+    """
+    num_targets = len(targets)
+    num_kinds = len(amounts)
+    if not num_targets:
+        return [] if not any(counts) else None
+    total = sum(a * c for a, c in zip(amounts, counts))
+    if abs(total - sum(targets)) >= eps * num_targets:
+        return None
+
+    kinds = sorted(range(num_kinds), key=lambda k: amounts[k], reverse=True)
+    # Only prune by remaining total when amounts can't go negative.
+    can_prune = all(amounts[k] >= 0 for k in kinds)
+
+    reachable = reachable_sums(amounts, counts, kinds, targets)
+    if reachable:
+        unit, sums = reachable
+        # How many units apart sums within eps of each other can be.
+        slack = max(0, eps - 1) // unit
+
+    def can_reach(pos, r):
+        """Whether copies of kinds[pos:] can add up to r (within eps)."""
+        if not reachable or abs(r) < eps:
+            return True
+        if r < 0:
+            return False
+        lo = max(0, r // unit - slack)
+        hi = r // unit + slack
+        return bool((sums[pos] >> lo) & ((1 << (hi - lo + 1)) - 1))
+
+    remaining = list(targets)
+    given = [[0] * num_kinds for _ in range(num_targets)]
+    dead_ends = set()
+
+    def place_kind(pos):
+        if pos == num_kinds:
+            return all(abs(r) < eps for r in remaining)
+        if budget:
+            budget.step()
+        # What's left to place doesn't depend on which target is which.
+        key = (pos, tuple(sorted(remaining)))
+        if key in dead_ends:
+            return False
+        if not all(can_reach(pos, r) for r in remaining):
+            dead_ends.add(key)
+            return False
+        if counts[kinds[pos]] == 1:
+            placed = place_single_copy(pos)
+        else:
+            placed = place_copies(pos, counts[kinds[pos]], 0)
+        if not placed:
+            dead_ends.add(key)
+        return placed
+
+    def place_single_copy(pos):
+        kind = kinds[pos]
+        amount = amounts[kind]
+        tried = set()
+        for t in range(num_targets):
+            r = remaining[t]
+            # Targets with the same remaining total are interchangeable.
+            if r in tried or (can_prune and r - amount <= -eps):
+                continue
+            tried.add(r)
+            if not can_reach(pos + 1, r - amount):
+                continue
+            remaining[t] -= amount
+            given[t][kind] = 1
+            if place_kind(pos + 1):
+                return True
+            remaining[t] += amount
+            given[t][kind] = 0
+        return False
+
+    def place_copies(pos, left, t):
+        """Gives some of the `left` copies of kinds[pos] to target t, and the
+        rest to the targets after it."""
+        if budget:
+            budget.step()
+        key = (pos, left, t, tuple(remaining))
+        if key in dead_ends:
+            return False
+        kind = kinds[pos]
+        amount = amounts[kind]
+        if t == num_targets - 1:
+            fewest = most = left
+        else:
+            fewest, most = 0, left
+        if can_prune and amount > 0:
+            # Never overshoot a target by eps or more.
+            most = min(most, (remaining[t] + eps - 1) // amount)
+        for num in range(most, fewest - 1, -1):
+            # Whatever target t still needs has to come from smaller kinds.
+            if not can_reach(pos + 1, remaining[t] - num * amount):
+                continue
+            remaining[t] -= num * amount
+            given[t][kind] = num
+            if (place_kind(pos + 1) if t == num_targets - 1
+                    else place_copies(pos, left - num, t + 1)):
+                return True
+            remaining[t] += num * amount
+        given[t][kind] = 0
+        dead_ends.add(key)
+        return False
+
+    if not place_kind(0):
+        return None
+    return given
+
+
+def half_subset_sums(amounts, start, stop, budget=None):
+    """Returns (sum, indexes) for every subset of amounts[start:stop]."""
+    sums = [(0, ())]
+    for idx in range(start, stop):
+        amount = amounts[idx]
+        if budget:
+            budget.step(len(sums))
+        sums.extend([(s + amount, indexes + (idx,)) for s, indexes in sums])
+    return sums
+
+
+def subsets_with_sums(amounts, targets, eps=MICRO_USD_EPS, min_size=1,
+                      max_per_target=None, budget=None, accept=None):
+    """Finds the subsets of amounts that add up to one of targets (within
+    eps).
+
+    Meet in the middle: the subset sums of each half of amounts are
+    enumerated separately (2^(n/2) each, rather than 2^n). The right half's
+    sums are sorted, so the sums completing each left sum to a target are
+    found by bisecting, and only subsets that actually hit a target are
+    ever built.
+
+    Returns a dict of target to a list of index tuples (in ascending order)
+    of at most max_per_target subsets with at least min_size amounts (and,
+    if given, for which accept(indexes) is true). Targets without any such
+    subset are left out.
+    """
+    half = len(amounts) // 2
+    left_sums = half_subset_sums(amounts, 0, half, budget)
+    right_sums = half_subset_sums(amounts, half, len(amounts), budget)
+    right_sums.sort(key=lambda s: s[0])
+    right_keys = [s for s, _ in right_sums]
+
+    result = {}
+    for target in set(targets):
+        found = []
+        for s, left in left_sums:
+            if budget:
+                budget.step()
+            lo = bisect_right(right_keys, target - s - eps)
+            hi = bisect_left(right_keys, target - s + eps)
+            for _, right in right_sums[lo:hi]:
+                indexes = left + right
+                if (len(indexes) >= min_size and
+                        (accept is None or accept(indexes))):
+                    found.append(indexes)
+            if max_per_target and len(found) >= max_per_target:
+                del found[max_per_target:]
+                break
+        if found:
+            result[target] = found
+    return result
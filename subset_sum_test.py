@@ -0,0 +1,172 @@
+import unittest
+
+from budget import Budget, BudgetExhausted
+from subset_sum import partition_counts_into_targets
+from subset_sum import subsets_with_sums
+
+
+class PartitionCountsIntoTargets(unittest.TestCase):
+    def assertValidPartition(self, amounts, counts, targets, result, eps=50):
+        self.assertEqual(len(result), len(targets))
+        for k, count in enumerate(counts):
+            self.assertEqual(sum(given[k] for given in result), count)
+        for target, given in zip(targets, result):
+            self.assertLess(
+                abs(sum(a * n for a, n in zip(amounts, given)) - target),
+                eps)
+
+    def test_empty(self):
+        self.assertEqual(partition_counts_into_targets([], [], []), [])
+        self.assertEqual(partition_counts_into_targets([5], [0], []), [])
+        self.assertIsNone(partition_counts_into_targets([5], [1], []))
+        self.assertEqual(partition_counts_into_targets([], [], [0]), [[]])
+
+    def test_simple(self):
+        self.assertEqual(
+            partition_counts_into_targets([200, 500], [3, 1], [400, 700]),
+            [[2, 0], [1, 1]])
+
+    def test_no_solution(self):
+        self.assertIsNone(
+            partition_counts_into_targets([300], [4], [400, 800]))
+
+    def test_within_eps(self):
+        self.assertEqual(
+            partition_counts_into_targets(
+                [10000, 20010], [1, 1], [20000, 10000]),
+            [[0, 1], [1, 0]])
+        self.assertIsNone(partition_counts_into_targets(
+            [10000, 20010], [1, 1], [20000, 10000], eps=5))
+
+    def test_zero_and_negative_amounts(self):
+        amounts = [500, 0, -100, 300]
+        counts = [1, 1, 1, 1]
+        targets = [400, 300]
+        result = partition_counts_into_targets(amounts, counts, targets)
+        self.assertValidPartition(amounts, counts, targets, result)
+
+    def test_many_kinds_many_targets(self):
+        # Far too many set partitions to enumerate.
+        amounts = [
+            1999, 2549, 399, 1250, 899, 4999, 750, 2100, 1899, 649,
+            3333, 1200, 505, 2999, 1799, 999, 425, 2250, 1375, 1650,
+        ]
+        counts = [1] * len(amounts)
+        groups = [
+            [0, 5, 10, 15, 19],
+            [1, 6, 11, 16],
+            [2, 7, 12, 17],
+            [3, 8, 13, 18],
+            [4, 9, 14],
+        ]
+        targets = [sum(amounts[i] for i in g) for g in groups]
+        result = partition_counts_into_targets(
+            amounts, counts, targets, eps=1)
+        self.assertValidPartition(amounts, counts, targets, result, eps=1)
+
+    def test_bulk_copies(self):
+        # 200 identical units between 3 shipments, plus a few other items.
+        amounts = [2000, 899, 1550]
+        counts = [200, 3, 2]
+        targets = [
+            150 * 2000 + 899,
+            30 * 2000 + 2 * 899 + 1550,
+            20 * 2000 + 1550,
+        ]
+        given = partition_counts_into_targets(amounts, counts, targets)
+
+        self.assertEqual(
+            [sum(g[k] for g in given) for k in range(3)], counts)
+        for target, g in zip(targets, given):
+            self.assertEqual(
+                sum(a * num for a, num in zip(amounts, g)), target)
+
+    def test_budget_exhausted(self):
+        amounts = [1999, 2549, 399, 1250, 899, 4999, 750, 2100]
+        with self.assertRaises(BudgetExhausted):
+            partition_counts_into_targets(
+                amounts, [1] * len(amounts), [1, sum(amounts) - 1],
+                budget=Budget(max_steps=5))
+
+    def test_unreachable_remainders(self):
+        # The units of order 752-0000000-8379965 of a synthetic dataset
+        # (4 shipments, no tracking), which took seconds before targets left
+        # needing sums the smaller units can't make were pruned.
+        amounts = [
+            4270000, 5400000, 9290000, 9560000, 10400000, 10760000, 13620000,
+            18640000, 20430000, 20810000, 24490000, 48450000, 98910000,
+            135040000]
+        counts = [1, 1, 1, 2, 1, 5, 1, 2, 2, 1, 1, 1, 3, 2]
+        targets = [91960000, 380050000, 25080000, 357510000]
+        given = partition_counts_into_targets(
+            amounts, counts, targets, budget=Budget(max_steps=10000))
+
+        self.assertEqual(
+            [sum(g[k] for g in given) for k in range(len(counts))], counts)
+        for target, g in zip(targets, given):
+            self.assertEqual(
+                sum(a * num for a, num in zip(amounts, g)), target)
+
+    def test_sub_unit_eps(self):
+        # Amounts in whole cents, close to a target only within eps.
+        self.assertEqual(
+            partition_counts_into_targets(
+                [20000, 10000], [1, 1], [20040, 9960]),
+            [[1, 0], [0, 1]])
+        self.assertIsNone(
+            partition_counts_into_targets(
+                [20000, 10000], [1, 1], [20060, 9940]))
+
+
+class SubsetsWithSums(unittest.TestCase):
+    def test_simple(self):
+        self.assertEqual(
+            subsets_with_sums([100, 250, 400, 75], [350, 175, 1], eps=1),
+            {350: [(0, 1)], 175: [(0, 3)]})
+
+    def test_min_size(self):
+        self.assertEqual(subsets_with_sums([100, 250], [250], min_size=2), {})
+        self.assertEqual(
+            subsets_with_sums([100, 250, 150], [250], min_size=2),
+            {250: [(0, 2)]})
+
+    def test_max_per_target(self):
+        found = subsets_with_sums([100] * 6, [300], max_per_target=4)
+        self.assertEqual(len(found[300]), 4)
+        self.assertEqual(len(set(found[300])), 4)
+
+    def test_accept_before_max_per_target(self):
+        found = subsets_with_sums(
+            [100] * 6 + [50, 250], [300], max_per_target=4,
+            accept=lambda indexes: 7 in indexes)
+        self.assertEqual(found, {300: [(6, 7)]})
+
+    def test_negative_amounts(self):
+        self.assertEqual(
+            subsets_with_sums([-500, -200, -300], [-800], min_size=2),
+            {-800: [(0, 2)]})
+
+    def test_twenty_amounts(self):
+        amounts = [1000 + 37 * i * i for i in range(20)]
+        target = amounts[1] + amounts[7] + amounts[12] + amounts[19]
+        found = subsets_with_sums(amounts, [target], eps=1, min_size=2)
+        self.assertIn((1, 7, 12, 19), found[target])
+        for indexes in found[target]:
+            self.assertEqual(sum(amounts[i] for i in indexes), target)
+
+    def test_within_eps(self):
+        self.assertEqual(
+            subsets_with_sums(
+                [1000000, 2000000, 4000000], [3010000], eps=10050),
+            {3010000: [(0, 1)]})
+        self.assertEqual(
+            subsets_with_sums([1000000, 2000000, 4000000], [3010000]), {})
+
+    def test_budget_exhausted(self):
+        with self.assertRaises(BudgetExhausted):
+            subsets_with_sums(
+                list(range(1, 21)), [1000], budget=Budget(max_steps=100))
+
+
+if __name__ == '__main__':
+    unittest.main()
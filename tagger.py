@@ -13,7 +13,7 @@ import atexit
 from collections import defaultdict, Counter
 import datetime
 from dotenv import load_dotenv, find_dotenv
-import itertools
+import glob
 import logging
 import os
 import pickle
@@ -30,11 +30,19 @@ from progress.spinner import Spinner
 import readchar
 
 import amazon
+from budget import Budget
 import category
+import categoryhistory
 from currency import micro_usd_nearly_equal
-from currency import micro_usd_to_usd_float
 from currency import micro_usd_to_usd_string
+from currency import CENT_MICRO_USD, MICRO_USD_EPS
+import matcher
 import mint
+import mintcache
+import mintupdates
+import ratelimit
+import runstate
+import updatejournal
 
 
 load_dotenv(find_dotenv())
@@ -46,8 +54,6 @@ logger.setLevel(logging.INFO)
 
 KEYRING_SERVICE_NAME = 'mintapi'
 
-UPDATE_TRANS_ENDPOINT = '/updateTransaction.xevent'
-
 
 class AsyncProgress:
     def __init__(self, progress):
@@ -87,6 +93,10 @@ def main():
     stats = Counter(
         adjust_itemized_tax=0,
         already_up_to_date=0,
+        charge_diff_to_tax=0,
+        combination_search_exhausted=0,
+        item_search_exhausted=0,
+        item_search_no_match=0,
         misc_charge=0,
         new_tag=0,
         no_retag=0,
@@ -95,15 +105,56 @@ def main():
         personal_cat=0,
     )
 
+    run_state = None
+    if args.incremental:
+        if args.retag_changed or args.prompt_retag:
+            logger.warning(
+                'Ignoring --incremental: retagging needs to see every order.')
+        else:
+            run_state = runstate.RunState(args.run_state_path)
+            atexit.register(run_state.close)
+
+    if args.resume:
+        resume_updates(args, run_state)
+        exit(0)
+
+    if not args.dry_run:
+        check_unfinished_updates(args)
+
+    if not args.items_csv or not args.orders_csv:
+        parser.error(
+            'the items_csv and orders_csv reports are required (unless '
+            'resuming with --resume)')
+
+    def keep_row(report):
+        return run_state.row_filter(report) if run_state else None
+
     orders = amazon.Order.parse_from_csv(
-        args.orders_csv, ProgressCounter('Parsing Orders - '))
+        args.orders_csv, ProgressCounter('Parsing Orders - '),
+        keep_row('orders'))
     items = amazon.Item.parse_from_csv(
-        args.items_csv, ProgressCounter('Parsing Items - '))
+        args.items_csv, ProgressCounter('Parsing Items - '),
+        keep_row('items'))
     refunds = ([] if not args.refunds_csv
                else amazon.Refund.parse_from_csv(
-                   args.refunds_csv, ProgressCounter('Parsing Refunds - ')))
+                   args.refunds_csv, ProgressCounter('Parsing Refunds - '),
+                   keep_row('refunds')))
+
+    if run_state:
+        logger.info('Skipped {} report rows finished by earlier runs.'.format(
+            run_state.num_skipped_rows))
+        if not orders and not refunds:
+            logger.info(
+                'All done; nothing new since the last run!')
+            exit(0)
 
     mint_client = None
+    mint_cache = None
+    category_history = None
+    if not args.do_not_predict_categories:
+        category_history = categoryhistory.CategoryHistory(
+            args.category_history_path)
+        atexit.register(category_history.close)
 
     def close_mint_client():
         if mint_client:
@@ -115,28 +166,56 @@ def main():
         mint_trans, mint_category_name_to_id = (
             get_trans_and_categories_from_pickle(args.pickled_epoch))
     else:
-        mint_client = get_mint_client(args)
-
-        # Only get transactions as new as the oldest Amazon order.
-        oldest_trans_date = min([o.order_date for o in orders])
-        if refunds:
-            oldest_trans_date = min(
-                oldest_trans_date,
-                min([o.order_date for o in refunds]))
-        mint_transactions_json, mint_category_name_to_id = (
-            get_trans_and_categories_from_mint(mint_client, oldest_trans_date))
-        epoch = int(time.time())
+        prune_pickles()
+        mint_cache = mintcache.MintCache(args.mint_cache_path)
+        atexit.register(mint_cache.close)
+
+        if args.mint_cache_only:
+            mint_transactions_json, mint_category_name_to_id = (
+                get_trans_and_categories_from_cache(mint_cache))
+        else:
+            mint_client = get_mint_client(args)
+
+            # Only get transactions as new as the oldest Amazon order.
+            start_date = min([o.order_date for o in orders + refunds])
+            if category_history and category_history.is_empty():
+                # Seed the category history for personalized category
+                # tagging overrides with double the length of transaction
+                # history.
+                today = datetime.datetime.now().date()
+                start_date = today - (today - start_date) * 2
+            # Only fetch what changed since the last sync; the cache has the
+            # rest.
+            sync_start_date = start_date
+            if not args.full_mint_sync:
+                sync_start_date = mint_cache.get_sync_start(
+                    start_date, args.mint_sync_lookback_days)
+            fetched_json, mint_category_name_to_id = (
+                get_trans_and_categories_from_mint(
+                    mint_client, sync_start_date))
+            save_trans_and_categories_to_cache(
+                mint_cache, fetched_json, mint_category_name_to_id,
+                sync_start_date)
+            mint_transactions_json = mint_cache.get_transactions(start_date)
+            logger.info('{} Mint transactions since {} ({} from the cache)'
+                        .format(len(mint_transactions_json),
+                                start_date.strftime('%m/%d/%y'),
+                                len(mint_transactions_json) -
+                                len(fetched_json)))
         mint_trans = mint.Transaction.parse_from_json(mint_transactions_json)
-        dump_trans_and_categories(mint_trans, mint_category_name_to_id, epoch)
 
     mint_historic_category_renames = get_mint_category_history_for_items(
-        mint_trans, args)
+        mint_trans, args, category_history)
+    if run_state:
+        mint_trans = [t for t in mint_trans if not run_state.is_tagged(t)]
+    settled_trans = []
     updates, unmatched_orders = get_mint_updates(
         orders, items, refunds,
         mint_trans,
         args, stats,
         mint_historic_category_renames,
-        mint_category_name_to_id)
+        mint_category_name_to_id,
+        settled_trans)
 
     log_amazon_stats(items, orders, refunds)
     log_processing_stats(stats)
@@ -154,7 +233,15 @@ def main():
                 for r in amazon.Refund.merge(orders):
                     print_unmatched(r)
 
+    def record_run_state(failed_ids=()):
+        if run_state and not args.dry_run:
+            run_state.record_done(
+                settled_trans +
+                [t for t, _ in updates if t.id not in failed_ids],
+                {'orders': orders, 'refunds': refunds})
+
     if not updates:
+        record_run_state()
         logger.info(
             'All done; no new tags to be updated at this point in time!')
         exit(0)
@@ -171,17 +258,34 @@ def main():
         if not mint_client:
             mint_client = get_mint_client(args)
 
-        send_updates_to_mint(
-            updates, mint_client, ignore_category=args.no_tag_categories)
-
-
-def get_mint_category_history_for_items(trans, args):
+        if mint_cache:
+            # The cached copies of these are about to be out of date (even
+            # if this run doesn't finish).
+            mint_cache.mark_stale([t for t, _ in updates])
+        journal = updatejournal.UpdateJournal(args.update_journal_path)
+        failed_ids = send_updates_to_mint(
+            updates, mint_client, ignore_category=args.no_tag_categories,
+            concurrency=args.update_concurrency,
+            max_retries=args.update_retries,
+            journal=journal,
+            limiter=get_update_rate_limiter(args),
+            root_url=get_mint_root_url(args),
+            replace_unfinished=args.discard_unfinished_updates)
+        journal.close()
+        record_run_state(failed_ids)
+
+
+def get_mint_category_history_for_items(trans, args, history=None):
     """Gets a mapping of item name -> category name.
 
-    For use in memorizing personalized categories.
+    For use in memorizing personalized categories. If a CategoryHistory is
+    given, it is first updated with the items of trans, and the mapping is
+    learned from all the history it has seen.
     """
     if args.do_not_predict_categories:
         return None
+    # trans is everything since the oldest of them.
+    start_date = min((t.odate for t in trans), default=None)
     # Don't worry about pending.
     trans = [t for t in trans if not t.is_pending]
     # Only do debits for now.
@@ -204,7 +308,7 @@ def get_mint_category_history_for_items(trans, args):
     trans = [t for t in trans
              if t.merchant not in mint.NON_ITEM_MERCHANTS]
 
-    item_to_cats = defaultdict(Counter)
+    item_categories = []
     for t in trans:
         # Remove the prefix for the item:
         for pre in valid_prefixes:
@@ -214,7 +318,15 @@ def get_mint_category_history_for_items(trans, args):
                 item_name = amazon.rm_leading_qty(item_name[len(pre):])
                 break
 
-        item_to_cats[item_name][t.category] += 1
+        item_categories.append((t.id, t.odate, item_name, t.category))
+
+    if history:
+        history.update(item_categories, start_date)
+        item_to_cats = history.get_item_to_categories()
+    else:
+        item_to_cats = defaultdict(Counter)
+        for _, _, item_name, cat in item_categories:
+            item_to_cats[item_name][cat] += 1
 
     item_to_most_common = {}
     for item_name, counter in item_to_cats.items():
@@ -228,7 +340,21 @@ def get_mint_updates(
         trans,
         args, stats,
         mint_historic_category_renames=None,
-        mint_category_name_to_id=category.DEFAULT_MINT_CATEGORIES_TO_IDS):
+        mint_category_name_to_id=category.DEFAULT_MINT_CATEGORIES_TO_IDS,
+        settled_trans=None,
+        stage_timer=None):
+    """Returns the updates to send to Mint and the unmatched orders/refunds.
+
+    If given, matched transactions that need no update (already up to date,
+    or already tagged and not to be retagged) are appended to settled_trans.
+    If given, stage_timer.start(stage) is called as each stage begins (for
+    benchmarks; see pipeline_bench.py).
+    """
+    def start_stage(stage):
+        if stage_timer:
+            stage_timer.start(stage)
+
+    start_stage('associate_items')
     # Remove items from canceled orders.
     items = [i for i in items if not i.is_cancelled()]
     # Remove items that haven't shipped yet (also aren't charged).
@@ -244,12 +370,17 @@ def get_mint_updates(
     itemProgress = IncrementalBar(
         'Matching Amazon Items with Orders',
         max=len(items))
-    amazon.associate_items_with_orders(orders, items, itemProgress)
+    amazon.associate_items_with_orders(
+        orders, items, itemProgress,
+        make_budget=lambda: Budget(
+            args.item_search_steps, args.item_search_seconds),
+        stats=stats)
     itemProgress.finish()
 
     # Only match orders that have items.
     orders = [o for o in orders if o.items]
 
+    start_stage('unsplit_trans')
     trans = mint.Transaction.unsplit(trans)
     stats['trans'] = len(trans)
     # Skip t if the original description doesn't contain 'amazon'
@@ -266,20 +397,35 @@ def get_mint_updates(
             args.mint_input_categories_filter.lower().split(','))
         trans = [t for t in trans if t.category.lower() in cat_whitelist]
 
+    match_tolerance = (
+        (args.match_tolerance_cents or 0) * CENT_MICRO_USD + MICRO_USD_EPS)
+
+    def combination_search_budget():
+        return Budget(
+            args.combination_search_steps, args.combination_search_seconds)
+
     # Match orders.
+    start_stage('match_orders')
     orderMatchProgress = IncrementalBar(
         'Matching Amazon Orders w/ Mint Trans',
         max=len(orders))
-    match_transactions(trans, orders, orderMatchProgress)
+    match_transactions(
+        trans, orders, orderMatchProgress,
+        tolerance=match_tolerance,
+        make_budget=combination_search_budget, stats=stats)
     orderMatchProgress.finish()
 
     unmatched_trans = [t for t in trans if not t.orders]
 
     # Match refunds.
+    start_stage('match_refunds')
     refundMatchProgress = IncrementalBar(
         'Matching Amazon Refunds w/ Mint Trans',
         max=len(refunds))
-    match_transactions(unmatched_trans, refunds, refundMatchProgress)
+    match_transactions(
+        unmatched_trans, refunds, refundMatchProgress,
+        tolerance=match_tolerance,
+        make_budget=combination_search_budget, stats=stats)
     refundMatchProgress.finish()
 
     unmatched_orders = [o for o in orders if not o.matched]
@@ -303,20 +449,19 @@ def get_mint_updates(
     stats['skipped_orders_gift_card'] = num_gift_card
     stats['skipped_orders_unshipped'] = num_unshipped
 
-    merged_orders = []
-    merged_refunds = []
-
+    start_stage('determine_updates')
     updateCounter = IncrementalBar('Determining Mint Updates')
     updates = []
     for t in updateCounter.iter(matched_trans):
         if t.is_debit:
             order = amazon.Order.merge(t.orders)
-            merged_orders.extend(orders)
 
             prefix = '{}: '.format(order.website)
             if args.description_prefix_override:
                 prefix = args.description_prefix_override
 
+            if order.attribute_charge_diff_to_tax(t.amount):
+                stats['charge_diff_to_tax'] += 1
             if order.attribute_subtotal_diff_to_misc_charge():
                 stats['misc_charge'] += 1
             # It's nice when "free" shipping cancels out with the shipping
@@ -337,7 +482,8 @@ def get_mint_updates(
 
         else:
             refunds = amazon.Refund.merge(t.orders)
-            merged_refunds.extend(refunds)
+            if amazon.Refund.attribute_charge_diff_to_tax(refunds, t.amount):
+                stats['charge_diff_to_tax'] += 1
             prefix = '{} refund: '.format(refunds[0].website)
 
             if args.description_return_prefix_override:
@@ -374,6 +520,8 @@ def get_mint_updates(
         if mint.Transaction.old_and_new_are_identical(
                 t, new_transactions, ignore_category=args.no_tag_categories):
             stats['already_up_to_date'] += 1
+            if settled_trans is not None:
+                settled_trans.append(t)
             continue
 
         valid_prefixes = (
@@ -396,6 +544,8 @@ def get_mint_updates(
                 stats['retag'] += 1
             elif not args.retag_changed:
                 stats['no_retag'] += 1
+                if settled_trans is not None:
+                    settled_trans.append(t)
                 continue
             else:
                 stats['retag'] += 1
@@ -409,48 +559,24 @@ def get_mint_updates(
     return updates, unmatched_orders + unmatched_refunds
 
 
-def mark_best_as_matched(t, list_of_orders_or_refunds, progress=None):
-    if not list_of_orders_or_refunds:
-        return
-
-    # Only consider it a match if the posted date (transaction date) is
-    # within 3 days of the ship date of the order.
-    closest_match = None
-    closest_match_num_days = 365  # Large number
-
-    for orders in list_of_orders_or_refunds:
-        an_order = next(o for o in orders if o.transact_date())
-        if not an_order:
-            continue
-        num_days = (t.odate - an_order.transact_date()).days
-        # TODO: consider orders even if it has a matched_transaction if this
-        # transaction is closer.
-        already_matched = any([o.matched for o in orders])
-        if (abs(num_days) < 4 and
-                abs(num_days) < closest_match_num_days and
-                not already_matched):
-            closest_match = orders
-            closest_match_num_days = abs(num_days)
-
-    if closest_match:
-        for o in closest_match:
-            o.match(t)
-        t.match(closest_match)
+def mark_nearest_as_matched(unmatched_trans, index, progress=None):
+    for t, orders in matcher.match_nearest(unmatched_trans, index):
         if progress:
-            progress.next(len(closest_match))
+            progress.next(len(orders))
 
 
-def match_transactions(unmatched_trans, unmatched_orders, progress=None):
+def match_transactions(unmatched_trans, unmatched_orders, progress=None,
+                       tolerance=MICRO_USD_EPS,
+                       make_budget=matcher.new_combination_search_budget,
+                       stats=None):
     # Also works with Refund objects.
-    # First pass: Match up transactions that exactly equal an order's charged
-    # amount.
-    amount_to_orders = defaultdict(list)
-
+    # First pass: Match up transactions that equal an order's charged amount
+    # (within tolerance).
+    index = matcher.AmountDateIndex(tolerance)
     for o in unmatched_orders:
-        amount_to_orders[o.transact_amount()].append([o])
+        index.add(o.transact_amount(), o.transact_date(), [o])
 
-    for t in unmatched_trans:
-        mark_best_as_matched(t, amount_to_orders[t.amount], progress)
+    mark_nearest_as_matched(unmatched_trans, index, progress)
 
     unmatched_orders = [o for o in unmatched_orders if not o.matched]
     unmatched_trans = [t for t in unmatched_trans if not t.orders]
@@ -460,20 +586,37 @@ def match_transactions(unmatched_trans, unmatched_orders, progress=None):
     oid_to_orders = defaultdict(list)
     for o in unmatched_orders:
         oid_to_orders[o.order_id].append(o)
-    amount_to_orders = defaultdict(list)
-    for orders_same_id in oid_to_orders.values():
-        combos = []
-        for r in range(2, len(orders_same_id) + 1):
-            combos.extend(itertools.combinations(orders_same_id, r))
-        for c in combos:
-            orders_total = sum([o.transact_amount() for o in c])
-            amount_to_orders[orders_total].append(c)
+    index = matcher.index_combinations(
+        oid_to_orders.values(), unmatched_trans, tolerance=tolerance,
+        make_budget=make_budget, stats=stats)
+
+    mark_nearest_as_matched(unmatched_trans, index, progress)
+
+    unmatched_orders = [o for o in unmatched_orders if not o.matched]
+    unmatched_trans = [t for t in unmatched_trans if not t.orders]
+
+    # Third pass: Match up transactions to a combination of orders from
+    # different order ids shipped the same day (sometimes those are charged
+    # together too).
+    date_to_orders = defaultdict(list)
+    for o in unmatched_orders:
+        if o.transact_date():
+            date_to_orders[o.transact_date()].append(o)
+    index = matcher.index_combinations(
+        [orders for orders in date_to_orders.values()
+         if len(set(o.order_id for o in orders)) > 1],
+        unmatched_trans, tolerance=tolerance, make_budget=make_budget,
+        stats=stats, multiple_order_ids=True)
 
-    for t in unmatched_trans:
-        mark_best_as_matched(t, amount_to_orders[t.amount], progress)
+    mark_nearest_as_matched(unmatched_trans, index, progress)
 
 
 def get_mint_client(args):
+    if args.mint_standin_url:
+        # Only loaded for load testing/benchmarks.
+        import mint_standin
+        return mint_standin.StandinClient(args.mint_standin_url)
+
     email = args.mint_email
     password = args.mint_password
 
@@ -508,6 +651,9 @@ def get_mint_client(args):
 
 MINT_TRANS_PICKLE_FMT = 'Mint {} Transactions.pickle'
 MINT_CATS_PICKLE_FMT = 'Mint {} Categories.pickle'
+# Pickles are no longer written (see mintcache), but a few of the newest are
+# kept around for --pickled_epoch.
+NUM_PICKLES_KEPT = 2
 
 
 def get_trans_and_categories_from_pickle(pickle_epoch):
@@ -523,18 +669,46 @@ def get_trans_and_categories_from_pickle(pickle_epoch):
     return trans, cats
 
 
-def dump_trans_and_categories(trans, cats, pickle_epoch):
-    label = 'Backing up Mint to local pickle file, epoch: {} '.format(
-        pickle_epoch)
+def prune_pickles(num_kept=NUM_PICKLES_KEPT):
+    """Deletes all but the newest num_kept epochs of Mint pickles."""
+    epochs = set()
+    for fmt in (MINT_TRANS_PICKLE_FMT, MINT_CATS_PICKLE_FMT):
+        prefix, suffix = fmt.split('{}')
+        for path in glob.glob(glob.escape(prefix) + '*' + glob.escape(suffix)):
+            epoch = path[len(prefix):-len(suffix)]
+            if epoch.isdigit():
+                epochs.add(int(epoch))
+    for epoch in sorted(epochs, reverse=True)[num_kept:]:
+        for fmt in (MINT_TRANS_PICKLE_FMT, MINT_CATS_PICKLE_FMT):
+            path = fmt.format(epoch)
+            if os.path.exists(path):
+                logger.info('Removing old Mint pickle: {}'.format(path))
+                os.remove(path)
+
+
+def get_trans_and_categories_from_cache(mint_cache):
+    label = 'Loading Mint transactions from the local cache '
     asyncSpin = AsyncProgress(Spinner(label))
-    with open(MINT_TRANS_PICKLE_FMT.format(pickle_epoch), 'wb') as f:
-        pickle.dump(trans, f)
-    with open(MINT_CATS_PICKLE_FMT.format(pickle_epoch), 'wb') as f:
-        pickle.dump(cats, f)
+    trans = mint_cache.get_transactions()
+    cats = mint_cache.get_categories()
     asyncSpin.finish()
 
+    if not trans:
+        logger.error('The local Mint cache is empty; run without '
+                     '--mint_cache_only first.')
+        exit(1)
+    return trans, cats
+
+
+def save_trans_and_categories_to_cache(mint_cache, trans, cats, start_date):
+    label = 'Saving Mint transactions to the local cache '
+    asyncSpin = AsyncProgress(Spinner(label))
+    mint_cache.put_transactions(trans, start_date)
+    mint_cache.put_categories(cats)
+    asyncSpin.finish()
 
-def get_trans_and_categories_from_mint(mint_client, oldest_trans_date):
+
+def get_trans_and_categories_from_mint(mint_client, start_date):
     # Create a map of Mint category name to category id.
     logger.info('Creating Mint Category Map.')
     start_time = time.time()
@@ -544,10 +718,6 @@ def get_trans_and_categories_from_mint(mint_client, oldest_trans_date):
         for (cat_id, cat_dict) in mint_client.get_categories().items()])
     asyncSpin.finish()
 
-    today = datetime.datetime.now().date()
-    # Double the length of transaction history to help aid in
-    # personalized category tagging overrides.
-    start_date = today - (today - oldest_trans_date) * 2
     start_date_str = start_date.strftime('%m/%d/%y')
     logger.info('Get all Mint transactions since {}.'.format(
         start_date_str))
@@ -567,39 +737,44 @@ def get_trans_and_categories_from_mint(mint_client, oldest_trans_date):
 
 def log_amazon_stats(items, orders, refunds):
     logger.info('\nAmazon Stats:')
-    first_order_date = min([o.order_date for o in orders])
-    last_order_date = max([o.order_date for o in orders])
     logger.info('\n{} orders with {} matching items'.format(
         len([o for o in orders if o.items_matched]),
         len([i for i in items if i.matched])))
     logger.info('{} unmatched orders and {} unmatched items'.format(
         len([o for o in orders if not o.items_matched]),
         len([i for i in items if not i.matched])))
-    logger.info('Orders ranging from {} to {}'.format(
-        first_order_date, last_order_date))
 
-    per_item_totals = [i.item_total for i in items]
-    per_order_totals = [o.total_charged for o in orders]
+    # An incremental run may have nothing but new refunds.
+    if orders:
+        first_order_date = min([o.order_date for o in orders])
+        last_order_date = max([o.order_date for o in orders])
+        logger.info('Orders ranging from {} to {}'.format(
+            first_order_date, last_order_date))
+
+        per_order_totals = [o.total_charged for o in orders]
+
+        logger.info('{} total spend'.format(
+            micro_usd_to_usd_string(sum(per_order_totals))))
 
-    logger.info('{} total spend'.format(
-        micro_usd_to_usd_string(sum(per_order_totals))))
+        logger.info('{} avg order total (range: {} - {})'.format(
+            micro_usd_to_usd_string(sum(per_order_totals) / len(orders)),
+            micro_usd_to_usd_string(min(per_order_totals)),
+            micro_usd_to_usd_string(max(per_order_totals))))
 
-    logger.info('{} avg order total (range: {} - {})'.format(
-        micro_usd_to_usd_string(sum(per_order_totals) / len(orders)),
-        micro_usd_to_usd_string(min(per_order_totals)),
-        micro_usd_to_usd_string(max(per_order_totals))))
-    logger.info('{} avg item price (range: {} - {})'.format(
-        micro_usd_to_usd_string(sum(per_item_totals) / len(items)),
-        micro_usd_to_usd_string(min(per_item_totals)),
-        micro_usd_to_usd_string(max(per_item_totals))))
+    if items:
+        per_item_totals = [i.item_total for i in items]
+        logger.info('{} avg item price (range: {} - {})'.format(
+            micro_usd_to_usd_string(sum(per_item_totals) / len(items)),
+            micro_usd_to_usd_string(min(per_item_totals)),
+            micro_usd_to_usd_string(max(per_item_totals))))
 
     if refunds:
-        first_refund_date = min(
-            [r.refund_date for r in refunds if r.refund_date])
-        last_refund_date = max(
-            [r.refund_date for r in refunds if r.refund_date])
-        logger.info('\n{} refunds dating from {} to {}'.format(
-            len(refunds), first_refund_date, last_refund_date))
+        refund_dates = [r.refund_date for r in refunds if r.refund_date]
+        if refund_dates:
+            logger.info('\n{} refunds dating from {} to {}'.format(
+                len(refunds), min(refund_dates), max(refund_dates)))
+        else:
+            logger.info('\n{} refunds'.format(len(refunds)))
 
         per_refund_totals = [r.total_refund_amount for r in refunds]
 
@@ -619,12 +794,18 @@ def log_processing_stats(stats):
         '{refund_unmatch})\n'
         'Transactions matched w/ orders/refunds: {trans_match} (unmatched: '
         '{trans_unmatch})\n'
+        'Combined charge searches that gave up: '
+        '{combination_search_exhausted}\n'
         '\n'
         'Orders skipped: not shipped: {skipped_orders_unshipped}\n'
         'Orders skipped: gift card used: {skipped_orders_gift_card}\n'
+        'Orders w/o items: item search gave up: {item_search_exhausted}\n'
+        'Orders w/o items: no items add up: {item_search_no_match}\n'
         '\n'
         'Order fix-up: incorrect tax itemization: {adjust_itemized_tax}\n'
         'Order fix-up: has a misc charges (e.g. gift wrap): {misc_charge}\n'
+        'Order/refund fix-up: charged amount off by a few cents: '
+        '{charge_diff_to_tax}\n'
         '\n'
         'Transactions ignored; already tagged & up to date: '
         '{already_up_to_date}\n'
@@ -682,106 +863,129 @@ def print_dry_run(orig_trans_to_tagged, ignore_category=False):
                     trans.dry_run_str(ignore_category)))
 
 
-def send_updates_to_mint(updates, mint_client, ignore_category=False):
+def send_updates_to_mint(updates, mint_client, ignore_category=False,
+                         concurrency=mintupdates.DEFAULT_CONCURRENCY,
+                         max_retries=mintupdates.DEFAULT_MAX_RETRIES,
+                         journal=None, limiter=None, root_url=MINT_ROOT_URL,
+                         replace_unfinished=False):
+    """Sends updates to Mint. If an UpdateJournal is given, they're first
+    written down in it, so an interrupted run can be resumed. Unfinished
+    updates of an earlier run are only dropped from it if
+    replace_unfinished (see UpdateJournal.plan).
+
+    Returns the ids of the transactions that couldn't be updated."""
+    planned = mintupdates.plan_updates(updates, ignore_category)
+    if journal:
+        journal.plan(planned, replace_unfinished)
+    return send_planned_updates(
+        planned, mint_client, concurrency, max_retries, journal, limiter,
+        root_url)
+
+
+def get_mint_root_url(args):
+    return args.mint_standin_url or MINT_ROOT_URL
+
+
+def get_update_client(mint_client, concurrency):
+    # The Mint client's web driver is not safe to share between threads
+    # (other clients, like a stand-in's, are used as is).
+    if concurrency <= 1 or not isinstance(mint_client, Mint):
+        return mint_client
+    return mintupdates.SessionClient(mint_client, concurrency)
+
+
+def get_update_rate_limiter(args):
+    return ratelimit.AdaptiveRateLimiter(
+        rate=args.update_rate, max_rate=args.max_update_rate)
+
+
+def send_planned_updates(planned, mint_client,
+                         concurrency=mintupdates.DEFAULT_CONCURRENCY,
+                         max_retries=mintupdates.DEFAULT_MAX_RETRIES,
+                         journal=None, limiter=None, root_url=MINT_ROOT_URL):
     updateProgress = IncrementalBar(
         'Updating Mint',
-        max=len(updates))
+        max=len(planned))
 
     start_time = time.time()
-    num_requests = 0
-    for (orig_trans, new_trans) in updates:
-        if len(new_trans) == 1:
-            # Update the existing transaction.
-            trans = new_trans[0]
-            modify_trans = {
-                'task': 'txnedit',
-                'txnId': '{}:0'.format(trans.id),
-                'note': trans.note,
-                'merchant': trans.merchant,
-                'token': mint_client.token,
-            }
-            if not ignore_category:
-                modify_trans = {
-                    **modify_trans,
-                    'category': trans.category,
-                    'catId': trans.category_id,
-                }
-
-            logger.debug('Sending a "modify" transaction request: {}'.format(
-                modify_trans))
-            response = mint_client.post(
-                '{}{}'.format(
-                    MINT_ROOT_URL,
-                    UPDATE_TRANS_ENDPOINT),
-                data=modify_trans).text
-            updateProgress.next()
-            logger.debug('Received response: {}'.format(response))
-            num_requests += 1
-        else:
-            # Split the existing transaction into many.
-            # If the existing transaction is a:
-            #   - credit: positive amount is credit, negative debit
-            #   - debit: positive amount is debit, negative credit
-            itemized_split = {
-                'txnId': '{}:0'.format(orig_trans.id),
-                'task': 'split',
-                'data': '',  # Yup this is weird.
-                'token': mint_client.token,
-            }
-            for (i, trans) in enumerate(new_trans):
-                amount = trans.amount
-                # Based on the comment above, if the original transaction is a
-                # credit, flip the amount sign for things to work out!
-                if not orig_trans.is_debit:
-                    amount *= -1
-                amount = micro_usd_to_usd_float(amount)
-                itemized_split['amount{}'.format(i)] = amount
-                # Yup. Weird:
-                itemized_split['percentAmount{}'.format(i)] = amount
-                itemized_split['merchant{}'.format(i)] = trans.merchant
-                # Yup weird. '0' means new?
-                itemized_split['txnId{}'.format(i)] = 0
-                if not ignore_category:
-                    itemized_split['category{}'.format(i)] = trans.category
-                    itemized_split['categoryId{}'.format(i)] = (
-                        trans.category_id)
-
-            logger.debug('Sending a "split" transaction request: {}'.format(
-                itemized_split))
-            response = mint_client.post(
-                '{}{}'.format(
-                    MINT_ROOT_URL,
-                    UPDATE_TRANS_ENDPOINT),
-                data=itemized_split)
-            json_resp = response.json()
-            # The first id is always the original transaction (now
-            # parent transaction id).
-            new_trans_ids = json_resp['txnId'][1:]
-            assert len(new_trans_ids) == len(new_trans)
-            for itemized_id, trans in zip(new_trans_ids, new_trans):
-                # Now send the note for each itemized transaction.
-                itemized_note = {
-                    'task': 'txnedit',
-                    'txnId': '{}:0'.format(itemized_id),
-                    'note': trans.note,
-                    'token': mint_client.token,
-                }
-                note_response = mint_client.post(
-                    '{}{}'.format(
-                        MINT_ROOT_URL,
-                        UPDATE_TRANS_ENDPOINT),
-                    data=itemized_note)
-                logger.debug(
-                    'Received note response: {}'.format(note_response.text))
-
-            updateProgress.next()
-            logger.debug('Received response: {}'.format(response.text))
-            num_requests += 1
-
+    dispatcher = mintupdates.UpdateDispatcher(
+        get_update_client(mint_client, concurrency), root_url,
+        concurrency=concurrency, max_retries=max_retries, limiter=limiter)
+    failures = dispatcher.send(planned, updateProgress, journal)
     updateProgress.finish()
 
     dur = s_to_time(time.time() - start_time)
-    logger.info('Sent {} updates to Mint in {}'.format(num_requests, dur))
+    stats = dispatcher.stats
+    logger.info('Sent {} updates to Mint in {}'.format(
+        len(planned) - len(failures), dur))
+    logger.info('{} requests ({:.2f} per transaction), {} empty notes '
+                'skipped'.format(
+                    stats['requests'],
+                    stats['requests'] / max(1, len(planned)),
+                    stats['notes_skipped']))
+    latencies = dispatcher.get_latency_percentiles()
+    if latencies[100] is not None:
+        logger.info(
+            'Request latency: p50 {:.3f}s, p90 {:.3f}s, p99 {:.3f}s, max '
+            '{:.3f}s'.format(
+                latencies[50], latencies[90], latencies[99], latencies[100]))
+    logger.info('{} retries, {} failed requests{}'.format(
+        stats['retries'], stats['failed_requests'],
+        '; ended at {:.1f} requests/s ({} slowdowns)'.format(
+            limiter.rate, limiter.num_decreases) if limiter else ''))
+    for update, error in failures:
+        logger.error('Failed to update transaction {}: {}'.format(
+            update.trans_id, error))
+    if failures and journal:
+        logger.info('Run again with --resume to retry the failed updates.')
+    return set(update.trans_id for update, _ in failures)
+
+
+def check_unfinished_updates(args):
+    """Exits if an earlier run left updates unfinished in the journal,
+    which this run would otherwise drop (unless
+    --discard_unfinished_updates)."""
+    journal = updatejournal.UpdateJournal(args.update_journal_path)
+    num_unfinished = len(journal.get_unfinished())
+    journal.close()
+    if not num_unfinished:
+        return
+    if args.discard_unfinished_updates:
+        logger.warning(
+            'Discarding {} unfinished updates of an earlier run.'.format(
+                num_unfinished))
+        return
+    logger.error(
+        '{} updates of an earlier run are unfinished. Finish them first '
+        'with --resume, or drop them with '
+        '--discard_unfinished_updates.'.format(num_unfinished))
+    exit(1)
+
+
+def resume_updates(args, run_state=None):
+    """Finishes sending the updates journaled by an earlier run."""
+    journal = updatejournal.UpdateJournal(args.update_journal_path)
+    planned = journal.get_unfinished()
+    if not planned:
+        journal.close()
+        logger.info('All done; no unfinished updates to resume!')
+        return
+    logger.info('Resuming {} unfinished updates ({}).'.format(
+        len(planned),
+        ', '.join('{} {}'.format(count, status) for status, count in
+                  sorted(Counter(u.status for u in planned).items()))))
+    if args.dry_run:
+        journal.close()
+        return
+
+    mint_client = get_mint_client(args)
+    failed_ids = send_planned_updates(
+        planned, mint_client, args.update_concurrency, args.update_retries,
+        journal, get_update_rate_limiter(args), get_mint_root_url(args))
+    journal.close()
+    if run_state:
+        run_state.record_tagged(
+            [u.trans_id for u in planned if u.trans_id not in failed_ids])
 
 
 def s_to_time(s):
@@ -805,10 +1009,10 @@ def define_args(parser):
 
     # Inputs:
     parser.add_argument(
-        'items_csv', type=argparse.FileType('r'),
+        'items_csv', type=argparse.FileType('r'), nargs='?',
         help='The "Items" Order History Report from Amazon')
     parser.add_argument(
-        'orders_csv', type=argparse.FileType('r'),
+        'orders_csv', type=argparse.FileType('r'), nargs='?',
         help='The "Orders and Shipments" Order History Report from Amazon')
     parser.add_argument(
         '--refunds_csv', type=argparse.FileType('r'),
@@ -826,12 +1030,122 @@ def define_args(parser):
         help=('Do not split Mint transactions into individual items with '
               'attempted categorization.'))
 
+    # Matching limits:
+    parser.add_argument(
+        '--item_search_steps', type=int,
+        default=amazon.DEFAULT_ITEM_SEARCH_STEPS,
+        help=('The most search steps to spend figuring out which items went '
+              'into which shipment of a single order before giving up on '
+              'it.'))
+    parser.add_argument(
+        '--item_search_seconds', type=float,
+        default=amazon.DEFAULT_ITEM_SEARCH_SECONDS,
+        help=('The most time (in seconds) to spend figuring out which items '
+              'went into which shipment of a single order before giving up '
+              'on it.'))
+
+    parser.add_argument(
+        '--match_tolerance_cents', type=int,
+        default=0,
+        help=('Match orders/refunds with Mint transactions whose amounts '
+              'differ by up to this many cents (e.g. from rounding). The '
+              'difference is attributed to tax. By default amounts must be '
+              'equal.'))
+    parser.add_argument(
+        '--combination_search_steps', type=int,
+        default=matcher.DEFAULT_COMBINATION_SEARCH_STEPS,
+        help=('The most search steps to spend looking for a combination of '
+              'orders (of one order id, or shipped the same day) charged '
+              'together as one transaction, per order id/day.'))
+    parser.add_argument(
+        '--combination_search_seconds', type=float,
+        default=matcher.DEFAULT_COMBINATION_SEARCH_SECONDS,
+        help=('The most time (in seconds) to spend looking for a combination '
+              'of orders charged together as one transaction, per order '
+              'id/day.'))
+
+    # Incremental runs:
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help=('Remember which orders and transactions were tagged, and skip '
+              'them (and their report rows) on later runs. Ignored with '
+              '--retag_changed or --prompt_retag.'))
+    parser.add_argument(
+        '--run_state_path', type=str,
+        default=runstate.DEFAULT_RUN_STATE_PATH,
+        help=('Where --incremental keeps what earlier runs finished.'))
+
+    # Local Mint cache:
+    parser.add_argument(
+        '--mint_cache_path', type=str,
+        default=mintcache.DEFAULT_MINT_CACHE_PATH,
+        help=('Where to keep the local copy of Mint transactions and '
+              'categories.'))
+    parser.add_argument(
+        '--full_mint_sync', action='store_true',
+        help=('Fetch all Mint transactions needed for the Amazon reports, '
+              'rather than only those that changed since the last run.'))
+    parser.add_argument(
+        '--mint_sync_lookback_days', type=int,
+        default=mintcache.DEFAULT_SYNC_LOOKBACK_DAYS,
+        help=('When only fetching what changed since the last run, also '
+              'fetch this many days before it again (transactions can post '
+              'or change a while after their date).'))
+    parser.add_argument(
+        '--mint_cache_only', action='store_true',
+        help=('Do not fetch categories or transactions from Mint. Use the '
+              'local Mint cache (from an earlier run) instead. If coupled '
+              'with --dry_run, no connection to Mint is established.'))
+
+    # Sending updates:
+    parser.add_argument(
+        '--update_concurrency', type=int,
+        default=mintupdates.DEFAULT_CONCURRENCY,
+        help=('How many Mint transactions to update at once.'))
+    parser.add_argument(
+        '--update_retries', type=int,
+        default=mintupdates.DEFAULT_MAX_RETRIES,
+        help=('How many times to retry a failed Mint update request (with '
+              'exponential backoff) before giving up on the update.'))
+    parser.add_argument(
+        '--update_rate', type=float,
+        default=ratelimit.DEFAULT_RATE,
+        help=('How many requests per second to start sending Mint updates '
+              'at. The rate then adapts: it goes up while Mint keeps up, '
+              'and down on errors, throttling or slow responses.'))
+    parser.add_argument(
+        '--max_update_rate', type=float,
+        default=ratelimit.DEFAULT_MAX_RATE,
+        help=('The most requests per second to ever send Mint updates at.'))
+    parser.add_argument(
+        '--update_journal_path', type=str,
+        default=updatejournal.DEFAULT_UPDATE_JOURNAL_PATH,
+        help=('Where to journal the updates being sent to Mint, so an '
+              'interrupted run can be finished with --resume.'))
+    parser.add_argument(
+        '--resume', action='store_true',
+        help=('Finish sending the updates of an interrupted (or partly '
+              'failed) run from the update journal, without reading the '
+              'Amazon reports or fetching from Mint.'))
+    parser.add_argument(
+        '--discard_unfinished_updates', action='store_true',
+        help=('Start over even if the update journal has unfinished '
+              'updates of an earlier run (which are then never sent). '
+              'Otherwise, such a run refuses to go on until they are '
+              'finished with --resume.'))
+
     # Debugging/testing.
+    parser.add_argument(
+        '--mint_standin_url', type=str,
+        help=('Talk to a local Mint stand-in (see mint_standin.py) at this '
+              'url instead of Mint, e.g. http://localhost:8080. For load '
+              'testing and benchmarks; no Mint login is needed. Best used '
+              'with its own --mint_cache_path.'))
     parser.add_argument(
         '--pickled_epoch', type=int,
         help=('Do not fetch categories or transactions from Mint. Use this '
-              'pickled epoch instead. If coupled with --dry_run, no '
-              'connection to Mint is established.'))
+              'pickled epoch (from an older version) instead. If coupled '
+              'with --dry_run, no connection to Mint is established.'))
     parser.add_argument(
         '--dry_run', action='store_true',
         help=('Do not modify Mint transaction; instead print the proposed '
@@ -916,6 +1230,11 @@ def define_args(parser):
         help=('Do not attempt to predict custom category tagging based on any '
               'tagging overrides. By default (no arg) tagger will attempt to '
               'find items that you have manually changed categories for.'))
+    parser.add_argument(
+        '--category_history_path', type=str,
+        default=categoryhistory.DEFAULT_CATEGORY_HISTORY_PATH,
+        help=('Where to remember the categories of previously tagged items '
+              'across runs, for predicting custom category tagging.'))
 
 
 if __name__ == '__main__':
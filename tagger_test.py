@@ -1,8 +1,18 @@
 from collections import Counter
+import os
+import tempfile
 import unittest
 
+import amazon
+from budget import Budget
+from categoryhistory import CategoryHistory
+import mintupdates
+from mintupdates_test import edit_update
+import runstate
 import tagger
+import updatejournal
 from mockdata import item, order, refund, transaction
+from mockdata import item_dict, order_dict, to_csv_file
 
 
 class Args:
@@ -21,7 +31,13 @@ def get_args(
         no_tag_categories=False,
         prompt_retag=False,
         num_updates=0,
-        retag_changed=False):
+        retag_changed=False,
+        item_search_steps=None,
+        item_search_seconds=None,
+        combination_search_steps=None,
+        combination_search_seconds=None,
+        match_tolerance_cents=0,
+        do_not_predict_categories=False):
     return Args(
         description_prefix_override=description_prefix_override,
         description_return_prefix_override=description_return_prefix_override,
@@ -34,6 +50,12 @@ def get_args(
         prompt_retag=prompt_retag,
         num_updates=num_updates,
         retag_changed=retag_changed,
+        item_search_steps=item_search_steps,
+        item_search_seconds=item_search_seconds,
+        combination_search_steps=combination_search_steps,
+        combination_search_seconds=combination_search_seconds,
+        match_tolerance_cents=match_tolerance_cents,
+        do_not_predict_categories=do_not_predict_categories,
     )
 
 
@@ -68,6 +90,25 @@ class Tagger(unittest.TestCase):
 
         self.assertEqual(stats['new_tag'], 1)
 
+    def test_get_mint_updates_stage_timer(self):
+        class StageRecorder:
+            def __init__(self):
+                self.stages = []
+
+            def start(self, stage):
+                self.stages.append(stage)
+
+        timer = StageRecorder()
+        updates, _ = tagger.get_mint_updates(
+            [order()], [item()], [],
+            [transaction()],
+            get_args(), Counter(), stage_timer=timer)
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(timer.stages, [
+            'associate_items', 'unsplit_trans', 'match_orders',
+            'match_refunds', 'determine_updates'])
+
     def test_get_mint_updates_simple_match_refund(self):
         r1 = refund(
             title='Cool item',
@@ -273,6 +314,311 @@ class Tagger(unittest.TestCase):
 
         self.assertEqual(len(updates2), 1)
 
+    def test_get_mint_updates_combined_shipments(self):
+        i1 = item(order_id='A', item_subtotal='$10.90', tracking='A')
+        o1 = order(order_id='A', tracking='A')
+        i2 = item(order_id='A', item_subtotal='$10.90', tracking='B')
+        o2 = order(order_id='A', tracking='B')
+        t1 = transaction(amount='$23.90')
+
+        stats = Counter()
+        updates, _ = tagger.get_mint_updates(
+            [o1, o2], [i1, i2], [],
+            [t1],
+            get_args(), stats)
+
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(o1.matched)
+        self.assertTrue(o2.matched)
+
+    def test_get_mint_updates_combined_orders_same_day(self):
+        i1 = item(order_id='A')
+        o1 = order(order_id='A')
+        i2 = item(order_id='B')
+        o2 = order(order_id='B')
+        t1 = transaction(amount='$23.90')
+
+        stats = Counter()
+        updates, _ = tagger.get_mint_updates(
+            [o1, o2], [i1, i2], [],
+            [t1],
+            get_args(), stats)
+
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(o1.matched)
+        self.assertTrue(o2.matched)
+
+    def test_get_mint_updates_combined_orders_same_day_notes(self):
+        i1 = item(order_id='A', title='Thing A')
+        o1 = order(order_id='A')
+        i2 = item(order_id='B', title='Thing B')
+        o2 = order(order_id='B')
+        t1 = transaction(amount='$23.90')
+
+        updates, _ = tagger.get_mint_updates(
+            [o1, o2], [i1, i2], [],
+            [t1],
+            get_args(), Counter())
+
+        [(_, new_trans)] = updates
+        notes = {nt.merchant: nt.note for nt in new_trans}
+        note_a = notes['Amazon.com: 2x Thing A']
+        note_b = notes['Amazon.com: 2x Thing B']
+        self.assertIn('Amazon order id: A\n', note_a)
+        self.assertTrue(note_a.endswith('orderID=A'))
+        self.assertNotIn('order id: B', note_a)
+        self.assertIn('Amazon order id: B\n', note_b)
+        self.assertTrue(note_b.endswith('orderID=B'))
+        self.assertNotIn('order id: A', note_b)
+
+    def test_get_mint_updates_match_tolerance(self):
+        i1 = item()
+        o1 = order()
+        t1 = transaction(amount='$11.96')
+
+        stats = Counter()
+        updates, _ = tagger.get_mint_updates(
+            [o1], [i1], [],
+            [t1],
+            get_args(), stats)
+        self.assertEqual(len(updates), 0)
+
+        updates, _ = tagger.get_mint_updates(
+            [o1], [i1], [],
+            [t1],
+            get_args(match_tolerance_cents=1, verbose_itemize=True), stats)
+
+        self.assertEqual(len(updates), 1)
+        _, new_trans = updates[0]
+        self.assertEqual(new_trans[0].amount, 11960000)
+        self.assertEqual(stats['charge_diff_to_tax'], 1)
+
+    def test_get_mint_updates_refund_match_tolerance(self):
+        r1 = refund(
+            refund_amount='$10.95',
+            refund_tax_amount='$1.00',
+            refund_date='3/12/14')
+        t1 = transaction(amount='$11.94', is_debit=False, date='3/12/14')
+
+        stats = Counter()
+        updates, _ = tagger.get_mint_updates(
+            [], [], [r1],
+            [t1],
+            get_args(match_tolerance_cents=1), stats)
+
+        self.assertEqual(len(updates), 1)
+        _, new_trans = updates[0]
+        self.assertEqual(new_trans[0].amount, -11940000)
+        self.assertEqual(stats['charge_diff_to_tax'], 1)
+
+    def test_match_transactions_combination_budget(self):
+        o1 = order(order_id='A', total_charged='$1.00')
+        o2 = order(order_id='B', total_charged='$2.00')
+        t1 = transaction(amount='$3.00')
+
+        stats = Counter()
+        tagger.match_transactions(
+            [t1], [o1, o2], make_budget=lambda: Budget(max_steps=1),
+            stats=stats)
+
+        self.assertFalse(t1.orders)
+        self.assertEqual(stats['combination_search_exhausted'], 1)
+
+
+class CategoryHistoryForItems(unittest.TestCase):
+    def test_from_trans(self):
+        trans = [
+            transaction(merchant='Amazon.com: 2x Duracell AAs',
+                        category='Electronics', id=1),
+            transaction(merchant='Amazon.com: Duracell AAs',
+                        category='Electronics', id=2),
+            transaction(merchant='Amazon.com: Duracell AAs',
+                        category='Home', id=3),
+            transaction(merchant='Not tagged', category='Home', id=4),
+        ]
+
+        self.assertEqual(
+            tagger.get_mint_category_history_for_items(trans, get_args()),
+            {'duracell aas': 'Electronics'})
+        self.assertIsNone(tagger.get_mint_category_history_for_items(
+            trans, get_args(do_not_predict_categories=True)))
+
+    def test_learns_from_earlier_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = CategoryHistory(os.path.join(tmp, 'history.sqlite'))
+            tagger.get_mint_category_history_for_items([
+                transaction(merchant='Amazon.com: Old book', date='2/1/12',
+                            category='Books', id=1),
+            ], get_args(), history)
+
+            self.assertEqual(
+                tagger.get_mint_category_history_for_items([
+                    transaction(merchant='Amazon.com: New thing',
+                                date='2/28/14', category='Home', id=2),
+                ], get_args(), history),
+                {'old book': 'Books', 'new thing': 'Home'})
+            history.close()
+
+
+class LogAmazonStats(unittest.TestCase):
+    def test_only_new_refunds(self):
+        # E.g. an incremental run after a return, with no new orders.
+        r1 = refund(refund_date='3/12/14')
+        t1 = transaction(amount='$11.95', is_debit=False, date='3/12/14')
+        updates, _ = tagger.get_mint_updates(
+            [], [], [r1], [t1], get_args(), Counter())
+        self.assertEqual(len(updates), 1)
+
+        with self.assertLogs(tagger.logger) as logs:
+            tagger.log_amazon_stats([], [], [r1])
+
+        output = '\n'.join(logs.output)
+        self.assertIn('0 orders with 0 matching items', output)
+        self.assertIn('1 refunds dating from 2014-03-12 to 2014-03-12', output)
+        self.assertNotIn('avg order total', output)
+
+    def test_orders_and_items(self):
+        i1 = item()
+        o1 = order()
+        o1.set_items([i1])
+
+        with self.assertLogs(tagger.logger) as logs:
+            tagger.log_amazon_stats([i1], [o1], [])
+
+        output = '\n'.join(logs.output)
+        self.assertIn('1 orders with 1 matching items', output)
+        self.assertIn('$11.95 avg order total', output)
+
+
+class IncrementalRuns(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'state.sqlite')
+        # Order A ships in two packages, charged separately.
+        self.order_dicts = [
+            order_dict(order_id='A', tracking='1'),
+            order_dict(order_id='A', tracking='2', subtotal='$20.00',
+                       tax_charged='$1.50', tax_before_promotions='$1.50',
+                       total_charged='$21.50'),
+        ]
+        self.item_dicts = [
+            item_dict(order_id='A', tracking='1'),
+            item_dict(order_id='A', tracking='2', title='Thing',
+                      item_subtotal='$20.00', item_subtotal_tax='$1.50',
+                      item_total='$21.50', purchase_price_per_unit='$20.00',
+                      quantity=1, asin='B0000THING'),
+        ]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_tagger(self, mint_trans):
+        """Does what tagger.main does with --incremental. Returns the
+        updates and the number of orders parsed."""
+        state = runstate.RunState(self.path)
+        orders = amazon.Order.parse_from_csv(
+            to_csv_file(self.order_dicts),
+            keep_row=state.row_filter('orders'))
+        items = amazon.Item.parse_from_csv(
+            to_csv_file(self.item_dicts),
+            keep_row=state.row_filter('items'))
+        mint_trans = [t for t in mint_trans if not state.is_tagged(t)]
+        settled_trans = []
+        updates, _ = tagger.get_mint_updates(
+            orders, items, [], mint_trans, get_args(), Counter(),
+            settled_trans=settled_trans)
+        state.record_done(
+            settled_trans + [t for t, _ in updates],
+            {'orders': orders, 'refunds': []})
+        state.close()
+        return updates, len(orders)
+
+    def test_partly_shipped_order(self):
+        # Only the first package was charged so far.
+        t1 = transaction(id=1, amount='$11.95')
+        updates, num_orders = self.run_tagger([t1])
+        self.assertEqual(num_orders, 2)
+        self.assertEqual([t.id for t, _ in updates], [1])
+
+        # By the next run, the second package was charged too. Another,
+        # unrelated charge of the same amount as the first came the day
+        # after.
+        [(_, [tagged_t1])] = updates
+        t2 = transaction(id=2, amount='$21.50')
+        t3 = transaction(id=3, amount='$11.95', date='3/1/14')
+        updates, num_orders = self.run_tagger([tagged_t1, t2, t3])
+        self.assertEqual(num_orders, 2)
+        # The first package still matches the charge it was tagged on.
+        self.assertEqual([t.id for t, _ in updates], [2])
+
+        # Order A is done now.
+        updates, num_orders = self.run_tagger([tagged_t1, t2, t3])
+        self.assertEqual(num_orders, 0)
+        self.assertEqual(updates, [])
+
+
+class UnfinishedUpdates(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'journal.sqlite')
+        journal = updatejournal.UpdateJournal(self.path)
+        # An earlier run died before this went out.
+        journal.plan(mintupdates.plan_updates([edit_update(1)]))
+        journal.close()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def args(self, discard_unfinished_updates=False):
+        return Args(
+            update_journal_path=self.path,
+            discard_unfinished_updates=discard_unfinished_updates)
+
+    def test_refuses_to_drop_unfinished(self):
+        with self.assertLogs(level='ERROR') as logs:
+            with self.assertRaises(SystemExit):
+                tagger.check_unfinished_updates(self.args())
+        self.assertIn('--resume', '\n'.join(logs.output))
+
+    def test_discards_unfinished_if_asked(self):
+        with self.assertLogs(level='WARNING'):
+            tagger.check_unfinished_updates(
+                self.args(discard_unfinished_updates=True))
+
+    def test_send_keeps_unfinished(self):
+        journal = updatejournal.UpdateJournal(self.path)
+        with self.assertRaises(updatejournal.UnfinishedUpdatesError):
+            tagger.send_updates_to_mint(
+                [edit_update(2)], None, journal=journal)
+        [unfinished] = journal.get_unfinished()
+        self.assertEqual(unfinished.trans_id, 1)
+        journal.close()
+
+
+class PrunePickles(unittest.TestCase):
+    def test_keeps_newest_epochs(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                for epoch in (100, 2000, 300):
+                    for fmt in (tagger.MINT_TRANS_PICKLE_FMT,
+                                tagger.MINT_CATS_PICKLE_FMT):
+                        open(fmt.format(epoch), 'w').close()
+                open('Mint notes.pickle', 'w').close()
+
+                tagger.prune_pickles(num_kept=2)
+
+                self.assertEqual(sorted(os.listdir(tmp)), [
+                    'Mint 2000 Categories.pickle',
+                    'Mint 2000 Transactions.pickle',
+                    'Mint 300 Categories.pickle',
+                    'Mint 300 Transactions.pickle',
+                    'Mint notes.pickle',
+                ])
+            finally:
+                os.chdir(cwd)
+
 
 if __name__ == '__main__':
     unittest.main()
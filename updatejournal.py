@@ -0,0 +1,166 @@
+import json
+import sqlite3
+import time
+
+from mintupdates import CONFIRMED, SENT, PlannedUpdate
+
+# Lives next to the Mint pickles.
+DEFAULT_UPDATE_JOURNAL_PATH = 'Mint Update Journal.sqlite'
+
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS updates (
+    id INTEGER PRIMARY KEY,
+    trans_id INTEGER NOT NULL,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    child_ids TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notes (
+    update_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    note TEXT NOT NULL,
+    done INTEGER NOT NULL,
+    PRIMARY KEY (update_id, seq)
+);
+'''
+
+
+class UnfinishedUpdatesError(Exception):
+    """Raised when planning would drop updates an earlier run left
+    unfinished."""
+
+
+class UpdateJournal:
+    """A write-ahead journal of the updates a run sends to Mint, kept in
+    SQLite.
+
+    Every update is written down (as the requests to send, less the session
+    token) before anything is sent, and its status moves from pending, to
+    sent as its edit/split request is handed to a thread to send (so it may
+    have gone out), to confirmed once Mint answered (along with the ids of
+    the transactions a split made). The note edits following a split are
+    marked done one by one.
+
+    A run that died partway through can then be finished from the journal
+    alone. Updates that were sent but not confirmed are simply sent again:
+    both an edit and a split (of the parent transaction) replace whatever
+    was there before.
+    """
+
+    def __init__(self, path=DEFAULT_UPDATE_JOURNAL_PATH):
+        self.conn = sqlite3.connect(path)
+        # Cheap commits; every completed request is one.
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        version = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version and int(version[0]) != SCHEMA_VERSION:
+            raise ValueError(
+                'Unsupported update journal schema version {} in {}'.format(
+                    version[0], path))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),))
+
+    def close(self):
+        self.conn.close()
+
+    def plan(self, updates, replace_unfinished=False):
+        """Replaces the journal with updates (PlannedUpdates), all pending,
+        and assigns their ids.
+
+        Raises UnfinishedUpdatesError if the journal still has unfinished
+        updates (see resume), unless replace_unfinished."""
+        if not replace_unfinished:
+            num_unfinished = len(self.get_unfinished())
+            if num_unfinished:
+                raise UnfinishedUpdatesError(
+                    '{} updates of an earlier run are unfinished'.format(
+                        num_unfinished))
+        now = int(time.time())
+        with self.conn:
+            self.conn.execute('DELETE FROM updates')
+            self.conn.execute('DELETE FROM notes')
+            for update in updates:
+                update.id = self.conn.execute(
+                    'INSERT INTO updates (trans_id, request, status, '
+                    'updated_at) VALUES (?, ?, ?, ?)',
+                    (update.trans_id, json.dumps(update.request),
+                     update.status, now)).lastrowid
+                self.conn.executemany(
+                    'INSERT INTO notes VALUES (?, ?, ?, 0)',
+                    [(update.id, seq, note)
+                     for seq, note in enumerate(update.notes or ())])
+
+    def mark_sent(self, updates):
+        self.set_status(updates, SENT)
+
+    def mark_confirmed(self, update):
+        """Records that Mint took an update's edit/split (along with the
+        child_ids of a split)."""
+        with self.conn:
+            self.conn.execute(
+                'UPDATE updates SET status = ?, child_ids = ?, '
+                'updated_at = ? WHERE id = ?',
+                (CONFIRMED,
+                 json.dumps(update.child_ids) if update.child_ids else None,
+                 int(time.time()),
+                 update.id))
+        update.status = CONFIRMED
+
+    def mark_note_done(self, update, seq):
+        with self.conn:
+            self.conn.execute(
+                'UPDATE notes SET done = 1 WHERE update_id = ? AND seq = ?',
+                (update.id, seq))
+
+    def set_status(self, updates, status):
+        now = int(time.time())
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE updates SET status = ?, updated_at = ? WHERE id = ?',
+                [(status, now, u.id) for u in updates])
+        for u in updates:
+            u.status = status
+
+    def get_updates(self):
+        """Returns every journaled update as a PlannedUpdate, in the order
+        they were planned."""
+        notes = {}
+        done_notes = {}
+        for update_id, seq, note, done in self.conn.execute(
+                'SELECT update_id, seq, note, done FROM notes '
+                'ORDER BY update_id, seq'):
+            notes.setdefault(update_id, []).append(note)
+            if done:
+                done_notes.setdefault(update_id, []).append(seq)
+        return [
+            PlannedUpdate(
+                trans_id,
+                json.loads(request),
+                notes.get(update_id),
+                id=update_id,
+                status=status,
+                child_ids=json.loads(child_ids) if child_ids else None,
+                done_notes=done_notes.get(update_id, ()))
+            for update_id, trans_id, request, status, child_ids
+            in self.conn.execute(
+                'SELECT id, trans_id, request, status, child_ids '
+                'FROM updates ORDER BY id')]
+
+    def get_unfinished(self):
+        """Returns the journaled updates that still need sending (in part or
+        in full)."""
+        return [u for u in self.get_updates() if not u.is_done()]
+
+    def num_by_status(self):
+        return dict(self.conn.execute(
+            'SELECT status, COUNT(*) FROM updates GROUP BY status'))
@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+
+import mintupdates
+from mintupdates import CONFIRMED, PENDING, SENT, UpdateDispatcher
+from mintupdates_test import (
+    FakeClient, FakeResponse, InterruptingProgress, edit_update,
+    split_update)
+from updatejournal import UnfinishedUpdatesError, UpdateJournal
+
+
+class UpdateJournalClass(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'journal.sqlite')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def plan(self, journal, updates, replace_unfinished=False):
+        planned = mintupdates.plan_updates(updates)
+        journal.plan(planned, replace_unfinished)
+        return planned
+
+    def test_plan_round_trip(self):
+        journal = UpdateJournal(self.path)
+        planned = self.plan(journal, [
+            edit_update(1), split_update(2, [1000000, 2000000])])
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        updates = journal.get_updates()
+        self.assertEqual([u.id for u in updates], [u.id for u in planned])
+        self.assertEqual([u.trans_id for u in updates], [1, 2])
+        self.assertEqual(updates[0].request, planned[0].request)
+        self.assertIsNone(updates[0].notes)
+        self.assertEqual(updates[1].notes, ['Note 0', 'Note 1'])
+        self.assertEqual([u.status for u in updates], [PENDING, PENDING])
+        self.assertEqual(len(journal.get_unfinished()), 2)
+        journal.close()
+
+    def test_plan_replaces_journal(self):
+        journal = UpdateJournal(self.path)
+        edit1, edit2 = self.plan(journal, [edit_update(1), edit_update(2)])
+        journal.mark_confirmed(edit1)
+        journal.mark_confirmed(edit2)
+        self.plan(journal, [edit_update(3)])
+
+        self.assertEqual([u.trans_id for u in journal.get_updates()], [3])
+        journal.close()
+
+    def test_plan_keeps_unfinished(self):
+        journal = UpdateJournal(self.path)
+        split = self.plan(journal, [split_update(2, [1000000, 2000000])])[0]
+        journal.mark_sent([split])
+        split.child_ids = [20, 21]
+        journal.mark_confirmed(split)
+
+        with self.assertRaises(UnfinishedUpdatesError):
+            self.plan(journal, [edit_update(3)])
+        [unfinished] = journal.get_unfinished()
+        self.assertEqual(unfinished.child_ids, [20, 21])
+        self.assertEqual(unfinished.pending_notes(), [0, 1])
+
+        self.plan(journal, [edit_update(3)], replace_unfinished=True)
+        self.assertEqual([u.trans_id for u in journal.get_updates()], [3])
+        journal.close()
+
+    def test_statuses(self):
+        journal = UpdateJournal(self.path)
+        edit, split = self.plan(journal, [
+            edit_update(1), split_update(2, [1000000, 2000000, 3000000])])
+        journal.mark_sent([edit, split])
+        self.assertEqual(journal.num_by_status(), {SENT: 2})
+
+        journal.mark_confirmed(edit)
+        split.child_ids = [20, 21, 22]
+        journal.mark_confirmed(split)
+        journal.mark_note_done(split, 1)
+
+        journal.close()
+        journal = UpdateJournal(self.path)
+        unfinished = journal.get_unfinished()
+        self.assertEqual(len(unfinished), 1)
+        self.assertEqual(unfinished[0].status, CONFIRMED)
+        self.assertEqual(unfinished[0].child_ids, [20, 21, 22])
+        self.assertEqual(unfinished[0].pending_notes(), [0, 2])
+        journal.close()
+
+    def test_resume_after_failures(self):
+        journal = UpdateJournal(self.path)
+        self.plan(journal, [
+            edit_update(1),
+            edit_update(2),
+            split_update(3, [1000000, 2000000, 3000000])])
+        # The edit of 2 and the note of the split's second transaction fail.
+        client = FakeClient(num_failures=10, failing_ids={'2:0', '1001:0'})
+        dispatcher = UpdateDispatcher(
+            client, 'https://mint', max_retries=0, sleep=lambda s: None)
+        failures = dispatcher.send(journal.get_unfinished(), journal=journal)
+        self.assertEqual(sorted(u.trans_id for u, _ in failures), [2, 3])
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        unfinished = journal.get_unfinished()
+        self.assertEqual([u.trans_id for u in unfinished], [2, 3])
+        client = FakeClient()
+        dispatcher = UpdateDispatcher(client, 'https://mint')
+        failures = dispatcher.send(unfinished, journal=journal)
+
+        self.assertEqual(failures, [])
+        # Only what didn't go through is sent again.
+        self.assertEqual(
+            sorted(d['txnId'] for _, d in client.posts), ['1001:0', '2:0'])
+        self.assertEqual(journal.get_unfinished(), [])
+        journal.close()
+
+    def test_interrupted_send_leaves_the_rest_pending(self):
+        journal = UpdateJournal(self.path)
+        self.plan(journal, [edit_update(i) for i in range(1, 101)])
+        dispatcher = UpdateDispatcher(FakeClient(), 'https://mint',
+                                      concurrency=4)
+        with self.assertRaises(KeyboardInterrupt):
+            dispatcher.send(journal.get_unfinished(), InterruptingProgress(),
+                            journal)
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        num_by_status = journal.num_by_status()
+        # Only the updates handed to the threads may have gone out.
+        self.assertEqual(num_by_status.get(CONFIRMED, 0), 1)
+        self.assertLessEqual(num_by_status.get(SENT, 0), 3)
+        self.assertGreaterEqual(num_by_status[PENDING], 96)
+        journal.close()
+
+    def test_rejected_update_is_resumed(self):
+        journal = UpdateJournal(self.path)
+        self.plan(journal, [edit_update(1)])
+        client = FakeClient(num_failures=1, failure=FakeResponse(401))
+        failures = UpdateDispatcher(client, 'https://mint').send(
+            journal.get_unfinished(), journal=journal)
+        self.assertEqual(len(failures), 1)
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        [unfinished] = journal.get_unfinished()
+        self.assertEqual(unfinished.status, SENT)
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()